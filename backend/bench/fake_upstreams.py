@@ -0,0 +1,492 @@
+"""Local stand-ins for SAM.gov, USASpending, Grants.gov and OpenAI (chat and batch).
+
+Run standalone:
+    python -m bench.fake_upstreams --port 8900 [--config bench_config.json]
+
+Every upstream is configured with a latency distribution, an error rate,
+a quota rate and a payload size. The config can also be changed at runtime
+with POST /_config, which is how the load-test driver switches scenarios.
+"""
+import argparse
+import asyncio
+import copy
+import email.parser
+import json
+import random
+import re
+import time
+from datetime import datetime, timedelta
+
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, Response, StreamingResponse
+
+DEFAULT_CONFIG = {
+    "sam": {
+        "latency": {"dist": "lognormal", "median_ms": 350, "sigma": 0.5},
+        "error_rate": 0.0,
+        "quota_rate": 0.0,
+        "rows": 25,
+        "total_records": 500,
+        "desc_chars": 800,
+    },
+    "usaspending": {
+        "latency": {"dist": "lognormal", "median_ms": 600, "sigma": 0.6},
+        "error_rate": 0.0,
+        "quota_rate": 0.0,
+        "rows": 25,
+        "total_records": 500,
+        "desc_chars": 300,
+    },
+    "grants": {
+        "latency": {"dist": "lognormal", "median_ms": 250, "sigma": 0.4},
+        "error_rate": 0.0,
+        "quota_rate": 0.0,
+        "rows": 25,
+        "total_records": 300,
+        "desc_chars": 600,
+    },
+    "openai": {
+        "latency": {"dist": "lognormal", "median_ms": 1800, "sigma": 0.4},
+        "error_rate": 0.0,
+        "quota_rate": 0.0,
+        "first_token_share": 0.15,   # streamed replies: share of the latency before the first token
+        "stream_chars": 12,          # characters per streamed chunk
+        "truncate_rate": 0.0,        # streamed replies cut off partway with finish_reason "length"
+    },
+    "openai_batch": {
+        "latency": {"dist": "fixed", "median_ms": 20},
+        "error_rate": 0.0,        # per request line in the batch
+        "quota_rate": 0.0,
+        "completion_s": 5,        # a batch reports "completed" this long after creation
+    },
+}
+
+_config: dict = copy.deepcopy(DEFAULT_CONFIG)
+_stats: dict = {name: {"requests": 0, "errors": 0, "quota": 0} for name in DEFAULT_CONFIG}
+
+WORDS = (
+    "autonomous counter-UAS sensor fusion radar machine learning cyber zero trust "
+    "satellite hypersonic ISR edge AI logistics maintenance cloud network training "
+    "simulation propulsion materials acoustic undersea space domain awareness"
+).split()
+AGENCIES = [
+    "DEPT OF THE AIR FORCE", "DEPT OF NAVY / NAVAIR", "DEPT OF ARMY / DEVCOM",
+    "DEFENSE INFORMATION SYSTEMS AGENCY", "US SPECIAL OPERATIONS COMMAND",
+    "DEPT OF HOMELAND SECURITY", "DEFENSE LOGISTICS AGENCY", "OFFICE OF NAVAL RESEARCH",
+]
+NAICS = ["541715", "541512", "541519", "334413", "336411", "541330"]
+SET_ASIDES = ["", "Small Business", "8(a)", "WOSB", "SDVOSB"]
+
+
+def merge_config(overrides: dict):
+    """Deep-merge overrides into the live config (unknown upstreams are ignored)."""
+    for name, values in (overrides or {}).items():
+        if name not in _config:
+            continue
+        for key, value in values.items():
+            if isinstance(value, dict) and isinstance(_config[name].get(key), dict):
+                _config[name][key].update(value)
+            else:
+                _config[name][key] = value
+
+
+def _latency_s(spec: dict) -> float:
+    dist = spec.get("dist", "fixed")
+    median = spec.get("median_ms", 0) / 1000
+    if dist == "lognormal":
+        return random.lognormvariate(0, spec.get("sigma", 0.5)) * median
+    if dist == "uniform":
+        return random.uniform(spec.get("min_ms", 0), spec.get("max_ms", 0)) / 1000
+    if dist == "exponential":
+        return random.expovariate(1 / median) if median else 0.0
+    return median
+
+
+async def _gate(name: str):
+    """Apply latency and roll for error/quota. Returns "error", "quota" or None."""
+    _stats[name]["requests"] += 1
+    await asyncio.sleep(_latency_s(_config[name]["latency"]))
+    return _roll(name)
+
+
+def _roll(name: str):
+    cfg = _config[name]
+    roll = random.random()
+    if roll < cfg.get("error_rate", 0):
+        _stats[name]["errors"] += 1
+        return "error"
+    if roll < cfg.get("error_rate", 0) + cfg.get("quota_rate", 0):
+        _stats[name]["quota"] += 1
+        return "quota"
+    return None
+
+
+def _text(chars: int, seed: int) -> str:
+    rnd = random.Random(seed)
+    out = []
+    size = 0
+    while size < chars:
+        w = rnd.choice(WORDS)
+        out.append(w)
+        size += len(w) + 1
+    return " ".join(out)[:chars]
+
+
+def _page_ids(cfg: dict, start: int, rows: int) -> range:
+    return range(start, max(start, min(start + rows, cfg["total_records"])))
+
+
+app = FastAPI(title="GovFeed upstream stand-ins")
+
+
+@app.post("/_config")
+async def set_config(request: Request):
+    merge_config(await request.json())
+    return _config
+
+
+@app.get("/_config")
+def get_config():
+    return _config
+
+
+@app.get("/_stats")
+def get_stats():
+    return _stats
+
+
+@app.post("/_reset")
+def reset():
+    _config.clear()
+    _config.update(copy.deepcopy(DEFAULT_CONFIG))
+    for s in _stats.values():
+        s.update(requests=0, errors=0, quota=0)
+    return _config
+
+
+@app.get("/sam/opportunities/v2/search")
+async def sam_search(request: Request):
+    outcome = await _gate("sam")
+    if outcome == "error":
+        return JSONResponse({"error": "upstream failure"}, status_code=503)
+    if outcome == "quota":
+        # SAM.gov reports quota exhaustion as HTTP 200 with a "code" field
+        resets = (datetime.now() + timedelta(hours=6)).strftime("%Y-%b-%d %H:%M:%S")
+        return {"code": "900804", "message": "Message throttled out", "nextAccessTime": resets}
+
+    cfg = _config["sam"]
+    q = request.query_params
+    offset = int(q.get("offset", 0))
+    rows = min(int(q.get("limit", cfg["rows"])), cfg["rows"])
+    now = datetime.now()
+    data = []
+    for n in _page_ids(cfg, offset, rows):
+        rnd = random.Random(n)
+        data.append({
+            "noticeId": f"fake{n:08d}",
+            "title": f"{q.get('title') or rnd.choice(WORDS).title()} {_text(40, n)}",
+            "description": _text(cfg["desc_chars"], n),
+            "fullParentPathName": rnd.choice(AGENCIES),
+            "postedDate": (now - timedelta(days=rnd.randint(0, 60))).strftime("%Y-%m-%d"),
+            "reponseDeadLine": (now + timedelta(days=rnd.randint(1, 60))).strftime("%Y-%m-%dT%H:%M:%S-04:00"),
+            "naicsCode": rnd.choice(NAICS),
+            "typeOfSetAside": rnd.choice(SET_ASIDES),
+            "type": rnd.choice(["Solicitation", "Sources Sought", "Presolicitation"]),
+        })
+    return {"totalRecords": cfg["total_records"], "opportunitiesData": data}
+
+
+@app.post("/usaspending/api/v2/search/spending_by_award/")
+async def usaspending_search(request: Request):
+    outcome = await _gate("usaspending")
+    if outcome == "error":
+        return JSONResponse({"detail": "upstream failure"}, status_code=500)
+    if outcome == "quota":
+        return JSONResponse({"detail": "Request was throttled."}, status_code=429)
+
+    cfg = _config["usaspending"]
+    body = await request.json()
+    page = int(body.get("page", 1))
+    rows = min(int(body.get("limit", cfg["rows"])), cfg["rows"])
+    now = datetime.now()
+    results = []
+    for n in _page_ids(cfg, (page - 1) * rows, rows):
+        rnd = random.Random(n)
+        start = now - timedelta(days=rnd.randint(0, 180))
+        results.append({
+            "Award ID": f"FAKE{n:08d}",
+            "Recipient Name": f"{rnd.choice(WORDS).title()} Systems {n % 97}",
+            "Award Amount": round(rnd.lognormvariate(15, 1.5), 2),
+            "Awarding Agency Name": "Department of Defense",
+            "Awarding Sub Agency Name": rnd.choice(AGENCIES),
+            "Award Type": rnd.choice(["Definitive Contract", "Delivery Order", "BPA Call"]),
+            "Period of Performance Start Date": start.strftime("%Y-%m-%d"),
+            "Period of Performance Current End Date": (start + timedelta(days=365)).strftime("%Y-%m-%d"),
+            "generated_internal_id": f"CONT_AWD_FAKE{n:08d}",
+            "Description": _text(cfg["desc_chars"], n),
+            "NAICS Code": rnd.choice(NAICS),
+            "NAICS Description": "RESEARCH AND DEVELOPMENT",
+        })
+    last_page = max(1, -(-cfg["total_records"] // rows))
+    return {"results": results, "page_metadata": {"page": page, "last_page": last_page}}
+
+
+@app.post("/grants/opportunities/search/")
+async def grants_search(request: Request):
+    outcome = await _gate("grants")
+    if outcome == "error":
+        return JSONResponse({"errorMsg": "upstream failure"}, status_code=502)
+    if outcome == "quota":
+        return JSONResponse({"errorMsg": "Too many requests"}, status_code=429)
+
+    cfg = _config["grants"]
+    body = await request.json()
+    start = int(body.get("startRecordNum", 0))
+    rows = min(int(body.get("rows", cfg["rows"])), cfg["rows"])
+    now = datetime.now()
+    hits = []
+    for n in _page_ids(cfg, start, rows):
+        rnd = random.Random(n)
+        hits.append({
+            "id": str(300000 + n),
+            "title": f"{rnd.choice(WORDS).title()} Research Program {n}",
+            "synopsis": _text(cfg["desc_chars"], n),
+            "agencyName": rnd.choice(AGENCIES),
+            "openDate": (now - timedelta(days=rnd.randint(0, 60))).strftime("%m/%d/%Y"),
+            "closeDate": (now + timedelta(days=rnd.randint(1, 90))).strftime("%m/%d/%Y"),
+            "instrumentTypes": "G",
+            "awardCeiling": rnd.choice([150000, 500000, 1750000, 4000000]),
+        })
+    return {"oppHits": hits, "oppCount": cfg["total_records"]}
+
+
+def _completion(content: str, model: str, prompt_chars: int) -> dict:
+    return {
+        "id": f"chatcmpl-fake{random.randint(0, 1 << 30)}",
+        "object": "chat.completion",
+        "created": int(time.time()),
+        "model": model,
+        "choices": [{
+            "index": 0,
+            "message": {"role": "assistant", "content": content},
+            "finish_reason": "stop",
+        }],
+        "usage": {
+            "prompt_tokens": prompt_chars // 4,
+            "completion_tokens": len(content) // 4,
+            "total_tokens": (prompt_chars + len(content)) // 4,
+        },
+    }
+
+
+def _fake_answer(prompt: str, wrap: str | None = None) -> str:
+    """Produce a plausible answer for the ranking and profile prompts.
+
+    wrap names the object key structured-output callers expect the array under.
+    """
+    if "Items:" in prompt:
+        try:
+            items = json.loads(prompt.split("Items:", 1)[1])
+        except ValueError:
+            items = []
+        rankings = [
+            {"idx": it.get("idx", i), "score": random.randint(20, 98),
+             "summary": f"Relevant {it.get('type') or 'item'} from {(it.get('agency') or 'agency')[:30]}"}
+            for i, it in enumerate(items)
+        ]
+        return json.dumps({wrap: rankings} if wrap else rankings)
+    words = re.findall(r"[A-Za-z][A-Za-z-]{3,}", prompt.split('"', 2)[1] if '"' in prompt else prompt)
+    return json.dumps({
+        "keywords": ", ".join(words[:5]) or "defense technology",
+        "org_type": "small business",
+        "focus": " ".join(words[:10])[:100],
+        "agencies": ["DoD"],
+    })
+
+
+def _chunk(model: str, delta: dict, finish: str | None = None, usage: dict | None = None) -> str:
+    return "data: " + json.dumps({
+        "id": "chatcmpl-fakestream",
+        "object": "chat.completion.chunk",
+        "created": int(time.time()),
+        "model": model,
+        "choices": [] if usage else [{"index": 0, "delta": delta, "finish_reason": finish}],
+        "usage": usage,
+    }) + "\n\n"
+
+
+async def _stream_completion(content: str, model: str, prompt_chars: int, latency: float, include_usage: bool):
+    """Server-sent chunks as the chat completions API streams them, spread over `latency`."""
+    cfg = _config["openai"]
+    finish = "stop"
+    if random.random() < cfg.get("truncate_rate", 0):
+        content = content[:random.randint(1, max(len(content) - 1, 1))]
+        finish = "length"
+    size = max(int(cfg.get("stream_chars", 12)), 1)
+    pieces = [content[i:i + size] for i in range(0, len(content), size)]
+    first = latency * cfg.get("first_token_share", 0.15)
+    await asyncio.sleep(first)
+    yield _chunk(model, {"role": "assistant", "content": ""})
+    step = (latency - first) / max(len(pieces), 1)
+    for piece in pieces:
+        yield _chunk(model, {"content": piece})
+        await asyncio.sleep(step)
+    yield _chunk(model, {}, finish)
+    if include_usage:
+        yield _chunk(model, {}, usage=_completion(content, model, prompt_chars)["usage"])
+    yield "data: [DONE]\n\n"
+
+
+@app.post("/openai/v1/chat/completions")
+async def chat_completions(request: Request):
+    body = await request.json()
+    if body.get("stream"):
+        # Latency is spread over the stream rather than spent up front
+        _stats["openai"]["requests"] += 1
+        outcome = _roll("openai")
+    else:
+        outcome = await _gate("openai")
+    if outcome == "error":
+        return JSONResponse({"error": {"message": "The server had an error", "type": "server_error"}}, status_code=500)
+    if outcome == "quota":
+        return JSONResponse(
+            {"error": {"message": "You exceeded your current quota", "type": "insufficient_quota", "code": "insufficient_quota"}},
+            status_code=429,
+        )
+    prompt = "\n".join(m.get("content") or "" for m in body.get("messages", []))
+    schema = ((body.get("response_format") or {}).get("json_schema") or {}).get("schema") or {}
+    wrap = "rankings" if "rankings" in schema.get("properties", {}) else None
+    model = body.get("model", "gpt-4o-mini")
+    if body.get("stream"):
+        include_usage = bool((body.get("stream_options") or {}).get("include_usage"))
+        return StreamingResponse(
+            _stream_completion(_fake_answer(prompt, wrap), model, len(prompt),
+                               _latency_s(_config["openai"]["latency"]), include_usage),
+            media_type="text/event-stream",
+        )
+    return _completion(_fake_answer(prompt, wrap), model, len(prompt))
+
+
+_files: dict = {}      # file id -> {"meta", "content"}
+_batches: dict = {}    # batch id -> Batch object
+
+
+def _multipart_fields(content_type: str, raw: bytes) -> dict:
+    message = email.parser.BytesParser().parsebytes(
+        f"Content-Type: {content_type}\r\n\r\n".encode() + raw
+    )
+    fields = {}
+    for part in message.get_payload():
+        name = part.get_param("name", header="content-disposition")
+        fields[name] = (part.get_filename(), part.get_payload(decode=True))
+    return fields
+
+
+def _store_file(content: bytes, filename: str, purpose: str) -> dict:
+    file_id = f"file-fake{random.randint(0, 1 << 30)}"
+    meta = {
+        "id": file_id, "object": "file", "bytes": len(content), "created_at": int(time.time()),
+        "filename": filename, "purpose": purpose, "status": "processed",
+    }
+    _files[file_id] = {"meta": meta, "content": content}
+    return meta
+
+
+@app.post("/openai/v1/files")
+async def upload_file(request: Request):
+    fields = _multipart_fields(request.headers.get("content-type", ""), await request.body())
+    filename, content = fields.get("file", (None, b""))
+    purpose = (fields.get("purpose", (None, b""))[1] or b"").decode()
+    return _store_file(content or b"", filename or "upload.jsonl", purpose)
+
+
+@app.get("/openai/v1/files/{file_id}/content")
+def file_content(file_id: str):
+    entry = _files.get(file_id)
+    if entry is None:
+        return JSONResponse({"error": {"message": "No such file", "type": "invalid_request_error"}}, status_code=404)
+    return Response(entry["content"], media_type="application/octet-stream")
+
+
+@app.post("/openai/v1/batches")
+async def create_batch(request: Request):
+    body = await request.json()
+    if body.get("input_file_id") not in _files:
+        return JSONResponse({"error": {"message": "No such file", "type": "invalid_request_error"}}, status_code=400)
+    batch_id = f"batch_fake{random.randint(0, 1 << 30)}"
+    lines = _files[body["input_file_id"]]["content"].decode().splitlines()
+    _batches[batch_id] = {
+        "id": batch_id, "object": "batch", "endpoint": body.get("endpoint"),
+        "input_file_id": body["input_file_id"], "completion_window": body.get("completion_window", "24h"),
+        "status": "in_progress", "created_at": int(time.time()), "output_file_id": None,
+        "metadata": body.get("metadata"),
+        "request_counts": {"total": len([l for l in lines if l.strip()]), "completed": 0, "failed": 0},
+    }
+    return _batches[batch_id]
+
+
+async def _run_batch(batch: dict):
+    """Answer every request line of a batch, writing the output file the Batch API would."""
+    out = []
+    counts = batch["request_counts"]
+    for line in _files[batch["input_file_id"]]["content"].decode().splitlines():
+        if not line.strip():
+            continue
+        request = json.loads(line)
+        outcome = await _gate("openai_batch")
+        if outcome:
+            counts["failed"] += 1
+            status, body = (500 if outcome == "error" else 429), {"error": {"message": outcome}}
+        else:
+            counts["completed"] += 1
+            req = request["body"]
+            prompt = "\n".join(m.get("content") or "" for m in req.get("messages", []))
+            schema = ((req.get("response_format") or {}).get("json_schema") or {}).get("schema") or {}
+            wrap = "rankings" if "rankings" in schema.get("properties", {}) else None
+            status, body = 200, _completion(_fake_answer(prompt, wrap), req.get("model", "gpt-4o-mini"), len(prompt))
+        out.append(json.dumps({
+            "id": f"batch_req_{random.randint(0, 1 << 30)}",
+            "custom_id": request["custom_id"],
+            "response": {"status_code": status, "request_id": "", "body": body},
+            "error": None,
+        }))
+    output = _store_file(("\n".join(out) + "\n").encode(), f"{batch['id']}_output.jsonl", "batch_output")
+    batch.update(status="completed", output_file_id=output["id"], completed_at=int(time.time()))
+
+
+@app.get("/openai/v1/batches/{batch_id}")
+async def retrieve_batch(batch_id: str):
+    batch = _batches.get(batch_id)
+    if batch is None:
+        return JSONResponse({"error": {"message": "No such batch", "type": "invalid_request_error"}}, status_code=404)
+    if batch["status"] == "in_progress" and time.time() - batch["created_at"] >= _config["openai_batch"]["completion_s"]:
+        batch["status"] = "finalizing"
+        await _run_batch(batch)
+    return batch
+
+
+def base_urls(host: str, port: int) -> dict:
+    """Environment overrides that point the backend at these stand-ins."""
+    root = f"http://{host}:{port}"
+    return {
+        "SAM_BASE": f"{root}/sam/opportunities/v2/search",
+        "USA_SPENDING_BASE": f"{root}/usaspending/api/v2/search/spending_by_award/",
+        "GRANTS_BASE": f"{root}/grants/opportunities/search/",
+        "OPENAI_BASE_URL": f"{root}/openai/v1",
+    }
+
+
+if __name__ == "__main__":
+    import uvicorn
+
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8900)
+    parser.add_argument("--config", help="JSON file with per-upstream overrides")
+    args = parser.parse_args()
+    if args.config:
+        with open(args.config) as f:
+            merge_config(json.load(f))
+    for k, v in base_urls(args.host, args.port).items():
+        print(f"{k}={v}")
+    uvicorn.run(app, host=args.host, port=args.port, log_level="warning")
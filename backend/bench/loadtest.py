@@ -0,0 +1,241 @@
+"""Drive /api/feed against local upstream stand-ins and record the results.
+
+    cd backend
+    python -m bench.loadtest --concurrency 1,8,32 --duration 20
+    python -m bench.loadtest --compare bench/results/<older>.json
+
+The driver starts bench.fake_upstreams and the API (uvicorn main:app) as
+subprocesses, points the API at the fakes through SAM_BASE / USA_SPENDING_BASE /
+GRANTS_BASE / OPENAI_BASE_URL, then runs each concurrency level for a fixed
+duration. The API keeps its snapshot, corpus, analytics and batch files in a
+scratch directory, so every run starts cold and the real data/ is untouched. Throughput, latency percentiles and the API process's memory are
+written to bench/results/ so runs can be compared across commits.
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+import httpx
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+BACKEND_DIR = os.path.dirname(BENCH_DIR)
+RESULTS_DIR = os.path.join(BENCH_DIR, "results")
+sys.path.insert(0, BACKEND_DIR)
+
+from bench.fake_upstreams import base_urls  # noqa: E402
+
+PROFILES = [
+    ("counter-UAS, drone defeat, RF detection", "Counter-drone and UAS defeat systems"),
+    ("artificial intelligence, machine learning, autonomy", "AI and ML applications for defense"),
+    ("cybersecurity, zero trust, SIEM", "DoD and IC cybersecurity contracts"),
+    ("space domain awareness, satellite, launch", "Space systems and domain awareness"),
+    ("hypersonic, propulsion, thermal protection", "Hypersonic weapons and propulsion R&D"),
+]
+
+
+def _percentile(values: list[float], pct: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    k = (len(ordered) - 1) * pct / 100
+    lo, hi = int(k), min(int(k) + 1, len(ordered) - 1)
+    return ordered[lo] + (ordered[hi] - ordered[lo]) * (k - lo)
+
+
+def _memory_kb(pid: int) -> dict:
+    """Current and peak RSS of a process, read from /proc (Linux only)."""
+    out = {"rss_kb": None, "peak_rss_kb": None}
+    try:
+        with open(f"/proc/{pid}/status") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    out["rss_kb"] = int(line.split()[1])
+                elif line.startswith("VmHWM:"):
+                    out["peak_rss_kb"] = int(line.split()[1])
+    except OSError:
+        pass
+    return out
+
+
+def _git_sha() -> str:
+    try:
+        return subprocess.check_output(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=BACKEND_DIR, text=True, stderr=subprocess.DEVNULL
+        ).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+async def _wait_ready(url: str, timeout: float = 20):
+    deadline = time.time() + timeout
+    async with httpx.AsyncClient() as client:
+        while time.time() < deadline:
+            try:
+                if (await client.get(url)).status_code < 500:
+                    return
+            except httpx.HTTPError:
+                pass
+            await asyncio.sleep(0.2)
+    raise RuntimeError(f"{url} did not come up within {timeout}s")
+
+
+async def _seed_profiles(client: httpx.AsyncClient, api: str, users: int):
+    for n in range(users):
+        keywords, focus = PROFILES[n % len(PROFILES)]
+        await client.post(f"{api}/api/profile/update", json={
+            "user_id": f"bench-{n}", "keywords": keywords, "focus": focus,
+        })
+
+
+async def run_level(api: str, concurrency: int, duration: float, users: int, max_page: int) -> dict:
+    latencies: list[float] = []
+    statuses: dict = {}
+    stop_at = time.perf_counter() + duration
+
+    async def worker(client: httpx.AsyncClient):
+        while time.perf_counter() < stop_at:
+            params = {
+                "user_id": f"bench-{random.randrange(users)}",
+                "page": random.randint(1, max_page),
+                "limit": 15,
+            }
+            t0 = time.perf_counter()
+            try:
+                resp = await client.get(f"{api}/api/feed/", params=params)
+                code = str(resp.status_code)
+            except httpx.HTTPError as e:
+                code = type(e).__name__
+            latencies.append(time.perf_counter() - t0)
+            statuses[code] = statuses.get(code, 0) + 1
+
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+    started = time.perf_counter()
+    async with httpx.AsyncClient(timeout=120, limits=limits) as client:
+        await asyncio.gather(*(worker(client) for _ in range(concurrency)))
+    elapsed = time.perf_counter() - started
+
+    ms = [v * 1000 for v in latencies]
+    return {
+        "concurrency": concurrency,
+        "requests": len(latencies),
+        "elapsed_s": round(elapsed, 2),
+        "throughput_rps": round(len(latencies) / elapsed, 2) if elapsed else 0,
+        "p50_ms": round(_percentile(ms, 50), 1),
+        "p95_ms": round(_percentile(ms, 95), 1),
+        "p99_ms": round(_percentile(ms, 99), 1),
+        "max_ms": round(max(ms), 1) if ms else 0,
+        "statuses": statuses,
+    }
+
+
+def compare(current: dict, baseline: dict):
+    base = {lvl["concurrency"]: lvl for lvl in baseline.get("levels", [])}
+    print(f"\nvs {baseline.get('git_sha')} ({baseline.get('started_at')})")
+    print(f"{'conc':>5} {'metric':<15} {'baseline':>10} {'current':>10} {'delta':>8}")
+    for lvl in current.get("levels", []):
+        old = base.get(lvl["concurrency"])
+        if not old:
+            continue
+        for metric in ("throughput_rps", "p50_ms", "p95_ms", "p99_ms", "peak_rss_kb"):
+            a, b = old.get(metric), lvl.get(metric)
+            if not a or b is None:
+                continue
+            print(f"{lvl['concurrency']:>5} {metric:<15} {a:>10} {b:>10} {(b - a) / a * 100:>+7.1f}%")
+
+
+def scratch_env(env: dict, prefix: str) -> str:
+    """Point the API's on-disk state at a fresh temp dir (returned, for removal after the run)."""
+    scratch = tempfile.mkdtemp(prefix=prefix)
+    env["SNAPSHOT_PATH"] = os.path.join(scratch, "snapshot.bin")
+    for name in ("ANALYTICS_DIR", "BATCH_DIR", "CORPUS_DIR"):
+        env[name] = os.path.join(scratch, name.split("_")[0].lower())
+    env["RECORD_TRAFFIC"] = ""
+    return scratch
+
+
+async def main(args):
+    env = dict(os.environ)
+    env.update(base_urls("127.0.0.1", args.fake_port))
+    env.setdefault("SAM_API_KEY", "bench-key")
+    env.setdefault("OPENAI_API_KEY", "sk-bench")
+    env["PYTHONUNBUFFERED"] = "1"
+    # Start cold, and keep fake payloads out of the real snapshot
+    scratch = scratch_env(env, "loadtest-")
+
+    fake_cmd = [sys.executable, "-m", "bench.fake_upstreams", "--port", str(args.fake_port)]
+    if args.upstream_config:
+        fake_cmd += ["--config", args.upstream_config]
+    api_cmd = [sys.executable, "-m", "uvicorn", "main:app", "--port", str(args.api_port),
+               "--log-level", "warning", "--workers", str(args.workers)]
+
+    log = open(os.devnull, "w") if not args.verbose else None
+    fake = subprocess.Popen(fake_cmd, cwd=BACKEND_DIR, env=env, stdout=log, stderr=log)
+    api_proc = subprocess.Popen(api_cmd, cwd=BACKEND_DIR, env=env, stdout=log, stderr=log)
+    api = f"http://127.0.0.1:{args.api_port}"
+    try:
+        await _wait_ready(f"http://127.0.0.1:{args.fake_port}/_config")
+        await _wait_ready(f"{api}/health")
+        async with httpx.AsyncClient(timeout=30) as client:
+            await _seed_profiles(client, api, args.users)
+
+        result = {
+            "git_sha": _git_sha(),
+            "started_at": datetime.now().isoformat(timespec="seconds"),
+            "duration_s": args.duration,
+            "users": args.users,
+            "max_page": args.max_page,
+            "workers": args.workers,
+            "upstream_config": json.load(open(args.upstream_config)) if args.upstream_config else {},
+            "baseline_memory": _memory_kb(api_proc.pid),
+            "levels": [],
+        }
+        for conc in [int(c) for c in args.concurrency.split(",")]:
+            level = await run_level(api, conc, args.duration, args.users, args.max_page)
+            level.update(_memory_kb(api_proc.pid))
+            result["levels"].append(level)
+            print(f"c={conc:<4} {level['throughput_rps']:>7} req/s  p50={level['p50_ms']}ms  "
+                  f"p95={level['p95_ms']}ms  p99={level['p99_ms']}ms  rss={level['rss_kb']}kB  {level['statuses']}")
+        async with httpx.AsyncClient() as client:
+            result["upstream_stats"] = (await client.get(f"http://127.0.0.1:{args.fake_port}/_stats")).json()
+    finally:
+        api_proc.terminate()
+        fake.terminate()
+        api_proc.wait(10)
+        fake.wait(10)
+        shutil.rmtree(scratch, ignore_errors=True)
+
+    os.makedirs(RESULTS_DIR, exist_ok=True)
+    out = args.output or os.path.join(
+        RESULTS_DIR, f"{datetime.now().strftime('%Y%m%d-%H%M%S')}-{result['git_sha']}.json"
+    )
+    with open(out, "w") as f:
+        json.dump(result, f, indent=2)
+    print(f"Saved {out}")
+
+    if args.compare:
+        with open(args.compare) as f:
+            compare(result, json.load(f))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Offline load test for /api/feed")
+    parser.add_argument("--concurrency", default="1,8,32", help="comma-separated concurrency levels")
+    parser.add_argument("--duration", type=float, default=20, help="seconds per level")
+    parser.add_argument("--users", type=int, default=25)
+    parser.add_argument("--max-page", type=int, default=3)
+    parser.add_argument("--workers", type=int, default=1, help="uvicorn workers for the API")
+    parser.add_argument("--api-port", type=int, default=8901)
+    parser.add_argument("--fake-port", type=int, default=8900)
+    parser.add_argument("--upstream-config", help="JSON overrides for bench.fake_upstreams")
+    parser.add_argument("--compare", help="previous results file to diff against")
+    parser.add_argument("--output", help="where to write results (default bench/results/)")
+    parser.add_argument("--verbose", action="store_true", help="show server logs")
+    asyncio.run(main(parser.parse_args()))
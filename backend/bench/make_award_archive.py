@@ -0,0 +1,83 @@
+"""Generate a synthetic USASpending bulk download archive for ingest tests.
+
+    python -m bench.make_award_archive data/archives/awards.zip --rows 2000000
+
+Writes a zip of CSVs with the bulk download's column names, split into files of
+--rows-per-file rows like the real downloads. Rows are streamed into the zip,
+so archives far larger than memory can be generated.
+"""
+import argparse
+import csv
+import io
+import random
+import zipfile
+from datetime import date, timedelta
+
+COLUMNS = [
+    "contract_award_unique_key", "award_id_piid", "parent_award_id_piid",
+    "total_obligated_amount", "current_total_value_of_award",
+    "awarding_agency_name", "awarding_sub_agency_name", "recipient_name", "recipient_uei",
+    "period_of_performance_start_date", "period_of_performance_current_end_date",
+    "award_type", "naics_code", "naics_description",
+    "prime_award_base_transaction_description", "usaspending_permalink",
+]
+AGENCIES = {
+    "Department of Defense": ["Department of the Army", "Department of the Navy", "Department of the Air Force",
+                              "Defense Logistics Agency", "Defense Information Systems Agency"],
+    "Department of Homeland Security": ["U.S. Customs and Border Protection", "Cybersecurity and Infrastructure Security Agency"],
+    "National Aeronautics and Space Administration": ["National Aeronautics and Space Administration"],
+    "Department of Energy": ["Department of Energy"],
+}
+NAICS = {
+    "541512": "COMPUTER SYSTEMS DESIGN SERVICES",
+    "541715": "RESEARCH AND DEVELOPMENT IN THE PHYSICAL, ENGINEERING, AND LIFE SCIENCES",
+    "541330": "ENGINEERING SERVICES",
+    "336411": "AIRCRAFT MANUFACTURING",
+    "334511": "SEARCH, DETECTION, NAVIGATION, GUIDANCE, AERONAUTICAL, AND NAUTICAL SYSTEM",
+}
+TYPES = ["DEFINITIVE CONTRACT", "DELIVERY ORDER", "PURCHASE ORDER", "BPA CALL"]
+WORDS = ("autonomous sensor radar cyber network sustainment training simulation software "
+         "integration logistics engineering support satellite analytics maintenance").split()
+
+
+def _row(n: int, rnd: random.Random) -> list:
+    agency = rnd.choice(list(AGENCIES))
+    naics = rnd.choice(list(NAICS))
+    start = date(2018, 1, 1) + timedelta(days=rnd.randrange(2500))
+    piid = f"W{n:011d}"
+    key = f"CONT_AWD_{piid}_9700_-NONE-_-NONE-"
+    amount = round(rnd.lognormvariate(11, 2), 2)
+    return [
+        key, piid, "", amount, round(amount * rnd.uniform(1, 3), 2),
+        agency, rnd.choice(AGENCIES[agency]), f"Vendor {rnd.randrange(20000)} LLC", f"UEI{rnd.randrange(10**8):08d}",
+        start.isoformat(), (start + timedelta(days=rnd.randrange(30, 1800))).isoformat(),
+        rnd.choice(TYPES), naics, NAICS[naics],
+        " ".join(rnd.choices(WORDS, k=rnd.randrange(4, 20))).upper(),
+        f"https://www.usaspending.gov/award/{key}/",
+    ]
+
+
+def write_archive(path: str, rows: int, rows_per_file: int = 1_000_000, seed: int = 7):
+    rnd = random.Random(seed)
+    with zipfile.ZipFile(path, "w", compression=zipfile.ZIP_DEFLATED) as archive:
+        for part, start in enumerate(range(0, rows, rows_per_file), 1):
+            name = f"FY2025_All_Contracts_Full_{part}.csv"
+            with archive.open(name, "w", force_zip64=True) as raw:
+                text = io.TextIOWrapper(raw, encoding="utf-8", newline="")
+                writer = csv.writer(text)
+                writer.writerow(COLUMNS)
+                for n in range(start, min(start + rows_per_file, rows)):
+                    writer.writerow(_row(n, rnd))
+                text.flush()
+                text.detach()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("path")
+    parser.add_argument("--rows", type=int, default=1_000_000)
+    parser.add_argument("--rows-per-file", type=int, default=1_000_000)
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args()
+    write_archive(args.path, args.rows, args.rows_per_file, args.seed)
+    print(f"Wrote {args.rows} rows to {args.path}")
@@ -0,0 +1,245 @@
+"""Replay recorded /api/feed traffic against the current build and compare runs.
+
+    cd backend
+    python -m bench.replay data/traffic                      # original pacing
+    python -m bench.replay data/traffic --speed 10           # 10x faster
+    python -m bench.replay data/traffic --speed 0 --compare bench/results/replay-<older>.json
+
+The archive comes from running the API with RECORD_TRAFFIC=1 (see
+services/recorder.py). The driver starts the API with REPLAY_ARCHIVE pointing at
+it, so SAM.gov, USASpending and Grants.gov calls return the recorded payloads
+after their recorded durations. OpenAI goes to bench.fake_upstreams. Before each
+request it restores the profile the user had when the request was recorded,
+then sends the recorded query and headers at the recorded offset divided by
+--speed (0 sends as fast as --concurrency allows). It reports latency
+percentiles, the API process's CPU time and memory, and statuses that differ
+from the recording. Results go to bench/results/ like loadtest runs.
+"""
+import argparse
+import asyncio
+import json
+import os
+import shutil
+import subprocess
+import sys
+import time
+from datetime import datetime
+
+import httpx
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+BACKEND_DIR = os.path.dirname(BENCH_DIR)
+RESULTS_DIR = os.path.join(BENCH_DIR, "results")
+sys.path.insert(0, BACKEND_DIR)
+
+from bench.fake_upstreams import base_urls  # noqa: E402
+from bench.loadtest import _git_sha, _memory_kb, _percentile, _wait_ready, scratch_env  # noqa: E402
+from services.recorder import read_archive  # noqa: E402
+
+COMPARED = ("p50_ms", "p95_ms", "p99_ms", "max_ms", "cpu_s", "cpu_ms_per_request", "peak_rss_kb", "status_mismatches")
+
+
+def load_requests(path: str, limit: int | None = None) -> list[dict]:
+    requests = [e for e in read_archive(path) if e["t"] == "req"]
+    requests.sort(key=lambda e: e["ts"])
+    return requests[:limit] if limit else requests
+
+
+def _cpu_seconds(pid: int) -> float | None:
+    """User + system CPU time of a process, from /proc (Linux only)."""
+    try:
+        with open(f"/proc/{pid}/stat") as f:
+            fields = f.read().rsplit(")", 1)[1].split()
+        return (int(fields[11]) + int(fields[12])) / os.sysconf("SC_CLK_TCK")
+    except (OSError, IndexError, ValueError):
+        return None
+
+
+async def drive(api: str, requests: list[dict], speed: float, concurrency: int) -> dict:
+    latencies: list[float] = []
+    statuses: dict = {}
+    mismatches = 0
+    profiles: dict = {}       # user -> profile json last sent
+    in_flight = asyncio.Semaphore(concurrency)
+    lag: list[float] = []     # how late each request went out versus its schedule
+
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+    async with httpx.AsyncClient(base_url=api, timeout=120, limits=limits) as client:
+
+        async def send(event: dict):
+            nonlocal mismatches
+            params = list(event["query"])
+            if event.get("own_key"):
+                params.append(("openai_key", "sk-replay"))
+            t0 = time.perf_counter()
+            try:
+                resp = await client.get(event["path"], params=params, headers=event.get("headers") or {})
+                await resp.aread()
+                code = resp.status_code
+            except httpx.HTTPError as e:
+                code = type(e).__name__
+            finally:
+                in_flight.release()
+            latencies.append(time.perf_counter() - t0)
+            statuses[str(code)] = statuses.get(str(code), 0) + 1
+            if code != event["status"]:
+                mismatches += 1
+
+        tasks = []
+        first_ts = requests[0]["ts"] if requests else 0
+        started = time.perf_counter()
+        for event in requests:
+            if speed > 0:
+                due = started + (event["ts"] - first_ts) / speed
+                delay = due - time.perf_counter()
+                if delay > 0:
+                    await asyncio.sleep(delay)
+                lag.append(max(0.0, -delay))
+            profile = event.get("profile")
+            if profile and profiles.get(event["user"]) != profile:
+                p = json.loads(profile)
+                await client.post("/api/profile/update", json={
+                    "user_id": event["user"], "keywords": p.get("keywords", ""),
+                    "focus": p.get("focus", ""), "org_type": p.get("org_type", ""),
+                })
+                profiles[event["user"]] = profile
+            await in_flight.acquire()
+            tasks.append(asyncio.create_task(send(event)))
+        await asyncio.gather(*tasks)
+        elapsed = time.perf_counter() - started
+
+    ms = [v * 1000 for v in latencies]
+    return {
+        "requests": len(latencies),
+        "elapsed_s": round(elapsed, 2),
+        "throughput_rps": round(len(latencies) / elapsed, 2) if elapsed else 0,
+        "p50_ms": round(_percentile(ms, 50), 1),
+        "p95_ms": round(_percentile(ms, 95), 1),
+        "p99_ms": round(_percentile(ms, 99), 1),
+        "max_ms": round(max(ms), 1) if ms else 0,
+        "statuses": statuses,
+        "status_mismatches": mismatches,
+        "max_send_lag_ms": round(max(lag) * 1000, 1) if lag else 0,
+    }
+
+
+def recorded_summary(requests: list[dict]) -> dict:
+    ms = [e["ms"] for e in requests]
+    span = requests[-1]["ts"] - requests[0]["ts"] if requests else 0
+    return {
+        "requests": len(requests),
+        "span_s": round(span, 1),
+        "users": len({e["user"] for e in requests}),
+        "p50_ms": round(_percentile(ms, 50), 1),
+        "p95_ms": round(_percentile(ms, 95), 1),
+        "p99_ms": round(_percentile(ms, 99), 1),
+    }
+
+
+def compare(current: dict, baseline: dict):
+    print(f"\nvs {baseline.get('git_sha')} ({baseline.get('started_at')}, speed {baseline.get('speed')})")
+    if baseline.get("archive") != current.get("archive") or baseline["run"]["requests"] != current["run"]["requests"]:
+        print("  note: baseline replayed a different archive or request count")
+    print(f"{'metric':<20} {'baseline':>10} {'current':>10} {'delta':>8}")
+    for metric in COMPARED:
+        a, b = baseline["run"].get(metric), current["run"].get(metric)
+        if a is None or b is None:
+            continue
+        delta = f"{(b - a) / a * 100:>+7.1f}%" if a else ""
+        print(f"{metric:<20} {a:>10} {b:>10} {delta:>8}")
+
+
+async def main(args):
+    requests = load_requests(args.archive, args.limit)
+    if not requests:
+        sys.exit(f"No recorded requests in {args.archive}")
+    archive = os.path.abspath(args.archive)
+
+    env = dict(os.environ)
+    env.update(base_urls("127.0.0.1", args.fake_port))
+    env.setdefault("SAM_API_KEY", "bench-key")
+    env.setdefault("OPENAI_API_KEY", "sk-bench")
+    env["REPLAY_ARCHIVE"] = archive
+    env["REPLAY_UPSTREAM_SCALE"] = str(args.upstream_scale)
+    env["PYTHONUNBUFFERED"] = "1"
+    # Start cold: no snapshot restores caches from an earlier run
+    scratch = scratch_env(env, "replay-")
+
+    fake_cmd = [sys.executable, "-m", "bench.fake_upstreams", "--port", str(args.fake_port)]
+    if args.upstream_config:
+        fake_cmd += ["--config", args.upstream_config]
+    api_cmd = [sys.executable, "-m", "uvicorn", "main:app", "--port", str(args.api_port), "--log-level", "warning"]
+
+    log = open(os.devnull, "w") if not args.verbose else None
+    fake = subprocess.Popen(fake_cmd, cwd=BACKEND_DIR, env=env, stdout=log, stderr=log)
+    api_proc = subprocess.Popen(api_cmd, cwd=BACKEND_DIR, env=env, stdout=log, stderr=log)
+    api = f"http://127.0.0.1:{args.api_port}"
+    try:
+        await _wait_ready(f"http://127.0.0.1:{args.fake_port}/_config")
+        await _wait_ready(f"{api}/health")
+        recorded = recorded_summary(requests)
+        print(f"Replaying {recorded['requests']} requests from {recorded['users']} users "
+              f"(recorded over {recorded['span_s']}s, p50={recorded['p50_ms']}ms p95={recorded['p95_ms']}ms) "
+              f"at speed {args.speed or 'max'}")
+
+        cpu_before = _cpu_seconds(api_proc.pid)
+        run = await drive(api, requests, args.speed, args.concurrency)
+        cpu_after = _cpu_seconds(api_proc.pid)
+        if cpu_before is not None and cpu_after is not None:
+            run["cpu_s"] = round(cpu_after - cpu_before, 2)
+            run["cpu_ms_per_request"] = round(run["cpu_s"] * 1000 / max(run["requests"], 1), 2)
+        run.update(_memory_kb(api_proc.pid))
+        async with httpx.AsyncClient() as client:
+            run["replay"] = {k: v for k, v in (await client.get(f"{api}/metrics")).json()["recorder"].items()
+                             if k.startswith("replay_")}
+    finally:
+        api_proc.terminate()
+        fake.terminate()
+        api_proc.wait(10)
+        fake.wait(10)
+        shutil.rmtree(scratch, ignore_errors=True)
+
+    result = {
+        "kind": "replay",
+        "git_sha": _git_sha(),
+        "started_at": datetime.now().isoformat(timespec="seconds"),
+        "archive": archive,
+        "speed": args.speed,
+        "concurrency": args.concurrency,
+        "upstream_scale": args.upstream_scale,
+        "recorded": recorded,
+        "run": run,
+    }
+    print(f"{run['requests']} requests in {run['elapsed_s']}s  p50={run['p50_ms']}ms  p95={run['p95_ms']}ms  "
+          f"p99={run['p99_ms']}ms  cpu={run.get('cpu_s')}s ({run.get('cpu_ms_per_request')}ms/req)  "
+          f"rss={run['rss_kb']}kB  {run['statuses']}  mismatched={run['status_mismatches']}  "
+          f"upstream hits/misses={run['replay'].get('replay_hits')}/{run['replay'].get('replay_misses')}")
+
+    os.makedirs(RESULTS_DIR, exist_ok=True)
+    out = args.output or os.path.join(
+        RESULTS_DIR, f"replay-{datetime.now().strftime('%Y%m%d-%H%M%S')}-{result['git_sha']}.json"
+    )
+    with open(out, "w") as f:
+        json.dump(result, f, indent=2)
+    print(f"Saved {out}")
+
+    if args.compare:
+        with open(args.compare) as f:
+            compare(result, json.load(f))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Replay recorded /api/feed traffic")
+    parser.add_argument("archive", help="RECORD_DIR of a recording, or one segment file")
+    parser.add_argument("--speed", type=float, default=1.0, help="pacing multiplier; 0 = as fast as possible")
+    parser.add_argument("--concurrency", type=int, default=64, help="max requests in flight")
+    parser.add_argument("--limit", type=int, help="replay only the first N requests")
+    parser.add_argument("--upstream-scale", type=float, default=1.0,
+                        help="multiplier on recorded upstream durations (0 = instant)")
+    parser.add_argument("--api-port", type=int, default=8911)
+    parser.add_argument("--fake-port", type=int, default=8910)
+    parser.add_argument("--upstream-config", help="JSON overrides for bench.fake_upstreams (OpenAI)")
+    parser.add_argument("--compare", help="previous replay results file to diff against")
+    parser.add_argument("--output", help="where to write results (default bench/results/)")
+    parser.add_argument("--verbose", action="store_true", help="show server logs")
+    asyncio.run(main(parser.parse_args()))
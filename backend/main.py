@@ -3,7 +3,8 @@ from fastapi.middleware.cors import CORSMiddleware
 from pydantic import BaseModel
 from typing import Optional
 import asyncio
-from routers import feed, profile
+from routers import feed, profile, analytics, export, batch
+from services import executor, corpus, sam_gov, ai_ranker, snapshot, admission, llm_gateway, scheduler, feed_sync, feed_encoding, corpus_store, batch_scoring, recorder
 
 app = FastAPI(title="GovFeed API", version="1.0.0")
 
@@ -13,11 +14,93 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["ETag"],
 )
 
 app.include_router(feed.router, prefix="/api/feed", tags=["feed"])
 app.include_router(profile.router, prefix="/api/profile", tags=["profile"])
+app.include_router(analytics.router, prefix="/api/analytics", tags=["analytics"])
+app.include_router(export.router, prefix="/api/export", tags=["export"])
+app.include_router(batch.router, prefix="/api/batch", tags=["batch"])
+
+if recorder.RECORD:
+    @app.middleware("http")
+    async def record_traffic(request, call_next):
+        return await recorder.record_request(request, call_next, feed.get_profile_store)
+
+snapshot.register("sam_cache", sam_gov.dump_cache, sam_gov.restore_cache)
+snapshot.register("rank_cache", ai_ranker.dump_rank_cache, ai_ranker.restore_rank_cache)
+snapshot.register("profiles", feed.dump_profiles, feed.restore_profiles)
+
+PRUNE_INTERVAL = 900  # seconds between sweeps for expired solicitations
+
+
+async def prune_expired_loop():
+    while True:
+        await asyncio.sleep(PRUNE_INTERVAL)
+        removed = corpus.prune_expired() + sam_gov.prune_expired()
+        scheduler.prune_idle()
+        ai_ranker.prune_expired()
+        if removed:
+            print(f"[Prune] Removed {removed} expired solicitations from corpus and caches")
+
+
+@app.on_event("startup")
+async def start_background_tasks():
+    app.state.lag_monitor = asyncio.create_task(executor.monitor_loop_lag())
+    app.state.pruner = asyncio.create_task(prune_expired_loop())
+    # Only the section table is read here; caches fill in the background
+    if snapshot.load():
+        app.state.snapshot_restore = asyncio.create_task(snapshot.restore_all())
+    app.state.snapshot_writer = asyncio.create_task(snapshot.write_loop())
+    app.state.batch_poller = asyncio.create_task(batch_scoring.poll_loop())
+    if recorder.RECORD:
+        app.state.recorder = asyncio.create_task(recorder.writer_loop())
+    if recorder.REPLAY_ARCHIVE:
+        recorder.load_replay()
+    if corpus.SHARED:
+        app.state.corpus_publisher = asyncio.create_task(corpus_store.publish_loop(corpus))
+
+
+@app.on_event("shutdown")
+async def stop_background_tasks():
+    app.state.lag_monitor.cancel()
+    app.state.pruner.cancel()
+    app.state.snapshot_writer.cancel()
+    app.state.batch_poller.cancel()
+    if recorder.RECORD:
+        app.state.recorder.cancel()
+        await recorder.flush(final=True)
+    if corpus.SHARED:
+        app.state.corpus_publisher.cancel()
+    await snapshot.write()
+    await llm_gateway.close()
+    executor.shutdown()
+
 
 @app.get("/health")
 def health():
-    return {"status": "ok"}
+    return {
+        "status": "ok",
+        "snapshot": snapshot.status(),
+        "corpus": corpus_store.status() if corpus.SHARED else {"shared": False},
+    }
+
+
+@app.get("/metrics")
+def metrics():
+    return {
+        **executor.metrics(),
+        "admission": admission.metrics(),
+        "llm": llm_gateway.metrics(),
+        "scheduler": scheduler.metrics(),
+        "feed_sync": feed_sync.metrics(),
+        "feed_encoding": feed_encoding.metrics(),
+        "recorder": recorder.metrics(),
+    }
+
+
+@app.get("/usage")
+def usage(user_id: Optional[str] = None):
+    """Upstream calls and LLM tokens consumed per user, with what's left of their share."""
+    return scheduler.usage(user_id)
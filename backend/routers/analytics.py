@@ -0,0 +1,82 @@
+from fastapi import APIRouter, Query, HTTPException
+from typing import Optional
+import sys, os
+sys.path.insert(0, os.path.dirname(os.path.dirname(__file__)))
+from services import analytics, award_archive, scheduler
+from routers.feed import get_profile_store
+
+router = APIRouter()
+
+GROUP_BY = ("agency", "recipient", "naics")
+
+
+def _keywords(user_id: str, keywords: Optional[str]) -> str:
+    return keywords if keywords is not None else get_profile_store(user_id).get("keywords", "")
+
+
+@router.post("/ingest")
+async def ingest(
+    user_id: str = Query("default"),
+    keywords: Optional[str] = Query(None),   # defaults to the user's profile keywords
+    days: int = Query(180, ge=1, le=3650),
+    max_pages: int = Query(20, ge=1, le=500),
+):
+    """Pull award rows for a keyword set from USASpending into the columnar store."""
+    scheduler.bind(user_id, scheduler.BACKGROUND)
+    return await analytics.ingest(_keywords(user_id, keywords), days=days, max_pages=max_pages)
+
+
+@router.post("/ingest-archive")
+async def ingest_archive(
+    file: str = Query(...),                  # archive name inside ANALYTICS_ARCHIVE_DIR
+    keywords: Optional[str] = Query(None),   # keyword set to store the rows under; defaults to bulk:<file>
+    naics: Optional[str] = Query(None),      # keep only NAICS codes with this prefix
+    agency: Optional[str] = Query(None),     # keep only this awarding agency or sub-agency
+    batch_rows: int = Query(award_archive.BATCH_ROWS, ge=1000, le=1_000_000),
+):
+    """Stream a USASpending bulk download archive into the columnar store."""
+    path = award_archive.archive_path(file)
+    if path is None:
+        raise HTTPException(404, "Archive not found")
+    label = keywords or f"bulk:{os.path.splitext(os.path.basename(file))[0]}"
+    return await analytics.ingest_archive(path, label, naics=naics, agency=agency, batch_rows=batch_rows)
+
+
+@router.get("/top")
+def top(
+    by: str = Query("agency"),
+    user_id: str = Query("default"),
+    keywords: Optional[str] = Query(None),
+    days: Optional[int] = Query(180, ge=1),
+    k: int = Query(10, ge=1, le=100),
+    agency: Optional[str] = Query(None),
+    naics: Optional[str] = Query(None),
+    recipient: Optional[str] = Query(None),
+):
+    """Total obligations grouped by agency, recipient or NAICS, top k first."""
+    if by not in GROUP_BY:
+        raise HTTPException(400, f"by must be one of {', '.join(GROUP_BY)}")
+    return analytics.top(by, _keywords(user_id, keywords), days, k,
+                         agency=agency, naics=naics, recipient=recipient)
+
+
+@router.get("/timeseries")
+def timeseries(
+    bucket: str = Query("month"),
+    user_id: str = Query("default"),
+    keywords: Optional[str] = Query(None),
+    days: Optional[int] = Query(180, ge=1),
+    agency: Optional[str] = Query(None),
+    naics: Optional[str] = Query(None),
+    recipient: Optional[str] = Query(None),
+):
+    """Obligations per day/week/month/quarter/year."""
+    if bucket not in analytics.BUCKETS:
+        raise HTTPException(400, f"bucket must be one of {', '.join(analytics.BUCKETS)}")
+    return analytics.timeseries(bucket, _keywords(user_id, keywords), days,
+                                agency=agency, naics=naics, recipient=recipient)
+
+
+@router.get("/summary")
+def summary():
+    return analytics.summary()
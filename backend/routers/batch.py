@@ -0,0 +1,34 @@
+from fastapi import APIRouter, Query, HTTPException
+from typing import Optional
+import sys, os
+sys.path.insert(0, os.path.dirname(os.path.dirname(__file__)))
+from services import batch_scoring, llm_gateway
+from routers.feed import get_profile_store, dump_profiles
+
+router = APIRouter()
+
+
+@router.post("/score")
+async def score(
+    user_ids: Optional[str] = Query(None),   # comma-separated; defaults to every saved profile
+    max_pairs: int = Query(batch_scoring.MAX_PAIRS, ge=1, le=500_000),
+):
+    """Submit a batch job scoring every stored item the given profiles have no fresh score for."""
+    if not llm_gateway.available():
+        raise HTTPException(503, "OPENAI_API_KEY is not configured")
+    ids = [u.strip() for u in user_ids.split(",") if u.strip()] if user_ids else ["default", *dump_profiles()]
+    profiles = [get_profile_store(u) for u in dict.fromkeys(ids)]
+    return await batch_scoring.create_job(profiles, max_pairs=max_pairs)
+
+
+@router.get("/jobs")
+def jobs():
+    return {"jobs": batch_scoring.jobs()}
+
+
+@router.post("/jobs/{job_id}/poll")
+async def poll(job_id: str):
+    """Check a job now instead of waiting for the poll loop; ingests results when ready."""
+    if job_id not in {j["job_id"] for j in batch_scoring.jobs()}:
+        raise HTTPException(404, "Unknown batch job")
+    return await batch_scoring.poll(job_id)
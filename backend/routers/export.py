@@ -0,0 +1,49 @@
+from fastapi import APIRouter, Query, HTTPException
+from fastapi.responses import StreamingResponse
+from typing import Optional
+import re
+import time
+import sys, os
+sys.path.insert(0, os.path.dirname(os.path.dirname(__file__)))
+from services import export
+from routers.feed import get_profile_store
+
+router = APIRouter()
+
+MEDIA_TYPES = {"ndjson": "application/x-ndjson", "csv": "text/csv"}
+
+
+def _filename(user_id: str, format: str) -> str:
+    # user_id goes into a header: quotes, CR/LF or path separators must not get through
+    safe = re.sub(r"[^A-Za-z0-9_-]", "", user_id)[:64] or "user"
+    return f"feed-export-{safe}-{time.strftime('%Y%m%d-%H%M%S')}.{format}"
+
+
+@router.get("/")
+async def export_feed(
+    user_id: str = Query("default"),
+    sources: str = Query("sam,usaspending,grants"),
+    format: str = Query("ndjson"),
+    cursor: Optional[str] = Query(None),   # export_cursor of the last row received, to resume
+    max_pages: int = Query(50, ge=1, le=1000),   # per source
+    concurrency: int = Query(3, ge=1, le=8),     # pages in flight per source
+):
+    """Stream every opportunity and award matching the user's profile as NDJSON or CSV."""
+    if format not in export.FORMATS:
+        raise HTTPException(400, f"format must be one of {', '.join(export.FORMATS)}")
+    active = [s.strip() for s in sources.split(",") if s.strip() in export.SOURCES]
+    if not active:
+        raise HTTPException(400, f"sources must include one of {', '.join(export.SOURCES)}")
+    if cursor:
+        try:
+            export.decode_cursor(cursor)
+        except ValueError as e:
+            raise HTTPException(400, str(e))
+
+    keywords = get_profile_store(user_id).get("keywords", "")
+    filename = _filename(user_id, format)
+    return StreamingResponse(
+        export.stream(user_id, keywords, active, format, cursor, max_pages, concurrency),
+        media_type=MEDIA_TYPES[format],
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'},
+    )
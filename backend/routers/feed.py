@@ -1,11 +1,19 @@
-from fastapi import APIRouter, Query
+from fastapi import APIRouter, Query, Depends, Header, Request, Response, HTTPException
+from fastapi.responses import StreamingResponse
+import json
+import time
+from typing import Optional
 import asyncio
 import sys, os
 sys.path.insert(0, os.path.dirname(os.path.dirname(__file__)))
-from services import sam_gov, usaspending, grants_gov, ai_ranker
+from services import sam_gov, usaspending, grants_gov, ai_ranker, executor, corpus, dates, admission, scheduler, feed_sync, feed_encoding
 
 router = APIRouter()
 
+# Feed source id -> source_type stored on items
+SOURCE_TYPES = {"sam": "contract", "usaspending": "award", "grants": "grant"}
+SOURCE_IDS = {t: s for s, t in SOURCE_TYPES.items()}
+
 # Simple in-memory profile store
 _profiles: dict = {}
 
@@ -27,20 +35,148 @@ def get_profile_store(user_id: str) -> dict:
     return _get_profile(user_id)
 
 
+def dump_profiles() -> dict:
+    return dict(_profiles)
+
+
+def restore_profiles(data: dict) -> int:
+    # Profiles saved since boot win over the snapshot
+    restored = 0
+    for user_id, profile in data.items():
+        if user_id not in _profiles:
+            _profiles[user_id] = profile
+            restored += 1
+    return restored
+
+
 @router.get("/")
 async def get_feed(
+    request: Request,
     user_id: str = Query("default"),
     sources: str = Query("sam,usaspending,grants"),
     limit: int = Query(15, le=25),
     page: int = Query(1, ge=1),   # 1-based page number passed from frontend
     openai_key: str = Query(""),
+    # Server-side filters — repeat a param to OR values, e.g. ?naics=541512&naics=541715
+    agency: list[str] = Query([]),
+    naics: list[str] = Query([]),
+    set_aside: list[str] = Query([]),
+    source_type: list[str] = Query([]),
+    contract_type: list[str] = Query([]),
+    amount: list[str] = Query([]),   # amount bucket labels, see corpus.AMOUNT_BUCKETS
+    min_amount: Optional[float] = Query(None),
+    max_amount: Optional[float] = Query(None),
+    deadline_from: Optional[str] = Query(None),   # any source date format, e.g. 2025-06-01
+    deadline_to: Optional[str] = Query(None),
+    closing_within_days: Optional[int] = Query(None, ge=0),   # "closing soon" mode
+    facets: bool = Query(False),
+    since: Optional[str] = Query(None),   # sync token from a previous response: return only changes
+    fields: Optional[str] = Query(None),  # "cards", "detail" (default) or a comma-separated list of item fields
+    stream: bool = Query(False),          # NDJSON: each ranking as the model produces it, then the page
+    if_none_match: Optional[str] = Header(None),
+    accept_encoding: Optional[str] = Header(None),
+    level: int = Depends(admission.admitted),
 ):
-    if openai_key:
-        ai_ranker.set_api_key(openai_key)
+    # First pages are what a user is waiting on; deeper pages queue behind them
+    scheduler.bind(user_id, scheduler.priority_for_page(page))
     profile = _get_profile(user_id)
     keywords = profile.get("keywords", "defense")
     active = [s.strip() for s in sources.split(",")]
 
+    filters = {
+        "agency": agency, "naics": naics, "set_aside": set_aside,
+        "source_type": source_type, "contract_type": contract_type, "amount": amount,
+    }
+    ranges = _ranges(min_amount, max_amount, deadline_from, deadline_to, closing_within_days)
+    filtered = any(filters.values()) or any(v is not None for v in ranges.values())
+    if not source_type:
+        filters["source_type"] = [SOURCE_TYPES[s] for s in active if s in SOURCE_TYPES]
+
+    try:
+        variant, keep = feed_encoding.parse_fields(fields)
+    except ValueError as e:
+        raise HTTPException(400, str(e))
+    encoding = feed_encoding.negotiate(accept_encoding)
+
+    # A poll repeating the last ETag within FEED_VIEW_TTL costs a dict lookup.
+    # Projections share the view: they are cut from the same computed page.
+    params = [(k, v) for k, v in request.query_params.multi_items()
+              if k not in ("openai_key", "since", "fields", "stream")]
+    view = feed_sync.view_key(user_id, ai_ranker.profile_fingerprint(profile), params + [("llm", bool(openai_key))])
+    entry = feed_sync.cached(view)
+    order = "deadline" if closing_within_days is not None else "newest"
+
+    def build(on_ranking=None):
+        return _build_feed(profile, keywords, active, filters, ranges, filtered, order,
+                           limit, page, facets, level, openai_key, on_ranking)
+
+    if stream:
+        return StreamingResponse(_stream_feed(user_id, page, view, entry, build, keep),
+                                 media_type="application/x-ndjson", headers={"Cache-Control": "no-store"})
+    if entry is None:
+        body = await build()
+        etag = feed_sync.remember(view, body)
+    else:
+        body, etag = entry["body"], entry["etag"]
+
+    tag = feed_encoding.tag(etag, variant, encoding)
+    headers = {"ETag": f'"{tag}"', "Cache-Control": "no-cache", "Vary": "Accept-Encoding"}
+    if feed_sync.matches(if_none_match, tag):
+        feed_sync.not_modified()
+        return Response(status_code=304, headers=headers)
+    if since:
+        # Deltas depend on the client's token, so they are encoded per request
+        content, used = feed_encoding.render(feed_sync.delta(since, etag, body), keep, encoding)
+    else:
+        # The token rides in the body as well as the ETag, like the streamed "feed" line
+        content, used = feed_sync.encoded(view, (variant, encoding),
+                                          lambda: feed_encoding.render({**body, "sync_token": etag}, keep, encoding))
+    if used:
+        headers["Content-Encoding"] = used
+    return Response(content, media_type="application/json", headers=headers)
+
+
+async def _stream_feed(user_id: str, page: int, view: str, entry: dict | None, build, keep):
+    """NDJSON lines: {"event": "ranking", "item"} per item as the ranker scores it, then
+    {"event": "feed", ...} with the complete page, exactly as a plain request returns it."""
+    # Runs in the response task, so bind here rather than in the endpoint
+    scheduler.bind(user_id, scheduler.priority_for_page(page))
+    if entry is None:
+        queue: asyncio.Queue = asyncio.Queue()
+
+        def on_ranking(item: dict, ranking: dict):
+            card = {f: item[f] for f in feed_encoding.CARD_FIELDS if f in item}
+            card.update(relevance_score=ranking.get("score"), ai_summary=ranking.get("summary", ""))
+            queue.put_nowait({"event": "ranking", "item": card})
+
+        # The admission dependency has already exited by the time the body runs
+        with admission.in_flight():
+            task = asyncio.create_task(build(on_ranking))
+            task.add_done_callback(lambda _: queue.put_nowait(None))
+            try:
+                while (event := await queue.get()) is not None:
+                    yield json.dumps(event, default=str) + "\n"
+                body = task.result()
+            finally:
+                task.cancel()
+        etag = feed_sync.remember(view, body)
+    else:
+        body, etag = entry["body"], entry["etag"]
+    yield json.dumps({"event": "feed", "sync_token": etag, **feed_encoding.project(body, keep)}, default=str) + "\n"
+
+
+async def _build_feed(profile: dict, keywords: str, active: list[str], filters: dict, ranges: dict,
+                      filtered: bool, order: str, limit: int, page: int, facets: bool, level: int,
+                      openai_key: str, on_ranking=None) -> dict:
+    if filtered or level >= admission.CACHE_ONLY:
+        # Filtered queries, and everything under heavy load, are answered from
+        # the stored corpus — no upstream fan-out
+        return await _corpus_feed(filters, ranges, order, limit, page, profile, facets, level, openai_key,
+                                  on_ranking)
+
+    if level >= admission.REDUCED_FANOUT:
+        active = admission.fastest([s for s in active if s in SOURCE_TYPES])
+
     # Pass the page number directly to each source so they fetch a fresh page
     tasks = []
     task_names = []
@@ -60,6 +196,7 @@ async def get_feed(
     all_items = []
     source_counts = {}
     has_more_flags = []
+    throttled = {}   # source -> seconds until this user's share allows another call
 
     for name, result in zip(task_names, results):
         if isinstance(result, dict):
@@ -67,6 +204,8 @@ async def get_feed(
             all_items.extend(items)
             source_counts[name] = result.get("total_on_page", len(items))
             has_more_flags.append(result.get("has_more", False))
+            if result.get("throttled"):
+                throttled[name] = result.get("retry_after", 0)
         elif isinstance(result, list):
             # fallback if source returns plain list
             all_items.extend(result)
@@ -77,24 +216,145 @@ async def get_feed(
             source_counts[name] = 0
             has_more_flags.append(False)
 
+    # Unchanged items are a no-op here; amended ones are marked with what changed
+    corpus.upsert(all_items)
+    # Source results are shared (SAM's page cache, the mock lists); rank copies so
+    # another user's scores never land in a page cached under this view's ETag
+    all_items = [dict(i) for i in all_items]
+    corpus.annotate(all_items)
+    ranked = await _rank(all_items, profile, use_llm=level == admission.FULL, api_key=openai_key,
+                         on_ranking=on_ranking)
+
+    # Feed has more if ANY source still has more pages
+    has_more = any(has_more_flags)
+
+    response = {
+        "items": ranked,
+        "total": len(ranked),
+        "has_more": has_more,
+        "page": page,
+        "source_counts": source_counts,
+        "profile": profile,
+        "degradation": admission.describe(level),
+    }
+    if throttled:
+        response["throttled"] = throttled
+    if facets:
+        response["facets"] = corpus.facet_counts(filters)
+    return response
+
+
+async def _rank(items: list[dict], profile: dict, use_llm: bool = True, api_key: str = "",
+                on_ranking=None) -> list[dict]:
     # AI rank + summarize — wrapped so a bad key never takes down the feed
     try:
-        ranked = await ai_ranker.rank_and_summarize(all_items, profile)
+        return await ai_ranker.rank_and_summarize(items, profile, use_llm=use_llm, api_key=api_key,
+                                                  on_ranking=on_ranking)
     except Exception as e:
         print(f"[Feed] AI ranker raised unexpectedly: {type(e).__name__}: {e}")
-        ranked = ai_ranker._keyword_rank(all_items, profile)
+        return await executor.run_cpu(ai_ranker._keyword_rank, items, profile, size=len(items))
 
-    # Feed has more if ANY source still has more pages
-    has_more = any(has_more_flags)
 
-    return {
+def _date(name: str, value: str | None, end_of_day: bool = False) -> int | None:
+    # A typo must not quietly widen the query to every deadline
+    if not value:
+        return None
+    ts = dates.to_epoch(value, end_of_day=end_of_day)
+    if ts is None:
+        raise HTTPException(400, f"{name} must be a date like 2025-06-01, got {value!r}")
+    return ts
+
+
+def _ranges(min_amount, max_amount, deadline_from, deadline_to, closing_within_days) -> dict:
+    ranges = {
+        "min_amount": min_amount,
+        "max_amount": max_amount,
+        "deadline_from": _date("deadline_from", deadline_from),
+        "deadline_to": _date("deadline_to", deadline_to, end_of_day=True),
+    }
+    if closing_within_days is not None:
+        now = int(time.time())
+        ranges["deadline_from"] = max(ranges["deadline_from"] or now, now)
+        ranges["deadline_to"] = now + closing_within_days * dates.DAY
+    return ranges
+
+
+async def _corpus_feed(filters: dict, ranges: dict, order: str, limit: int, page: int, profile: dict,
+                       with_facets: bool, level: int = admission.FULL, api_key: str = "",
+                       on_ranking=None) -> dict:
+    offset = (page - 1) * limit
+    items, total = corpus.query(filters, offset=offset, limit=limit, order=order, **ranges)
+    corpus.annotate(items)
+    ranked = await _rank(items, profile, use_llm=level == admission.FULL, api_key=api_key,
+                         on_ranking=on_ranking)
+    if order == "deadline":
+        # Keep the closing-soon order; the ranker still adds scores and summaries
+        ranked.sort(key=lambda x: x["deadline_ts"])
+
+    source_counts = {}
+    for item in ranked:
+        name = SOURCE_IDS.get(item.get("source_type"), item.get("source_type"))
+        source_counts[name] = source_counts.get(name, 0) + 1
+
+    response = {
         "items": ranked,
         "total": len(ranked),
-        "has_more": has_more,
+        "total_matches": total,
+        "has_more": offset + limit < total,
         "page": page,
         "source_counts": source_counts,
         "profile": profile,
+        "degradation": admission.describe(level),
+    }
+    if with_facets:
+        response["facets"] = corpus.facet_counts(filters, **ranges)
+    return response
+
+
+@router.get("/facets")
+def get_facets(
+    agency: list[str] = Query([]),
+    naics: list[str] = Query([]),
+    set_aside: list[str] = Query([]),
+    source_type: list[str] = Query([]),
+    contract_type: list[str] = Query([]),
+    amount: list[str] = Query([]),
+    min_amount: Optional[float] = Query(None),
+    max_amount: Optional[float] = Query(None),
+    deadline_from: Optional[str] = Query(None),
+    deadline_to: Optional[str] = Query(None),
+    closing_within_days: Optional[int] = Query(None, ge=0),
+):
+    """Facet counts over the stored corpus without fetching a page of items."""
+    filters = {
+        "agency": agency, "naics": naics, "set_aside": set_aside,
+        "source_type": source_type, "contract_type": contract_type, "amount": amount,
     }
+    return {
+        "facets": corpus.facet_counts(
+            filters, **_ranges(min_amount, max_amount, deadline_from, deadline_to, closing_within_days)
+        ),
+        "corpus": corpus.stats(),
+    }
+
+
+@router.get("/changes")
+def get_changes(
+    since: float = Query(0),   # epoch seconds; pass the newest "ts" seen last time
+    kind: list[str] = Query(["new", "amended"]),
+    limit: int = Query(500, ge=1, le=5000),
+):
+    """New and amended items since a point in time, oldest first, with the fields that changed."""
+    return {"changes": corpus.changes_since(since, tuple(kind), limit), "stats": corpus.version_stats()}
+
+
+@router.get("/items/{item_id}/history")
+def get_item_history(item_id: str):
+    """Stored versions of an item, each with the fields that changed from the one before."""
+    history = corpus.history(item_id)
+    if not history:
+        raise HTTPException(404, "Item not found")
+    return {"id": item_id, "current": corpus.get(item_id), "versions": history}
 
 
 @router.get("/sources")
@@ -25,9 +25,7 @@ class ProfileDirect(BaseModel):
 
 @router.post("/from-text")
 async def create_from_text(data: ProfileFromText):
-    if data.openai_api_key:
-        ai_ranker.set_api_key(data.openai_api_key)
-    profile = await ai_ranker.parse_profile_from_text(data.raw_input)
+    profile = await ai_ranker.parse_profile_from_text(data.raw_input, api_key=data.openai_api_key)
     profile["raw_input"] = data.raw_input
     set_profile(data.user_id, profile)
     return {"profile": profile}
@@ -35,8 +33,6 @@ async def create_from_text(data: ProfileFromText):
 
 @router.post("/update")
 async def update_profile(data: ProfileDirect):
-    if data.openai_api_key:
-        ai_ranker.set_api_key(data.openai_api_key)
     profile = {
         "keywords": data.keywords,
         "focus": data.focus or data.keywords,
@@ -0,0 +1,146 @@
+import os
+import time
+from contextlib import contextmanager
+from fastapi import HTTPException
+from services import executor
+
+# Admission control and graceful degradation for /api/feed.
+#
+# Load is read from three signals — requests in flight, event-loop lag and the
+# upstream latency (EWMA per source) — each divided by its budget. The worst
+# ratio picks a degradation level. An upstream reading fades with a half-life
+# of UPSTREAM_HALF_LIFE seconds since its last sample: a source that is no
+# longer called (dropped by reduced_fanout, or everything under cache_only)
+# can't hold the level up forever, and once pressure falls the feed calls it
+# again and measures it afresh. Levels go up immediately and come down one
+# step per LEVEL_COOLDOWN seconds, so the feed doesn't flap at a threshold.
+# Past HARD_CAP in-flight requests, new requests are rejected with 503.
+
+SOFT_INFLIGHT = int(os.getenv("ADMIT_SOFT_INFLIGHT", 32))
+HARD_CAP = int(os.getenv("ADMIT_HARD_CAP", 128))
+LAG_BUDGET_MS = float(os.getenv("ADMIT_LAG_BUDGET_MS", 100))
+UPSTREAM_BUDGET_MS = float(os.getenv("ADMIT_UPSTREAM_BUDGET_MS", 4000))
+LEVEL_COOLDOWN = 10.0   # seconds at a lower pressure before stepping down a level
+RETRY_AFTER = 5         # seconds suggested to rejected clients
+EWMA_ALPHA = 0.2
+UPSTREAM_HALF_LIFE = float(os.getenv("ADMIT_UPSTREAM_HALF_LIFE", 30))   # seconds
+
+FULL, KEYWORD_RANK, REDUCED_FANOUT, CACHE_ONLY = range(4)
+MODES = {
+    FULL: "full",
+    KEYWORD_RANK: "keyword_rank",       # skip the LLM, rank with _keyword_rank
+    REDUCED_FANOUT: "reduced_fanout",   # ...and only query the fastest sources
+    CACHE_ONLY: "cache_only",           # ...and serve from the stored corpus, no upstream calls
+}
+# Pressure (worst signal / budget) at which each level starts
+LEVEL_THRESHOLDS = [(CACHE_ONLY, 2.0), (REDUCED_FANOUT, 1.5), (KEYWORD_RANK, 1.0)]
+REDUCED_SOURCES = 2
+
+_in_flight = 0
+_level = FULL
+_level_since = time.time()
+_upstream_ms: dict = {}   # source -> (EWMA latency, time of last sample)
+_counters = {"admitted": 0, "rejected": 0, "by_level": {mode: 0 for mode in MODES.values()}}
+
+
+def _upstream(source: str, now: float | None = None) -> float:
+    """A source's latency EWMA, decayed by the time since it was last sampled."""
+    ewma, ts = _upstream_ms.get(source, (0.0, 0.0))
+    age = (time.time() if now is None else now) - ts
+    return ewma * 0.5 ** (max(age, 0.0) / UPSTREAM_HALF_LIFE)
+
+
+def _pressure() -> dict:
+    now = time.time()
+    worst_upstream = max((_upstream(s, now) for s in _upstream_ms), default=0.0)
+    return {
+        "in_flight": _in_flight / SOFT_INFLIGHT,
+        "loop_lag": executor.current_lag_ms() / LAG_BUDGET_MS,
+        "upstream": worst_upstream / UPSTREAM_BUDGET_MS,
+    }
+
+
+def _target_level(pressure: float) -> int:
+    for level, threshold in LEVEL_THRESHOLDS:
+        if pressure >= threshold:
+            return level
+    return FULL
+
+
+def current_level() -> int:
+    global _level, _level_since
+    target = _target_level(max(_pressure().values()))
+    now = time.time()
+    if target > _level:
+        _level, _level_since = target, now
+    elif target < _level and now - _level_since >= LEVEL_COOLDOWN:
+        _level, _level_since = _level - 1, now
+    return _level
+
+
+async def admitted():
+    """FastAPI dependency: admit the request (or 503) and yield its degradation level."""
+    if _in_flight >= HARD_CAP:
+        _counters["rejected"] += 1
+        raise HTTPException(
+            status_code=503,
+            detail="Feed is overloaded, retry shortly",
+            headers={"Retry-After": str(RETRY_AFTER)},
+        )
+    level = current_level()
+    _counters["admitted"] += 1
+    _counters["by_level"][MODES[level]] += 1
+    with in_flight():
+        yield level
+
+
+@contextmanager
+def in_flight():
+    """Count work towards HARD_CAP and in-flight pressure while the block runs.
+
+    admitted() covers the endpoint; a StreamingResponse body runs after the
+    dependency has exited, so a streamed build holds its own count.
+    """
+    global _in_flight
+    _in_flight += 1
+    try:
+        yield
+    finally:
+        _in_flight -= 1
+
+
+def record_upstream(source: str, seconds: float):
+    ms = seconds * 1000
+    prev = _upstream(source) if source in _upstream_ms else None
+    _upstream_ms[source] = (ms if prev is None else prev + EWMA_ALPHA * (ms - prev), time.time())
+
+
+async def timed(source: str, coro):
+    """Await one outbound call to an upstream and feed its latency into the EWMA.
+
+    Wrap only the HTTP call: scheduler queueing and cache hits aren't upstream latency.
+    """
+    started = time.perf_counter()
+    try:
+        return await coro
+    finally:
+        record_upstream(source, time.perf_counter() - started)
+
+
+def fastest(sources: list[str], n: int = REDUCED_SOURCES) -> list[str]:
+    """The n sources with the lowest observed latency (unmeasured ones count as fast)."""
+    return sorted(sources, key=_upstream)[:n]
+
+
+def describe(level: int) -> dict:
+    return {"level": level, "mode": MODES[level]}
+
+
+def metrics() -> dict:
+    return {
+        "level": describe(_level),
+        "in_flight": _in_flight,
+        "pressure": {k: round(v, 3) for k, v in _pressure().items()},
+        "upstream_ewma_ms": {k: round(_upstream(k), 1) for k in _upstream_ms},
+        **_counters,
+    }
@@ -1,105 +1,256 @@
-import os
 import json
+import os
 import re
+import time
+import hashlib
+from collections import OrderedDict
+from services import executor, json_stream, llm_gateway, versions
 
-# Module-level key store — survives across requests in the same process
-_openai_key: str = ""
+# LLM scores per (profile fingerprint, item): { key: {"score", "summary", "ts"} }.
+# Least recently used first; past RANK_CACHE_MAX entries the oldest are
+# dropped, and prune_expired() clears entries past their ttl.
+_rank_cache: OrderedDict = OrderedDict()
+RANK_CACHE_TTL = 6 * 3600
+RANK_CACHE_MAX = int(os.getenv("RANK_CACHE_MAX", 200_000))
 
 
-def set_api_key(key: str):
-    global _openai_key
-    if key:
-        _openai_key = key
-        os.environ["OPENAI_API_KEY"] = key
+RANKING_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "rankings": {
+            "type": "array",
+            "items": {
+                "type": "object",
+                "properties": {
+                    "idx": {"type": "integer"},
+                    "score": {"type": "integer"},
+                    "summary": {"type": "string"},
+                },
+                "required": ["idx", "score", "summary"],
+                "additionalProperties": False,
+            },
+        },
+    },
+    "required": ["rankings"],
+    "additionalProperties": False,
+}
 
+PROFILE_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "keywords": {"type": "string"},
+        "org_type": {"type": "string"},
+        "focus": {"type": "string"},
+        "agencies": {"type": "array", "items": {"type": "string"}},
+    },
+    "required": ["keywords", "org_type", "focus", "agencies"],
+    "additionalProperties": False,
+}
+
+
+def profile_fingerprint(profile: dict) -> str:
+    """Stable id for the parts of a profile that affect LLM scores."""
+    basis = f"{profile.get('keywords', '')}|{profile.get('focus', '')}".lower()
+    return hashlib.sha1(basis.encode()).hexdigest()[:12]
+
+
+def _rank_key(fingerprint: str, item: dict) -> str:
+    # Keyed on content too, so an amended notice is rescored and an unchanged one isn't
+    content = item.get("content_hash") or versions.content_hash(item)
+    return f"{fingerprint}:{item.get('id', '')}:{content}"
+
+
+def _fresh(entry: dict | None, now: float) -> bool:
+    # Batch-scored entries carry their own, longer ttl
+    return entry is not None and now - entry["ts"] < entry.get("ttl", RANK_CACHE_TTL)
+
+
+def _cached_rankings(fingerprint: str, items: list[dict]) -> list[dict]:
+    now = time.time()
+    found = []
+    for i, item in enumerate(items):
+        key = _rank_key(fingerprint, item)
+        entry = _rank_cache.get(key)
+        if _fresh(entry, now):
+            _rank_cache.move_to_end(key)
+            found.append({"idx": i, "score": entry["score"], "summary": entry["summary"]})
+    return found
+
+
+def is_scored(fingerprint: str, item: dict) -> bool:
+    return _fresh(_rank_cache.get(_rank_key(fingerprint, item)), time.time())
+
+
+def _store_rankings(fingerprint: str, items: list[dict], rankings: list[dict], ttl: float | None = None) -> int:
+    now = time.time()
+    stored = 0
+    for r in rankings:
+        idx = r.get("idx")
+        if isinstance(idx, int) and 0 <= idx < len(items) and "score" in r:
+            entry = {"score": r["score"], "summary": r.get("summary", ""), "ts": now}
+            if ttl:
+                entry["ttl"] = ttl
+            key = _rank_key(fingerprint, items[idx])
+            _rank_cache[key] = entry
+            _rank_cache.move_to_end(key)
+            stored += 1
+    _evict()
+    return stored
 
-def get_openai_client():
-    try:
-        from openai import AsyncOpenAI
-        api_key = _openai_key or os.getenv("OPENAI_API_KEY", "")
-        if not api_key:
-            return None
-        return AsyncOpenAI(api_key=api_key)
-    except ImportError:
-        return None
 
+def _evict():
+    while len(_rank_cache) > RANK_CACHE_MAX:
+        _rank_cache.popitem(last=False)
 
-async def rank_and_summarize(items: list[dict], user_profile: dict) -> list[dict]:
+
+def prune_expired(now: float | None = None) -> int:
+    """Drop rankings past their ttl. Returns how many were removed."""
+    now = time.time() if now is None else now
+    expired = [k for k, v in _rank_cache.items() if not _fresh(v, now)]
+    for key in expired:
+        del _rank_cache[key]
+    return len(expired)
+
+
+def dump_rank_cache() -> dict:
+    now = time.time()
+    return {k: v for k, v in _rank_cache.items() if _fresh(v, now)}
+
+
+def restore_rank_cache(data: dict) -> int:
+    restored = 0
+    now = time.time()
+    # Restored entries go in front of anything scored since boot, oldest at the very front
+    for key, entry in sorted(data.items(), key=lambda kv: kv[1]["ts"], reverse=True):
+        if key not in _rank_cache and _fresh(entry, now):
+            _rank_cache[key] = entry
+            _rank_cache.move_to_end(key, last=False)
+            restored += 1
+    _evict()
+    return restored
+
+
+async def rank_and_summarize(items: list[dict], user_profile: dict, use_llm: bool = True,
+                             api_key: str | None = None, on_ranking=None) -> list[dict]:
     """Use OpenAI to rank items by relevance and generate summaries.
     Always falls back to keyword ranking — never raises, never crashes the feed.
+    Items scored for the same profile recently are served from the ranking cache;
+    with use_llm=False (load shedding) anything not cached is keyword-ranked.
+    api_key is the caller's OpenAI key; the server key is used when it's empty.
+
+    The completion is streamed and each ranking is used as soon as its JSON
+    element closes: it is cached, and on_ranking(item, ranking) is called for a
+    streaming consumer (cached rankings are reported first). If the stream
+    breaks or is cut off, the rankings already received are kept and only the
+    remaining items are keyword-ranked.
     """
     if not items:
         return items
 
-    oai = get_openai_client()
-    if not oai:
-        return _keyword_rank(items, user_profile)
+    fingerprint = profile_fingerprint(user_profile)
+    cached = _cached_rankings(fingerprint, items[:40])
+    if on_ranking:
+        for r in cached:
+            on_ranking(items[r["idx"]], r)
+    if len(cached) == len(items[:40]):
+        return await executor.run_threaded(_apply_rankings, items, cached, size=len(items))
 
-    interests = user_profile.get("keywords", "")
-    focus = user_profile.get("focus", interests)
+    if not use_llm or not llm_gateway.available(api_key):
+        # Keep what's cached; keyword scores only fill in the rest
+        return await executor.run_cpu(_apply_partial, items, cached, user_profile, size=len(items))
 
-    item_summaries = []
-    for i, item in enumerate(items[:40]):
-        item_summaries.append({
-            "idx": i,
-            "title": item.get("title", ""),
-            "agency": item.get("agency", ""),
-            "type": item.get("source_type", ""),
-            "amount": item.get("award_amount"),
-            "snippet": (item.get("description") or "")[:300],
-        })
+    cached_idx = {r["idx"] for r in cached}
+    prompt = ranking_prompt(user_profile, [
+        _item_summary(i, item) for i, item in enumerate(items[:40]) if i not in cached_idx
+    ])
+
+    rankings = []
+    try:
+        parser = json_stream.ArrayElements("rankings")
+        async for text in llm_gateway.stream_json(
+            prompt, "feed_rankings", RANKING_SCHEMA, api_key=api_key, max_tokens=2500,
+        ):
+            for r in parser.feed(text):
+                if isinstance(r, dict) and _store_rankings(fingerprint, items, [r]):
+                    rankings.append(r)
+                    if on_ranking:
+                        on_ranking(items[r["idx"]], r)
+        if parser.errors or not parser.done:
+            print(f"[AI Ranker] Ranking stream incomplete ({len(rankings)} parsed, {parser.errors} malformed)"
+                  " — keyword-ranking the rest")
+
+    except Exception as e:
+        # Catch everything the gateway gives up on (RateLimitError,
+        # AuthenticationError, APIConnectionError...) — never crash the feed request
+        err_type = type(e).__name__
+        err_msg = str(e)[:120]
+
+        if "insufficient_quota" in err_msg or "RateLimit" in err_type:
+            print(f"[AI Ranker] OpenAI quota exceeded — falling back to keyword ranking. Add credits at platform.openai.com")
+        elif "AuthenticationError" in err_type or "invalid_api_key" in err_msg:
+            # The gateway remembers the bad key so we stop trying it
+            print(f"[AI Ranker] OpenAI key invalid — falling back to keyword ranking")
+        else:
+            print(f"[AI Ranker] {err_type}: {err_msg} — falling back to keyword ranking"
+                  + (f" for all but {len(rankings)} streamed rankings" if rankings else ""))
 
-    prompt = f"""You are a government contracting intelligence analyst.
+    if not rankings and not cached:
+        return await executor.run_cpu(_keyword_rank, items, user_profile, size=len(items))
+    return await executor.run_cpu(_apply_partial, items, cached + rankings, user_profile, size=len(items))
+
+
+def _item_summary(idx: int, item: dict) -> dict:
+    return {
+        "idx": idx,
+        "title": item.get("title", ""),
+        "agency": item.get("agency", ""),
+        "type": item.get("source_type", ""),
+        "amount": item.get("award_amount"),
+        "snippet": (item.get("description") or "")[:300],
+    }
+
+
+def ranking_prompt(user_profile: dict, item_summaries: list[dict]) -> str:
+    interests = user_profile.get("keywords", "")
+    focus = user_profile.get("focus", interests)
+    return f"""You are a government contracting intelligence analyst.
 
 User focus: "{focus}"
 User keywords: "{interests}"
 
 Score each item 0-100 for relevance to this user. Write a sharp, specific 1-sentence summary (max 18 words) explaining WHY it's relevant — not just what it is.
 
-Return ONLY a JSON array, no markdown:
-[{{"idx": 0, "score": 85, "summary": "Directly targets your AI/ISR work — $120M NAVAIR award with sensor fusion scope"}}]
+Return {{"rankings": [...]}} with one entry per item, e.g.:
+{{"rankings": [{{"idx": 0, "score": 85, "summary": "Directly targets your AI/ISR work — $120M NAVAIR award with sensor fusion scope"}}]}}
 
 Items:
 {json.dumps(item_summaries)}"""
 
-    try:
-        response = await oai.chat.completions.create(
-            model="gpt-4o-mini",
-            messages=[{"role": "user", "content": prompt}],
-            temperature=0.2,
-            max_tokens=2500,
-        )
-        raw = response.choices[0].message.content.strip()
-        raw = re.sub(r"^```[a-z]*\n?", "", raw)
-        raw = re.sub(r"\n?```$", "", raw)
-        rankings = json.loads(raw.strip())
-
-        score_map = {r["idx"]: r for r in rankings}
-        for i, item in enumerate(items[:40]):
-            r = score_map.get(i, {})
-            item["relevance_score"] = r.get("score", 50)
-            item["ai_summary"] = r.get("summary", "")
 
-        items[:40] = sorted(items[:40], key=lambda x: x.get("relevance_score", 0), reverse=True)
-        return items
+def _apply_rankings(items: list[dict], rankings: list[dict]) -> list[dict]:
+    score_map = {r["idx"]: r for r in rankings}
+    for i, item in enumerate(items[:40]):
+        r = score_map.get(i, {})
+        item["relevance_score"] = r.get("score", 50)
+        item["ai_summary"] = r.get("summary", "")
 
-    except Exception as e:
-        # Catch everything including RateLimitError, AuthenticationError,
-        # APIConnectionError, JSONDecodeError — never crash the feed request
-        err_type = type(e).__name__
-        err_msg = str(e)[:120]
+    items[:40] = sorted(items[:40], key=lambda x: x.get("relevance_score", 0), reverse=True)
+    return items
 
-        if "insufficient_quota" in err_msg or "RateLimit" in err_type:
-            print(f"[AI Ranker] OpenAI quota exceeded — falling back to keyword ranking. Add credits at platform.openai.com")
-        elif "AuthenticationError" in err_type or "invalid_api_key" in err_msg:
-            print(f"[AI Ranker] OpenAI key invalid — falling back to keyword ranking")
-            # Clear the bad key so we stop trying
-            global _openai_key
-            _openai_key = ""
-        else:
-            print(f"[AI Ranker] {err_type}: {err_msg} — falling back to keyword ranking")
 
-        return _keyword_rank(items, user_profile)
+def _apply_partial(items: list[dict], rankings: list[dict], profile: dict) -> list[dict]:
+    """LLM rankings where there are some, keyword scores for the rest of the first 40."""
+    ranked = {r["idx"] for r in rankings}
+    _keyword_rank([item for i, item in enumerate(items[:40]) if i not in ranked], profile)
+    score_map = {r["idx"]: r for r in rankings}
+    for i, item in enumerate(items[:40]):
+        r = score_map.get(i)
+        if r is not None:
+            item["relevance_score"] = r["score"]
+            item["ai_summary"] = r.get("summary", "")
+
+    items[:40] = sorted(items[:40], key=lambda x: x.get("relevance_score", 0), reverse=True)
+    return items
 
 
 def _keyword_rank(items: list[dict], profile: dict) -> list[dict]:
@@ -121,10 +272,9 @@ def _keyword_rank(items: list[dict], profile: dict) -> list[dict]:
     return sorted(items, key=lambda x: x.get("relevance_score", 0), reverse=True)
 
 
-async def parse_profile_from_text(raw_input: str) -> dict:
+async def parse_profile_from_text(raw_input: str, api_key: str | None = None) -> dict:
     """Extract structured keywords and focus from free-text description."""
-    oai = get_openai_client()
-    if not oai:
+    if not llm_gateway.available(api_key):
         return {
             "keywords": raw_input,
             "org_type": "",
@@ -136,7 +286,7 @@ async def parse_profile_from_text(raw_input: str) -> dict:
 
 "{raw_input}"
 
-Return ONLY JSON (no markdown):
+Return JSON:
 {{
   "keywords": "3-8 comma-separated search terms optimized for SAM.gov, e.g.: counter-UAS, autonomous systems, C2",
   "org_type": "small business / large prime / research university / nonprofit / etc",
@@ -145,16 +295,9 @@ Return ONLY JSON (no markdown):
 }}"""
 
     try:
-        response = await oai.chat.completions.create(
-            model="gpt-4o-mini",
-            messages=[{"role": "user", "content": prompt}],
-            temperature=0.2,
-            max_tokens=400,
+        return await llm_gateway.complete_json(
+            prompt, "search_profile", PROFILE_SCHEMA, api_key=api_key, max_tokens=400,
         )
-        raw = response.choices[0].message.content.strip()
-        raw = re.sub(r"^```[a-z]*\n?", "", raw)
-        raw = re.sub(r"\n?```$", "", raw)
-        return json.loads(raw.strip())
     except Exception as e:
         print(f"[AI Profile] {type(e).__name__}: {str(e)[:120]}")
         return {"keywords": raw_input, "org_type": "", "focus": raw_input[:100], "agencies": []}
@@ -0,0 +1,377 @@
+import asyncio
+import json
+import os
+import time
+
+import httpx
+import numpy as np
+
+from services import usaspending, dates, award_archive
+
+# Columnar award store for market-sizing queries.
+#
+# Award rows live in one .npy file per column under ANALYTICS_DIR and are read
+# back with mmap_mode="r", so queries touch only the pages they need and every
+# worker shares the OS page cache. Agency, recipient, NAICS and the keyword set
+# an award was ingested for are dictionary-encoded: the column holds int32 codes
+# and <name>.json holds the code -> string list. Group-by is then a single
+# np.bincount over the codes.
+#
+# An award found under several keyword sets is stored once per set. Queries
+# without a keyword set count each award id once (its most recent ingest), via
+# a first-occurrence mask computed once per generation.
+
+ANALYTICS_DIR = os.getenv("ANALYTICS_DIR", os.path.join(os.path.dirname(os.path.dirname(__file__)), "data", "analytics"))
+
+DICT_COLUMNS = ("agency", "recipient", "naics", "keywords")
+COLUMNS = {
+    "award_id": "S64",
+    "agency": np.int32,
+    "recipient": np.int32,
+    "naics": np.int32,
+    "keywords": np.int32,
+    "amount": np.float64,
+    "day": np.int32,   # period-of-performance start, days since 1970-01-01 (-1 if unknown)
+}
+BUCKETS = ("day", "week", "month", "quarter", "year")
+
+# Currently mapped generation. Replaced wholesale on reload so a query running
+# alongside an ingest always sees one consistent set of columns.
+_state: dict = {"generation": None, "columns": {}, "dicts": {}, "codes": {}, "distinct": None}
+_ingest_lock = asyncio.Lock()
+
+
+def _path(name: str) -> str:
+    return os.path.join(ANALYTICS_DIR, name)
+
+
+def _read_manifest() -> dict:
+    try:
+        with open(_path("manifest.json")) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {"generation": 0, "rows": 0}
+
+
+def _load() -> dict:
+    """Current state, remapping first if an ingest (here or in another process) published."""
+    global _state
+    manifest = _read_manifest()
+    if manifest["generation"] == _state["generation"]:
+        return _state
+    columns = {}
+    for name, dtype in COLUMNS.items():
+        path = _path(f"{name}.npy")
+        if manifest["rows"] and os.path.exists(path):
+            columns[name] = np.load(path, mmap_mode="r")
+        else:
+            columns[name] = np.empty(0, dtype=dtype)
+    dicts = {}
+    for name in DICT_COLUMNS:
+        try:
+            with open(_path(f"{name}.json")) as f:
+                dicts[name] = json.load(f)
+        except (OSError, ValueError):
+            dicts[name] = []
+    _state = {"generation": manifest["generation"], "columns": columns, "dicts": dicts, "codes": {}, "distinct": None}
+    return _state
+
+
+def _lookup(state: dict, name: str, value: str) -> int | None:
+    codes = state["codes"].get(name)
+    if codes is None:
+        codes = state["codes"][name] = {v: i for i, v in enumerate(state["dicts"][name])}
+    return codes.get(value)
+
+
+def _distinct(state: dict) -> np.ndarray:
+    """Row mask keeping one row per award id: the last one ingested."""
+    if state["distinct"] is None:
+        ids = np.asarray(state["columns"]["award_id"])[::-1]
+        _, last = np.unique(ids, return_index=True)
+        mask = np.zeros(len(ids), dtype=bool)
+        mask[len(ids) - 1 - last] = True
+        state["distinct"] = mask
+    return state["distinct"]
+
+
+def _write_atomic(path: str, write):
+    tmp = f"{path}.{os.getpid()}.tmp"
+    with open(tmp, "wb") as f:
+        write(f)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp, path)
+
+
+def _append(items: list[dict], keywords: str) -> int:
+    """Add award items (usaspending._parse output) not already stored for this keyword set."""
+    state = _load()
+    columns = state["columns"]
+    dicts = {name: list(values) for name, values in state["dicts"].items()}
+    lookups = {name: {v: i for i, v in enumerate(values)} for name, values in dicts.items()}
+
+    def code(name: str, value: str) -> int:
+        if value not in lookups[name]:
+            lookups[name][value] = len(dicts[name])
+            dicts[name].append(value)
+        return lookups[name][value]
+
+    kw = code("keywords", keywords.strip().lower())
+    seen = set(columns["award_id"][columns["keywords"] == kw].tolist())
+
+    new = {name: [] for name in COLUMNS}
+    for item in items:
+        award_id = item["id"].encode()[:64]
+        if award_id in seen:
+            continue
+        seen.add(award_id)
+        posted = item.get("posted_ts")
+        new["award_id"].append(award_id)
+        new["agency"].append(code("agency", item.get("agency") or ""))
+        new["recipient"].append(code("recipient", item.get("recipient") or ""))
+        new["naics"].append(code("naics", item.get("naics") or ""))
+        new["keywords"].append(kw)
+        new["amount"].append(float(item.get("award_amount") or 0))
+        new["day"].append(posted // dates.DAY if posted is not None else -1)
+    if not new["award_id"]:
+        return 0
+
+    os.makedirs(ANALYTICS_DIR, exist_ok=True)
+    for name, dtype in COLUMNS.items():
+        merged = np.concatenate([np.asarray(columns[name]), np.array(new[name], dtype=dtype)])
+        _write_atomic(_path(f"{name}.npy"), lambda f: np.save(f, merged))
+    for name in DICT_COLUMNS:
+        _write_atomic(_path(f"{name}.json"), lambda f: f.write(json.dumps(dicts[name]).encode()))
+    manifest = {"generation": time.time_ns(), "rows": len(columns["award_id"]) + len(new["award_id"])}
+    # The manifest goes last — readers only switch once every column is in place
+    _write_atomic(_path("manifest.json"), lambda f: f.write(json.dumps(manifest).encode()))
+    _load()
+    return len(new["award_id"])
+
+
+COPY_ROWS = 131_072     # rows per slice when rewriting columns (8 MB of award ids)
+
+
+def append_stream(batches, keywords: str) -> int:
+    """Store award items arriving as an iterable of batches under one keyword set.
+
+    Used for bulk archives, where the rows don't fit in memory. Each batch is
+    encoded and spilled to a raw file per column. At the end, each column is
+    rewritten in slices: old rows, then the spilled rows. Memory stays
+    at one batch plus the string dictionaries, however long the stream is.
+    Rows previously stored under the same keyword set are replaced rather than
+    deduplicated, so re-ingesting an archive is idempotent.
+    """
+    state = _load()
+    columns = state["columns"]
+    dicts = {name: list(values) for name, values in state["dicts"].items()}
+    lookups = {name: {v: i for i, v in enumerate(values)} for name, values in dicts.items()}
+
+    def code(name: str, value: str) -> int:
+        if value not in lookups[name]:
+            lookups[name][value] = len(dicts[name])
+            dicts[name].append(value)
+        return lookups[name][value]
+
+    kw = code("keywords", keywords.strip().lower())
+    os.makedirs(ANALYTICS_DIR, exist_ok=True)
+    spills = {name: _path(f"{name}.{os.getpid()}.spill") for name in COLUMNS}
+    added = 0
+    try:
+        files = {name: open(path, "wb") for name, path in spills.items()}
+        try:
+            for items in batches:
+                new = {name: [] for name in COLUMNS}
+                for item in items:
+                    posted = item.get("posted_ts")
+                    new["award_id"].append(item["id"].encode()[:64])
+                    new["agency"].append(code("agency", item.get("agency") or ""))
+                    new["recipient"].append(code("recipient", item.get("recipient") or ""))
+                    new["naics"].append(code("naics", item.get("naics") or ""))
+                    new["keywords"].append(kw)
+                    new["amount"].append(float(item.get("award_amount") or 0))
+                    new["day"].append(posted // dates.DAY if posted is not None else -1)
+                for name, dtype in COLUMNS.items():
+                    files[name].write(np.array(new[name], dtype=dtype).tobytes())
+                added += len(new["award_id"])
+        finally:
+            for f in files.values():
+                f.close()
+
+        keep = np.asarray(columns["keywords"]) != kw
+        rows = int(keep.sum()) + added
+        for name, dtype in COLUMNS.items():
+            dtype = np.dtype(dtype)
+            header = {"descr": np.lib.format.dtype_to_descr(dtype), "fortran_order": False, "shape": (rows,)}
+            with open(_path(f"{name}.npy.{os.getpid()}.tmp"), "wb") as out:
+                np.lib.format.write_array_header_1_0(out, header)
+                old = columns[name]
+                for start in range(0, len(old), COPY_ROWS):
+                    out.write(old[start:start + COPY_ROWS][keep[start:start + COPY_ROWS]].tobytes())
+                with open(spills[name], "rb") as spilled:
+                    while chunk := spilled.read(COPY_ROWS * dtype.itemsize):
+                        out.write(chunk)
+                out.flush()
+                os.fsync(out.fileno())
+        # Swap columns in only once all of them are written
+        for name in COLUMNS:
+            os.replace(_path(f"{name}.npy.{os.getpid()}.tmp"), _path(f"{name}.npy"))
+    finally:
+        for path in [*spills.values(), *(_path(f"{n}.npy.{os.getpid()}.tmp") for n in COLUMNS)]:
+            if os.path.exists(path):
+                os.remove(path)
+    for name in DICT_COLUMNS:
+        _write_atomic(_path(f"{name}.json"), lambda f: f.write(json.dumps(dicts[name]).encode()))
+    manifest = {"generation": time.time_ns(), "rows": rows}
+    _write_atomic(_path("manifest.json"), lambda f: f.write(json.dumps(manifest).encode()))
+    _load()
+    return added
+
+
+async def ingest_archive(path: str, keywords: str, naics: str | None = None, agency: str | None = None,
+                         batch_rows: int = award_archive.BATCH_ROWS) -> dict:
+    """Stream a USASpending bulk download archive (zip of CSVs, or one CSV) into the store."""
+    started = time.perf_counter()
+    counts: dict = {}
+    batches = award_archive.read_batches(path, counts, batch_rows=batch_rows, naics=naics, agency=agency)
+    async with _ingest_lock:
+        added = await asyncio.to_thread(append_stream, batches, keywords)
+    elapsed = time.perf_counter() - started
+    rate = counts["rows"] / elapsed if elapsed else 0.0
+    print(f"[Analytics] Ingested {added} awards from {os.path.basename(path)} "
+          f"({counts['rows']} rows read) in {elapsed:.1f}s — {rate:,.0f} rows/s")
+    return {
+        **counts,
+        "added": added,
+        "keywords": keywords.strip().lower(),
+        "seconds": round(elapsed, 2),
+        "rows_per_s": round(rate),
+        "peak_rss_mb": award_archive.peak_rss_mb(),
+    }
+
+
+async def ingest(keywords: str, days: int = 180, max_pages: int = 20, concurrency: int = 4) -> dict:
+    """Page through spending_by_award for a keyword set and append the rows."""
+    started = time.perf_counter()
+    items: list[dict] = []
+    pages = 0
+    async with httpx.AsyncClient(timeout=60) as client:
+        next_page = 1
+        more = True
+        while more and next_page <= max_pages:
+            batch = range(next_page, min(next_page + concurrency, max_pages + 1))
+            results = await asyncio.gather(
+                *(usaspending.fetch_award_page(client, keywords, p, days=days) for p in batch),
+                return_exceptions=True,
+            )
+            for result in results:
+                if isinstance(result, Exception):
+                    print(f"[Analytics] page fetch failed: {type(result).__name__}: {str(result)[:120]}")
+                    more = False
+                    continue
+                page_items, has_more = result
+                items.extend(page_items)
+                pages += 1
+                more = more and has_more
+            next_page += len(batch)
+
+    async with _ingest_lock:
+        added = await asyncio.to_thread(_append, items, keywords)
+    elapsed = time.perf_counter() - started
+    print(f"[Analytics] Ingested {added} new awards ({len(items)} fetched, {pages} pages) in {elapsed:.1f}s")
+    return {"fetched": len(items), "added": added, "pages": pages, "seconds": round(elapsed, 2)}
+
+
+def _mask(keywords: str | None, days: int | None, agency: str | None = None,
+          naics: str | None = None, recipient: str | None = None):
+    """(state, boolean row mask) for the common filters; the mask is None when nothing matches."""
+    state = _load()
+    cols = state["columns"]
+    # Within one keyword set award ids are unique; across sets they repeat
+    mask = np.ones(len(cols["amount"]), dtype=bool) if keywords else _distinct(state).copy()
+    for name, value in (("keywords", keywords.strip().lower() if keywords else None),
+                        ("agency", agency), ("naics", naics), ("recipient", recipient)):
+        if value is None:
+            continue
+        code = _lookup(state, name, value)
+        if code is None:
+            return state, None
+        mask &= cols[name] == code
+    if days:
+        since = int(time.time() // dates.DAY) - days
+        mask &= cols["day"] >= since
+    return state, mask
+
+
+def top(by: str, keywords: str | None = None, days: int | None = None, k: int = 10, **filters) -> dict:
+    """Top-k values of a dictionary column by total obligations, with award counts."""
+    state, mask = _mask(keywords, days, **filters)
+    if mask is None or not mask.any():
+        return {"by": by, "total_amount": 0.0, "awards": 0, "top": []}
+    names = state["dicts"][by]
+    codes = state["columns"][by][mask]
+    amounts = state["columns"]["amount"][mask]
+    sums = np.bincount(codes, weights=amounts, minlength=len(names))
+    counts = np.bincount(codes, minlength=len(names))
+    k = min(k, int((counts > 0).sum()))
+    best = np.argpartition(-sums, k - 1)[:k] if k else np.empty(0, dtype=int)
+    best = best[np.argsort(-sums[best])]
+    return {
+        "by": by,
+        "total_amount": float(amounts.sum()),
+        "awards": int(mask.sum()),
+        "top": [
+            {"value": names[c], "amount": float(sums[c]), "awards": int(counts[c])}
+            for c in best
+        ],
+    }
+
+
+def timeseries(bucket: str = "month", keywords: str | None = None, days: int | None = None, **filters) -> dict:
+    """Obligations and award counts per time bucket."""
+    state, mask = _mask(keywords, days, **filters)
+    if mask is None:
+        return {"bucket": bucket, "series": []}
+    mask &= state["columns"]["day"] >= 0
+    if not mask.any():
+        return {"bucket": bucket, "series": []}
+    day = np.asarray(state["columns"]["day"][mask]).astype("datetime64[D]")
+    unit = {"day": "D", "week": "W", "month": "M", "quarter": "M", "year": "Y"}[bucket]
+    periods = day.astype(f"datetime64[{unit}]")
+    if bucket == "quarter":
+        months = periods.astype(np.int64)
+        periods = (months - months % 3).astype("datetime64[M]")
+    labels, index = np.unique(periods, return_inverse=True)
+    amounts = state["columns"]["amount"][mask]
+    sums = np.bincount(index, weights=amounts, minlength=len(labels))
+    counts = np.bincount(index, minlength=len(labels))
+    return {
+        "bucket": bucket,
+        "series": [
+            {"period": _period_label(label, bucket), "amount": float(s), "awards": int(c)}
+            for label, s, c in zip(labels, sums, counts)
+        ],
+    }
+
+
+def _period_label(label, bucket: str) -> str:
+    if bucket == "quarter":
+        month = str(label)  # "YYYY-MM", first month of the quarter
+        return f"{month[:4]}-Q{(int(month[5:7]) - 1) // 3 + 1}"
+    return str(label)
+
+
+def summary() -> dict:
+    state = _load()
+    amounts = state["columns"]["amount"]
+    distinct = _distinct(state)
+    return {
+        "rows": int(len(amounts)),
+        "awards": int(distinct.sum()),
+        "total_amount": float(amounts[distinct].sum()) if len(amounts) else 0.0,
+        "keyword_sets": list(state["dicts"]["keywords"]),
+        "distinct": {name: len(state["dicts"][name]) for name in ("agency", "recipient", "naics")},
+        "generation": state["generation"],
+        "path": ANALYTICS_DIR,
+    }
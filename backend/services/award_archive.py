@@ -0,0 +1,130 @@
+import csv
+import io
+import os
+import resource
+import time
+import zipfile
+
+from services import usaspending
+
+# Reader for USASpending bulk download archives.
+#
+# A bulk download is a zip holding one or more CSVs (split at a million rows
+# each). Their snake_case headers differ from the spending_by_award field
+# names. Each row is renamed to the API's field names via BULK_FIELDS and then
+# parsed by usaspending._parse, so bulk and paged awards map identically. The
+# zip members are decompressed and parsed as a stream and handed over in
+# batches of batch_rows. Only one batch is ever held in memory.
+
+ARCHIVE_DIR = os.getenv("ANALYTICS_ARCHIVE_DIR", os.path.join(os.path.dirname(os.path.dirname(__file__)), "data", "archives"))
+BATCH_ROWS = 10_000
+PROGRESS_ROWS = 500_000   # log throughput every this many rows
+
+# spending_by_award field -> bulk CSV columns to take it from, first present wins
+BULK_FIELDS = {
+    "Award ID": ("award_id_piid", "award_id_fain", "award_id_uri"),
+    "generated_internal_id": ("contract_award_unique_key", "assistance_award_unique_key"),
+    "Recipient Name": ("recipient_name",),
+    "Award Amount": ("total_obligated_amount", "total_dollars_obligated", "current_total_value_of_award"),
+    "Awarding Agency Name": ("awarding_agency_name",),
+    "Awarding Sub Agency Name": ("awarding_sub_agency_name",),
+    "Award Type": ("award_type", "assistance_type_description"),
+    "Period of Performance Start Date": ("period_of_performance_start_date",),
+    "Period of Performance Current End Date": ("period_of_performance_current_end_date",),
+    "Description": ("prime_award_base_transaction_description", "transaction_description"),
+    "NAICS Code": ("naics_code",),
+    "NAICS Description": ("naics_description",),
+}
+
+csv.field_size_limit(16 * 1024 * 1024)
+
+
+def archive_path(name: str) -> str | None:
+    """Path of an archive in ARCHIVE_DIR (only the base name of `name` is used), if it exists."""
+    path = os.path.join(ARCHIVE_DIR, os.path.basename(name))
+    return path if os.path.isfile(path) else None
+
+
+def _members(path: str):
+    """Yield a text stream per CSV in the archive (or the file itself if it is a CSV)."""
+    if not zipfile.is_zipfile(path):
+        with open(path, newline="", encoding="utf-8-sig") as f:
+            yield os.path.basename(path), f
+        return
+    with zipfile.ZipFile(path) as archive:
+        for name in sorted(n for n in archive.namelist() if n.lower().endswith(".csv")):
+            with archive.open(name) as raw:
+                yield name, io.TextIOWrapper(raw, encoding="utf-8-sig", newline="")
+
+
+def _columns(header: list[str]) -> dict:
+    """spending_by_award field -> index in this CSV's header."""
+    index = {h.strip().lower(): i for i, h in enumerate(header)}
+    columns = {}
+    for field, candidates in BULK_FIELDS.items():
+        for name in candidates:
+            if name in index:
+                columns[field] = index[name]
+                break
+    return columns
+
+
+def _amount(value: str) -> float:
+    try:
+        return float(value) if value else 0.0
+    except ValueError:
+        return 0.0
+
+
+def read_batches(path: str, counts: dict, batch_rows: int = BATCH_ROWS,
+                 naics: str | None = None, agency: str | None = None):
+    """Yield lists of parsed award items (usaspending._parse output) from a bulk archive.
+
+    naics keeps rows whose NAICS code starts with it; agency keeps rows whose
+    awarding agency or sub-agency matches it (case-insensitive). counts is
+    filled in as the stream is consumed: files, rows read, rows kept, rows skipped.
+    """
+    counts.update(files=0, rows=0, kept=0, skipped=0)
+    agency = agency.strip().lower() if agency else None
+    started = time.perf_counter()
+    batch = []
+    for name, stream in _members(path):
+        reader = csv.reader(stream)
+        header = next(reader, None)
+        if not header:
+            continue
+        columns = _columns(header)
+        if "Award ID" not in columns and "generated_internal_id" not in columns:
+            print(f"[Archive] {name}: no award id column, skipped")
+            continue
+        counts["files"] += 1
+        width = len(header)
+        for values in reader:
+            counts["rows"] += 1
+            if counts["rows"] % PROGRESS_ROWS == 0:
+                rate = counts["rows"] / (time.perf_counter() - started)
+                print(f"[Archive] {counts['rows']:,} rows ({rate:,.0f} rows/s)")
+            if len(values) < width:
+                counts["skipped"] += 1
+                continue
+            row = {field: values[i] for field, i in columns.items()}
+            if naics and not row.get("NAICS Code", "").startswith(naics):
+                continue
+            if agency and agency not in (row.get("Awarding Agency Name", "").lower(),
+                                         row.get("Awarding Sub Agency Name", "").lower()):
+                continue
+            row["Award Amount"] = _amount(row.get("Award Amount", ""))
+            if not row.get("Award ID"):
+                row.pop("Award ID", None)   # _parse falls back to the internal id
+            batch.append(usaspending._parse(row))
+            counts["kept"] += 1
+            if len(batch) >= batch_rows:
+                yield batch
+                batch = []
+    if batch:
+        yield batch
+
+
+def peak_rss_mb() -> float:
+    """Peak resident memory of this process so far."""
+    return round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1)
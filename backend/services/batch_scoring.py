@@ -0,0 +1,202 @@
+import asyncio
+import json
+import os
+import shutil
+import time
+import uuid
+
+from services import ai_ranker, corpus, llm_gateway
+
+# Offline LLM scoring through the OpenAI Batch API.
+#
+# A job collects every (stored item, profile fingerprint) pair the ranking
+# cache has no fresh score for and writes them to input.jsonl as chat
+# completion requests. The requests use the same prompt, structured-output
+# schema and BATCH_ITEMS-sized groups as interactive ranking. The file is
+# uploaded and submitted as a batch. poll_loop() checks submitted jobs and,
+# once a batch completes, streams its output into the ranking cache with a
+# longer BATCH_CACHE_TTL, so interactive requests for those profiles mostly hit
+# precomputed scores. Batch tokens are billed at about half the interactive
+# rate.
+#
+# Each job lives in BATCH_DIR/<job id>/:
+#   input.jsonl    one request per line, custom_id "<fingerprint>-<n>"
+#   manifest.json  custom_id -> fingerprint and the (id, content_hash) of each item
+#   state.json     batch id, status, counts
+#   output.jsonl   the downloaded results
+#
+# OPENAI_BASE_URL points the Files and Batches calls at a local stand-in
+# (bench/fake_upstreams.py implements both).
+
+BATCH_DIR = os.getenv("BATCH_DIR", os.path.join(os.path.dirname(os.path.dirname(__file__)), "data", "batches"))
+BATCH_ITEMS = 20            # items per request, as in interactive ranking
+BATCH_CACHE_TTL = float(os.getenv("BATCH_CACHE_TTL", 36 * 3600))
+POLL_INTERVAL = int(os.getenv("BATCH_POLL_INTERVAL", 60))
+MAX_PAIRS = 50_000
+
+PENDING = ("submitted", "validating", "in_progress", "finalizing")
+
+
+def _dir(job_id: str) -> str:
+    return os.path.join(BATCH_DIR, job_id)
+
+
+def _read_state(job_id: str) -> dict:
+    with open(os.path.join(_dir(job_id), "state.json")) as f:
+        return json.load(f)
+
+
+def _save_state(state: dict):
+    path = os.path.join(_dir(state["job_id"]), "state.json")
+    with open(f"{path}.tmp", "w") as f:
+        json.dump(state, f, indent=1)
+    os.replace(f"{path}.tmp", path)
+
+
+def collect(profiles: list[dict], max_pairs: int = MAX_PAIRS) -> dict:
+    """{fingerprint: (profile, [items without a fresh score])}, capped at max_pairs in total."""
+    groups = {}
+    for profile in profiles:
+        fp = ai_ranker.profile_fingerprint(profile)
+        if fp not in groups:
+            groups[fp] = (profile, [])
+    pairs = 0
+    for item in corpus.all_items():
+        for fp, (_, items) in groups.items():
+            if pairs >= max_pairs:
+                return groups
+            if not ai_ranker.is_scored(fp, item):
+                items.append(item)
+                pairs += 1
+    return groups
+
+
+def _write_input(job_dir: str, groups: dict) -> dict:
+    """Write input.jsonl and manifest.json. Returns request/pair counts."""
+    manifest = {}
+    pairs = 0
+    with open(os.path.join(job_dir, "input.jsonl"), "w") as f:
+        for fp, (profile, items) in groups.items():
+            for n, start in enumerate(range(0, len(items), BATCH_ITEMS)):
+                chunk = items[start:start + BATCH_ITEMS]
+                custom_id = f"{fp}-{n}"
+                prompt = ai_ranker.ranking_prompt(
+                    profile, [ai_ranker._item_summary(i, item) for i, item in enumerate(chunk)]
+                )
+                f.write(json.dumps({
+                    "custom_id": custom_id,
+                    "method": "POST",
+                    "url": "/v1/chat/completions",
+                    "body": llm_gateway.chat_body(prompt, "feed_rankings", ai_ranker.RANKING_SCHEMA, max_tokens=1500),
+                }) + "\n")
+                manifest[custom_id] = {
+                    "fingerprint": fp,
+                    "items": [{"id": i["id"], "content_hash": i.get("content_hash")} for i in chunk],
+                }
+                pairs += len(chunk)
+    with open(os.path.join(job_dir, "manifest.json"), "w") as f:
+        json.dump(manifest, f)
+    return {"requests": len(manifest), "pairs": pairs}
+
+
+async def create_job(profiles: list[dict], max_pairs: int = MAX_PAIRS) -> dict:
+    """Collect unscored pairs, write the batch input and submit it."""
+    # Sortable by time; the suffix keeps two submits in one second apart
+    job_id = f"{time.strftime('%Y%m%d-%H%M%S')}-{uuid.uuid4().hex[:6]}"
+    job_dir = _dir(job_id)
+    # Walks (and in shared mode decodes) every stored doc: keep it off the event loop
+    groups = await asyncio.to_thread(collect, profiles, max_pairs)
+    os.makedirs(job_dir)
+    try:
+        counts = await asyncio.to_thread(_write_input, job_dir, groups)
+        state = {"job_id": job_id, "created_ts": time.time(), "status": "empty", **counts,
+                 "profiles": len(groups), "batch_id": None, "stored": 0, "errors": 0}
+        if not counts["requests"]:
+            _save_state(state)
+            return state
+
+        oai = llm_gateway.client()
+        with open(os.path.join(job_dir, "input.jsonl"), "rb") as f:
+            uploaded = await oai.files.create(file=f, purpose="batch")
+        batch = await oai.batches.create(
+            input_file_id=uploaded.id,
+            endpoint="/v1/chat/completions",
+            completion_window="24h",
+            metadata={"job_id": job_id},
+        )
+        state.update(status="submitted", batch_id=batch.id, input_file_id=uploaded.id, submitted_ts=time.time())
+        _save_state(state)
+    except BaseException:
+        # No state.json means jobs() can't list it: don't leave the directory behind
+        shutil.rmtree(job_dir, ignore_errors=True)
+        raise
+    print(f"[Batch] Submitted {job_id}: {counts['pairs']} pairs in {counts['requests']} requests (batch {batch.id})")
+    return state
+
+
+def _ingest(job_dir: str) -> tuple[int, int]:
+    """Store every ranking in output.jsonl in the rank cache. Returns (stored, failed requests)."""
+    with open(os.path.join(job_dir, "manifest.json")) as f:
+        manifest = json.load(f)
+    stored = failed = 0
+    with open(os.path.join(job_dir, "output.jsonl")) as f:
+        for line in f:
+            try:
+                result = json.loads(line)
+                entry = manifest[result["custom_id"]]
+                response = result.get("response") or {}
+                if result.get("error") or response.get("status_code") != 200:
+                    failed += 1
+                    continue
+                content = response["body"]["choices"][0]["message"]["content"]
+                rankings = json.loads(content)["rankings"]
+            except (ValueError, KeyError, IndexError, TypeError):
+                failed += 1
+                continue
+            stored += ai_ranker._store_rankings(entry["fingerprint"], entry["items"], rankings, ttl=BATCH_CACHE_TTL)
+    return stored, failed
+
+
+async def poll(job_id: str) -> dict:
+    """Refresh a submitted job. Downloads and ingests the output once the batch completes."""
+    state = _read_state(job_id)
+    if state["status"] not in PENDING:
+        return state
+    oai = llm_gateway.client()
+    batch = await oai.batches.retrieve(state["batch_id"])
+    state["status"] = batch.status
+    if batch.request_counts:
+        state["request_counts"] = batch.request_counts.model_dump()
+    if batch.status == "completed":
+        content = await oai.files.content(batch.output_file_id)
+        job_dir = _dir(job_id)
+        await asyncio.to_thread(content.write_to_file, os.path.join(job_dir, "output.jsonl"))
+        # _store_rankings writes the shared cache dict, so this runs on the loop
+        stored, failed = _ingest(job_dir)
+        state.update(status="ingested", stored=stored, errors=failed, ingested_ts=time.time())
+        print(f"[Batch] Ingested {job_id}: {stored} scores stored, {failed} requests failed")
+    _save_state(state)
+    return state
+
+
+def jobs() -> list[dict]:
+    if not os.path.isdir(BATCH_DIR):
+        return []
+    out = []
+    for job_id in sorted(os.listdir(BATCH_DIR), reverse=True):
+        try:
+            out.append(_read_state(job_id))
+        except (OSError, ValueError):
+            continue
+    return out
+
+
+async def poll_loop():
+    while True:
+        await asyncio.sleep(POLL_INTERVAL)
+        for state in jobs():
+            if state["status"] in PENDING:
+                try:
+                    await poll(state["job_id"])
+                except Exception as e:
+                    print(f"[Batch] Poll of {state['job_id']} failed: {type(e).__name__}: {str(e)[:120]}")
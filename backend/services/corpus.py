@@ -0,0 +1,439 @@
+import bisect
+import itertools
+import os
+import time
+
+import numpy as np
+
+from services import dates, versions, corpus_store
+
+# Every item the feed has seen, with per-facet bitmap indexes maintained at ingest.
+#
+# Each stored item gets a dense integer doc id. Every facet value owns a bitmap
+# with bit N set when doc N has that value. Bitmaps are kept as bytearrays so
+# ingest flips single bits in place, and are turned into Python ints (cached
+# until the next change) for querying: intersection is `&`, union is `|` and
+# counting is int.bit_count() — all in C, and cheap even at hundreds of
+# thousands of docs. Amount and deadline ranges come from sorted (key, doc)
+# columns: bisect finds the slice, and a cached numpy array of the column's doc
+# ids turns it into a bitmap without a Python loop over the docs.
+#
+# With CORPUS_SHARED=1 (several uvicorn workers) only the elected writer keeps
+# these structures; reads in every worker go to the mapped snapshot it
+# publishes, and other workers spool their upserts to it (see corpus_store).
+# Version history follows the same path: annotate(), history() and
+# changes_since() here read what the writer published with the snapshot.
+
+SHARED = os.getenv("CORPUS_SHARED", "") == "1"
+
+FACETS = ("agency", "naics", "set_aside", "source_type", "contract_type", "amount")
+
+# (lower bound, label) — an item falls into the last bucket whose bound it meets
+AMOUNT_BUCKETS = [
+    (0, "<$100K"),
+    (100_000, "$100K-$1M"),
+    (1_000_000, "$1M-$10M"),
+    (10_000_000, "$10M-$100M"),
+    (100_000_000, "$100M+"),
+]
+NO_AMOUNT = "none"
+
+_docs: list = []                                        # doc id -> item (None once removed)
+_doc_ids: dict = {}                                     # item id -> doc id
+_index: dict = {facet: {} for facet in FACETS}          # facet -> value -> bytearray bitmap
+_counts: dict = {facet: {} for facet in FACETS}         # facet -> value -> number of docs
+_live = bytearray()                                     # bitmap of docs that still exist
+_dated = bytearray()                                    # bitmap of docs with a deadline
+_int_cache: dict = {}                                   # id(bytearray) -> int view, dropped on change
+_amounts: list = []                                     # sorted (award_amount, doc id)
+_deadlines: list = []                                   # sorted (deadline_ts, doc id)
+_column_docs: dict = {}                                 # id(column) -> numpy doc ids in key order, dropped on change
+_stats = {"upserts": 0, "last_ingest_ts": None, "pruned": 0, "changed_ts": None}
+
+# Per-request fields that don't belong in the stored copy
+PRIVATE_FIELDS = ("relevance_score", "ai_summary", "version", "amended_ts", "changed_fields")
+
+# Source types whose deadline means "stops accepting responses". Awards carry
+# their period-of-performance end there instead, so they are never pruned.
+EXPIRING_TYPES = ("contract", "grant")
+
+
+def amount_bucket(amount) -> str:
+    if amount is None:
+        return NO_AMOUNT
+    label = AMOUNT_BUCKETS[0][1]
+    for bound, name in AMOUNT_BUCKETS:
+        if amount >= bound:
+            label = name
+    return label
+
+
+def _amount(item: dict):
+    value = item.get("award_amount")
+    try:
+        return float(value) if value is not None else None
+    except (TypeError, ValueError):
+        return None
+
+
+def _facet_values(item: dict) -> dict:
+    return {
+        "agency": item.get("agency") or "",
+        "naics": item.get("naics") or "",
+        "set_aside": item.get("set_aside") or "",
+        "source_type": item.get("source_type") or "",
+        "contract_type": item.get("contract_type") or "",
+        "amount": amount_bucket(_amount(item)),
+    }
+
+
+def _set_bit(bits: bytearray, doc: int):
+    byte = doc >> 3
+    if byte >= len(bits):
+        bits.extend(bytes(byte + 1 - len(bits)))
+    bits[byte] |= 1 << (doc & 7)
+    _int_cache.pop(id(bits), None)
+
+
+def _clear_bit(bits: bytearray, doc: int):
+    byte = doc >> 3
+    if byte < len(bits):
+        bits[byte] &= ~(1 << (doc & 7)) & 0xFF
+        _int_cache.pop(id(bits), None)
+
+
+def _as_int(bits: bytearray) -> int:
+    value = _int_cache.get(id(bits))
+    if value is None:
+        value = _int_cache[id(bits)] = int.from_bytes(bits, "little")
+    return value
+
+
+def _unindex(doc: int, item: dict):
+    for facet, value in _facet_values(item).items():
+        bits = _index[facet].get(value)
+        if bits is None:
+            continue
+        _clear_bit(bits, doc)
+        _counts[facet][value] -= 1
+        if not _counts[facet][value]:
+            del _index[facet][value], _counts[facet][value]
+    _sorted_remove(_amounts, _amount(item), doc)
+    _sorted_remove(_deadlines, item.get("deadline_ts"), doc)
+    _clear_bit(_dated, doc)
+    _clear_bit(_live, doc)
+
+
+def _sorted_remove(column: list, key, doc: int):
+    if key is None:
+        return
+    pos = bisect.bisect_left(column, (key, doc))
+    if pos < len(column) and column[pos] == (key, doc):
+        del column[pos]
+        _column_docs.pop(id(column), None)
+
+
+def _sorted_insert(column: list, key, doc: int):
+    bisect.insort(column, (key, doc))
+    _column_docs.pop(id(column), None)
+
+
+def _reindex(doc: int, item: dict):
+    for facet, value in _facet_values(item).items():
+        bits = _index[facet].get(value)
+        if bits is None:
+            bits = _index[facet][value] = bytearray()
+        _set_bit(bits, doc)
+        _counts[facet][value] = _counts[facet].get(value, 0) + 1
+    amount = _amount(item)
+    if amount is not None:
+        _sorted_insert(_amounts, amount, doc)
+    if item.get("deadline_ts") is not None:
+        _sorted_insert(_deadlines, item["deadline_ts"], doc)
+        _set_bit(_dated, doc)
+    _set_bit(_live, doc)
+
+
+def upsert(items: list[dict]) -> int:
+    """Store items (replacing earlier copies with the same id). Returns how many were new.
+
+    An item whose content hash matches the stored copy is left alone.
+    """
+    if SHARED and not corpus_store.is_writer():
+        corpus_store.spool([{k: v for k, v in i.items() if k not in PRIVATE_FIELDS} for i in items if i.get("id")])
+        return 0
+    added = 0
+    for item in items:
+        item_id = item.get("id")
+        if not item_id:
+            continue
+        # Keep a private copy — callers go on to mutate their items while ranking
+        stored = versions.stamp(dates.stamp({k: v for k, v in item.items() if k not in PRIVATE_FIELDS}))
+        doc = _doc_ids.get(item_id)
+        if versions.record(_docs[doc] if doc is not None else None, stored) == "unchanged":
+            continue
+        added += _store(item_id, doc, stored)
+    _stats["upserts"] += len(items)
+    _stats["last_ingest_ts"] = time.time()
+    return added
+
+
+def _store(item_id: str, doc: int | None, stored: dict) -> int:
+    _stats["changed_ts"] = time.time()
+    if doc is None:
+        doc = len(_docs)
+        _docs.append(stored)
+        _doc_ids[item_id] = doc
+        _reindex(doc, stored)
+        return 1
+    _unindex(doc, _docs[doc])
+    _docs[doc] = stored
+    _reindex(doc, stored)
+    return 0
+
+
+def restore(items: list[dict], first_seen: list | None = None) -> int:
+    """Load items from a published snapshot without reporting them as new."""
+    restored = 0
+    for n, item in enumerate(items):
+        if item["id"] not in _doc_ids:
+            stored = versions.stamp(dict(item))
+            versions.seed(stored, first_seen[n] if first_seen else None)
+            restored += _store(item["id"], None, stored)
+    return restored
+
+
+def changed_ts() -> float | None:
+    return _stats["changed_ts"]
+
+
+def live_docs() -> list[dict]:
+    """Live documents in doc order. The dicts are never mutated, only replaced."""
+    return [d for d in _docs if d is not None]
+
+
+def remove(item_id: str) -> bool:
+    doc = _doc_ids.pop(item_id, None)
+    if doc is None:
+        return False
+    _unindex(doc, _docs[doc])
+    _docs[doc] = None
+    versions.forget(item_id)
+    _stats["changed_ts"] = time.time()
+    return True
+
+
+def get(item_id: str) -> dict | None:
+    if SHARED:
+        return corpus_store.current().get(item_id)
+    doc = _doc_ids.get(item_id)
+    return dict(_docs[doc]) if doc is not None else None
+
+
+def annotate(items: list[dict]):
+    """Mark amended items with their version and changed fields (versions.annotate)."""
+    versions.annotate(items, corpus_store.current().versions()["history"] if SHARED else None)
+
+
+def history(item_id: str) -> list[dict]:
+    """Stored versions of an item, oldest first; empty if the item is unknown."""
+    if not SHARED:
+        return versions.history(item_id)
+    snap = corpus_store.current()
+    published = snap.versions()["history"].get(item_id)
+    if published:
+        return [dict(v) for v in published]
+    doc = snap.find(item_id)
+    if doc is None:
+        return []
+    return [{"version": 1, "hash": snap.row(doc)["content_hash"], "ts": snap.first_seen(doc), "changes": {}}]
+
+
+def changes_since(since: float, kinds: tuple = ("new", "amended"), limit: int = 500) -> list[dict]:
+    if SHARED:
+        return versions.changes_since(since, kinds, limit, corpus_store.current().versions()["events"])
+    return versions.changes_since(since, kinds, limit)
+
+
+def version_stats() -> dict:
+    if SHARED:
+        return corpus_store.current().versions()["stats"]
+    return versions.stats()
+
+
+def all_items():
+    """Every stored item (as copies), oldest first."""
+    if SHARED:
+        snap = corpus_store.current()
+        return (snap.row(d) for d in range(snap.docs))
+    return (dict(d) for d in _docs if d is not None)
+
+
+def _sorted_docs(column: list) -> np.ndarray:
+    docs = _column_docs.get(id(column))
+    if docs is None:
+        docs = _column_docs[id(column)] = np.fromiter((d for _, d in column), dtype=np.int64, count=len(column))
+    return docs
+
+
+def _range_bitmap(column: list, low, high) -> int:
+    """Bitmap of docs whose key in a sorted (key, doc) column lies in [low, high]."""
+    lo = 0 if low is None else bisect.bisect_left(column, (low, -1))
+    hi = len(column) if high is None else bisect.bisect_right(column, (high, float("inf")))
+    docs = _sorted_docs(column)[lo:hi]
+    if not len(docs):
+        return 0
+    mask = np.zeros(int(docs.max()) + 1, dtype=bool)
+    mask[docs] = True
+    return int.from_bytes(np.packbits(mask, bitorder="little").tobytes(), "little")
+
+
+def _ranges_bitmap(min_amount=None, max_amount=None, deadline_from=None, deadline_to=None) -> int | None:
+    """Docs within the amount/deadline ranges, or None when no range is set."""
+    bitmap = None
+    if min_amount is not None or max_amount is not None:
+        bitmap = _range_bitmap(_amounts, min_amount, max_amount)
+    if deadline_from is not None or deadline_to is not None:
+        dated = _range_bitmap(_deadlines, deadline_from, deadline_to)
+        bitmap = dated if bitmap is None else bitmap & dated
+    return bitmap
+
+
+def _match(filters: dict, skip_facet: str | None = None, in_ranges: int | None = None, **ranges) -> int:
+    """AND across facets, OR within a facet's values, then the amount/deadline ranges.
+
+    in_ranges is a precomputed _ranges_bitmap(**ranges), for callers matching several times.
+    """
+    bitmap = _as_int(_live)
+    if in_ranges is None:
+        in_ranges = _ranges_bitmap(**ranges)
+    if in_ranges is not None:
+        bitmap &= in_ranges
+    for facet, values in filters.items():
+        if facet == skip_facet or not values:
+            continue
+        index = _index.get(facet, {})
+        union = 0
+        for value in values:
+            if value in index:
+                union |= _as_int(index[value])
+        bitmap &= union
+        if not bitmap:
+            return 0
+    return bitmap
+
+
+def _docs_from_bitmap(bitmap: int, offset: int, limit: int) -> list[int]:
+    """Doc ids from a bitmap, newest (highest id) first, without walking every bit in Python."""
+    bits = bin(bitmap)[2:]  # MSB first, so the highest doc id comes first
+    top = len(bits) - 1
+    docs = []
+    pos = bits.find("1")
+    skipped = 0
+    while pos != -1 and len(docs) < limit:
+        if skipped < offset:
+            skipped += 1
+        else:
+            docs.append(top - pos)
+        pos = bits.find("1", pos + 1)
+    return docs
+
+
+def _docs_by_deadline(bitmap: int, offset: int, limit: int, deadline_from=None) -> list[int]:
+    """Doc ids from a bitmap, soonest deadline first, walking the deadline index."""
+    membership = bitmap.to_bytes((bitmap.bit_length() + 7) // 8, "little")
+    docs = []
+    skipped = 0
+    # Nothing before deadline_from can be in the bitmap
+    start = 0 if deadline_from is None else bisect.bisect_left(_deadlines, (deadline_from, -1))
+    for _, doc in itertools.islice(_deadlines, start, None):
+        if (doc >> 3) < len(membership) and membership[doc >> 3] >> (doc & 7) & 1:
+            if skipped < offset:
+                skipped += 1
+                continue
+            docs.append(doc)
+            if len(docs) >= limit:
+                break
+    return docs
+
+
+def query(filters: dict, offset: int = 0, limit: int = 15, order: str = "newest", **ranges) -> tuple[list[dict], int]:
+    """Return (page of matching items, total matches).
+
+    filters maps facet -> list of values; ranges are min_amount/max_amount and
+    deadline_from/deadline_to (epoch seconds). order is "newest" (most recently
+    ingested first) or "deadline" (soonest deadline first, undated items excluded).
+    """
+    if SHARED:
+        return corpus_store.current().query(filters, offset, limit, order, **ranges)
+    bitmap = _match(filters, **ranges)
+    if order == "deadline":
+        bitmap &= _as_int(_dated)
+    total = bitmap.bit_count()
+    if not total:
+        return [], 0
+    if order == "deadline":
+        docs = _docs_by_deadline(bitmap, offset, limit, ranges.get("deadline_from"))
+    else:
+        docs = _docs_from_bitmap(bitmap, offset, limit)
+    return [dict(_docs[d]) for d in docs], total
+
+
+def prune_expired(now: float | None = None) -> int:
+    """Drop solicitations whose deadline has passed. Returns how many were removed."""
+    now = time.time() if now is None else now
+    expired = []
+    for deadline_ts, doc in _deadlines:
+        if deadline_ts >= now:
+            break
+        if _docs[doc] and _docs[doc].get("source_type") in EXPIRING_TYPES:
+            expired.append(_docs[doc]["id"])
+    for item_id in expired:
+        remove(item_id)
+    _stats["pruned"] += len(expired)
+    return len(expired)
+
+
+def facet_counts(filters: dict, top: int = 20, **ranges) -> dict:
+    """Per-facet value counts under the current filters.
+
+    Each facet is counted with its own filter left out, so the UI can show the
+    alternatives a user could switch to within that facet.
+    """
+    if SHARED:
+        return corpus_store.current().facet_counts(filters, FACETS, top, **ranges)
+    out = {}
+    in_ranges = _ranges_bitmap(**ranges)
+    for facet in FACETS:
+        base = _match(filters, skip_facet=facet, in_ranges=in_ranges)
+        counts = []
+        if base:
+            for value, bits in _index[facet].items():
+                n = (_as_int(bits) & base).bit_count()
+                if n:
+                    counts.append({"value": value, "count": n})
+        counts.sort(key=lambda c: c["count"], reverse=True)
+        out[facet] = counts[:top]
+    return out
+
+
+def stats() -> dict:
+    if SHARED:
+        snap = corpus_store.current()
+        return {
+            "documents": snap.docs,
+            "upserts": _stats["upserts"],
+            "last_ingest_ts": _stats["last_ingest_ts"],
+            "pruned": _stats["pruned"],
+            "next_deadline_ts": snap.next_deadline(),
+            "facet_values": snap.facet_sizes(FACETS),
+            "shared": corpus_store.status(),
+        }
+    return {
+        "documents": len(_doc_ids),
+        "upserts": _stats["upserts"],
+        "last_ingest_ts": _stats["last_ingest_ts"],
+        "pruned": _stats["pruned"],
+        "next_deadline_ts": _deadlines[0][0] if _deadlines else None,
+        "facet_values": {facet: len(values) for facet, values in _index.items()},
+    }
@@ -0,0 +1,425 @@
+import asyncio
+import fcntl
+import glob
+import hashlib
+import json
+import mmap
+import os
+import struct
+import time
+
+import numpy as np
+
+from services import versions
+
+# Read-only corpus snapshot shared by every worker process.
+#
+# With CORPUS_SHARED=1, one worker holds an exclusive flock on corpus.lock and
+# is the writer. It keeps the in-memory corpus (corpus.py), merges what other
+# workers spool to it, and every CORPUS_PUBLISH_INTERVAL seconds publishes the
+# live documents to corpus.bin: written to a temp file and os.replace()d in,
+# so readers see either the old generation or the new one, never a mix. Every
+# worker (the writer included) answers queries from the mapped file, so all
+# of them serve the same generation and the pages sit once in the OS page
+# cache however many workers there are.
+#
+# File layout (little-endian):
+#   header   magic "GFCORP\0\0" | version u32 | generation u64 | docs u32 | sections u32 | created f64
+#   table    per section: name (32 bytes) | numpy dtype (8 bytes) | offset u64 | count u64
+#   data     sections, each 64-byte aligned
+#
+# Sections:
+#   <field>.off / <field>.data   string column: u64 offsets (docs + 1) into UTF-8 bytes
+#   award_amount                 f64, NaN when missing
+#   first_seen_ts                f64, when the writer first stored the item
+#   posted_ts / deadline_ts      i64, MISSING when missing
+#   is_mock                      u8
+#   <facet>.code                 i32 code per doc into <facet>.dict.off / <facet>.dict.data
+#   deadline_order               i32 doc ids with a deadline, soonest first
+#   id_hash / id_doc             sorted u64 hash of each id, and the doc it belongs to
+#
+# Next to it the writer keeps versions.json: amendment history, recent change
+# events and version stats (versions.dump()). It is replaced just before
+# corpus.bin, so a mapped generation never has older history than its items.
+
+CORPUS_DIR = os.getenv("CORPUS_DIR", os.path.join(os.path.dirname(os.path.dirname(__file__)), "data", "corpus"))
+PUBLISH_INTERVAL = float(os.getenv("CORPUS_PUBLISH_INTERVAL", 2))
+CHECK_INTERVAL = 0.25   # seconds between stat() calls looking for a new generation
+
+MAGIC = b"GFCORP\0\0"
+VERSION = 1
+HEADER = struct.Struct("<8sIQIId")
+ENTRY = struct.Struct("<32s8sQQ")
+ALIGN = 64
+MISSING = np.iinfo(np.int64).min
+
+STRING_FIELDS = (
+    "id", "source", "source_type", "title", "description", "agency", "posted_date", "deadline",
+    "naics", "set_aside", "contract_type", "url", "recipient", "content_hash",
+)
+TS_FIELDS = ("posted_ts", "deadline_ts")
+
+_lock_file = None
+_writer = False
+_published = {"generation": None, "changed_ts": None, "seconds": None}
+_current = None
+_checked = 0.0
+
+
+def _path(name: str) -> str:
+    return os.path.join(CORPUS_DIR, name)
+
+
+def _id_hash(item_id: str) -> int:
+    return int.from_bytes(hashlib.blake2b(item_id.encode(), digest_size=8).digest(), "little")
+
+
+def _strings(values: list[str]) -> tuple[np.ndarray, np.ndarray]:
+    encoded = [v.encode() for v in values]
+    offsets = np.zeros(len(encoded) + 1, dtype=np.uint64)
+    np.cumsum([len(b) for b in encoded], out=offsets[1:])
+    return offsets, np.frombuffer(b"".join(encoded), dtype=np.uint8)
+
+
+def build(docs: list[dict], facet_values, facets: tuple, first_seen: list | None = None) -> dict:
+    """Columnar arrays for a list of live documents, in doc order (oldest first)."""
+    n = len(docs)
+    arrays = {}
+    for field in STRING_FIELDS:
+        arrays[f"{field}.off"], arrays[f"{field}.data"] = _strings([str(d.get(field) or "") for d in docs])
+    amounts = np.full(n, np.nan)
+    for i, d in enumerate(docs):
+        try:
+            amounts[i] = float(d["award_amount"]) if d.get("award_amount") is not None else np.nan
+        except (TypeError, ValueError):
+            pass
+    arrays["award_amount"] = amounts
+    arrays["first_seen_ts"] = np.array(
+        [t if t is not None else np.nan for t in first_seen] if first_seen is not None else np.full(n, np.nan),
+        dtype=np.float64,
+    )
+    for field in TS_FIELDS:
+        arrays[field] = np.array([d.get(field) if d.get(field) is not None else MISSING for d in docs], dtype=np.int64)
+    arrays["is_mock"] = np.array([1 if d.get("is_mock") else 0 for d in docs], dtype=np.uint8)
+
+    values = [facet_values(d) for d in docs]
+    for facet in facets:
+        names: dict = {}
+        codes = np.array([names.setdefault(v[facet], len(names)) for v in values], dtype=np.int32)
+        arrays[f"{facet}.code"] = codes
+        arrays[f"{facet}.dict.off"], arrays[f"{facet}.dict.data"] = _strings(list(names))
+
+    deadlines = arrays["deadline_ts"]
+    dated = np.flatnonzero(deadlines != MISSING)
+    arrays["deadline_order"] = dated[np.argsort(deadlines[dated], kind="stable")].astype(np.int32)
+    hashes = np.array([_id_hash(d["id"]) for d in docs], dtype=np.uint64)
+    order = np.argsort(hashes, kind="stable")
+    arrays["id_hash"] = hashes[order]
+    arrays["id_doc"] = order.astype(np.int32)
+    return arrays
+
+
+def write(arrays: dict, docs: int, generation: int, path: str):
+    table = []
+    offset = HEADER.size + ENTRY.size * len(arrays)
+    for name, arr in arrays.items():
+        offset = -(-offset // ALIGN) * ALIGN
+        table.append((name, arr, offset))
+        offset += arr.nbytes
+    tmp = f"{path}.{os.getpid()}.tmp"
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(tmp, "wb") as f:
+        f.write(HEADER.pack(MAGIC, VERSION, generation, docs, len(arrays), time.time()))
+        for name, arr, off in table:
+            f.write(ENTRY.pack(name.encode(), arr.dtype.str.encode(), off, len(arr)))
+        for _, arr, off in table:
+            f.write(b"\0" * (off - f.tell()))
+            f.write(np.ascontiguousarray(arr).tobytes())
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp, path)
+
+
+class Snapshot:
+    """One mapped generation. Arrays are zero-copy views over the file."""
+
+    def __init__(self, path: str | None = None):
+        self.arrays: dict = {}
+        self.generation = None
+        self.docs = 0
+        self.created = None
+        self.key = None
+        self._dicts: dict = {}   # facet -> {value: code}, built on first use
+        self._versions = None    # versions.json, read on first use
+        self._versions_path = None
+        if path is None:
+            return
+        self._versions_path = os.path.join(os.path.dirname(path), "versions.json")
+        with open(path, "rb") as f:
+            st = os.fstat(f.fileno())
+            self.key = (st.st_ino, st.st_mtime_ns)
+            mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version, self.generation, self.docs, sections, self.created = HEADER.unpack_from(mm, 0)
+        if magic != MAGIC or version != VERSION:
+            raise ValueError(f"unsupported corpus snapshot (magic={magic!r}, version={version})")
+        for n in range(sections):
+            name, dtype, offset, count = ENTRY.unpack_from(mm, HEADER.size + n * ENTRY.size)
+            self.arrays[name.rstrip(b"\0").decode()] = np.frombuffer(
+                mm, dtype=np.dtype(dtype.rstrip(b"\0").decode()), count=count, offset=offset,
+            )
+
+    def _string(self, prefix: str, i: int) -> str:
+        off = self.arrays[f"{prefix}.off"]
+        return self.arrays[f"{prefix}.data"][int(off[i]):int(off[i + 1])].tobytes().decode()
+
+    def row(self, doc: int) -> dict:
+        item = {field: self._string(field, doc) for field in STRING_FIELDS}
+        amount = self.arrays["award_amount"][doc]
+        item["award_amount"] = None if np.isnan(amount) else float(amount)
+        for field in TS_FIELDS:
+            value = int(self.arrays[field][doc])
+            item[field] = None if value == MISSING else value
+        item["is_mock"] = bool(self.arrays["is_mock"][doc])
+        return item
+
+    def _codes(self, facet: str) -> dict:
+        if facet not in self._dicts:
+            count = len(self.arrays[f"{facet}.dict.off"]) - 1
+            self._dicts[facet] = {self._string(f"{facet}.dict", i): i for i in range(count)}
+        return self._dicts[facet]
+
+    def match(self, filters: dict, skip_facet: str | None = None, min_amount=None, max_amount=None,
+              deadline_from=None, deadline_to=None) -> np.ndarray:
+        """Boolean mask over docs, with corpus._match semantics."""
+        mask = np.ones(self.docs, dtype=bool)
+        if not self.docs:
+            return mask
+        for facet, values in filters.items():
+            if facet == skip_facet or not values:
+                continue
+            lookup = self._codes(facet)
+            wanted = [lookup[v] for v in values if v in lookup]
+            mask &= np.isin(self.arrays[f"{facet}.code"], wanted)
+        if min_amount is not None or max_amount is not None:
+            amounts = self.arrays["award_amount"]
+            mask &= ~np.isnan(amounts)
+            if min_amount is not None:
+                mask &= amounts >= min_amount
+            if max_amount is not None:
+                mask &= amounts <= max_amount
+        if deadline_from is not None or deadline_to is not None:
+            deadlines = self.arrays["deadline_ts"]
+            mask &= deadlines != MISSING
+            if deadline_from is not None:
+                mask &= deadlines >= deadline_from
+            if deadline_to is not None:
+                mask &= deadlines <= deadline_to
+        return mask
+
+    def query(self, filters: dict, offset: int = 0, limit: int = 15, order: str = "newest",
+              **ranges) -> tuple[list[dict], int]:
+        if not self.docs:
+            return [], 0
+        mask = self.match(filters, **ranges)
+        if order == "deadline":
+            ordered = self.arrays["deadline_order"]
+            docs = ordered[mask[ordered]]
+        else:
+            docs = np.flatnonzero(mask)[::-1]
+        return [self.row(int(d)) for d in docs[offset:offset + limit]], len(docs)
+
+    def facet_counts(self, filters: dict, facets: tuple, top: int = 20, **ranges) -> dict:
+        out = {}
+        for facet in facets:
+            if not self.docs:
+                out[facet] = []
+                continue
+            base = self.match(filters, skip_facet=facet, **ranges)
+            names = self._codes(facet)
+            counts = np.bincount(self.arrays[f"{facet}.code"][base], minlength=len(names))
+            values = list(names)
+            best = np.argsort(-counts, kind="stable")[:top]
+            out[facet] = [{"value": values[c], "count": int(counts[c])} for c in best if counts[c]]
+        return out
+
+    def find(self, item_id: str) -> int | None:
+        if not self.docs:
+            return None
+        hashes = self.arrays["id_hash"]
+        h = np.uint64(_id_hash(item_id))
+        pos = int(np.searchsorted(hashes, h))
+        while pos < len(hashes) and hashes[pos] == h:
+            doc = int(self.arrays["id_doc"][pos])
+            if self._string("id", doc) == item_id:
+                return doc
+            pos += 1
+        return None
+
+    def get(self, item_id: str) -> dict | None:
+        doc = self.find(item_id)
+        return self.row(doc) if doc is not None else None
+
+    def first_seen(self, doc: int) -> float | None:
+        column = self.arrays.get("first_seen_ts")   # absent in files from before it was added
+        if column is None or np.isnan(column[doc]):
+            return None
+        return float(column[doc])
+
+    def versions(self) -> dict:
+        """The version history published with this generation (empty if there is none)."""
+        if self._versions is None:
+            self._versions = {"history": {}, "events": [], "stats": {}}
+            if self._versions_path:
+                try:
+                    with open(self._versions_path) as f:
+                        self._versions = json.load(f)
+                except (OSError, ValueError) as e:
+                    if not isinstance(e, FileNotFoundError):
+                        print(f"[Corpus] Ignoring {self._versions_path}: {e}")
+        return self._versions
+
+    def next_deadline(self):
+        ordered = self.arrays.get("deadline_order")
+        if ordered is None or not len(ordered):
+            return None
+        return int(self.arrays["deadline_ts"][ordered[0]])
+
+    def facet_sizes(self, facets: tuple) -> dict:
+        return {f: len(self.arrays[f"{f}.dict.off"]) - 1 if self.docs else 0 for f in facets}
+
+
+def current() -> Snapshot:
+    """The newest published generation, remapped at most every CHECK_INTERVAL seconds."""
+    global _current, _checked
+    now = time.monotonic()
+    if _current is not None and now - _checked < CHECK_INTERVAL:
+        return _current
+    _checked = now
+    path = _path("corpus.bin")
+    try:
+        st = os.stat(path)
+    except FileNotFoundError:
+        if _current is None:
+            _current = Snapshot()
+        return _current
+    if _current is None or _current.key != (st.st_ino, st.st_mtime_ns):
+        try:
+            # The old mapping is released once no query holds its arrays
+            _current = Snapshot(path)
+        except (ValueError, struct.error, OSError) as e:
+            print(f"[Corpus] Ignoring {path}: {e}")
+            _current = _current or Snapshot()
+    return _current
+
+
+def is_writer() -> bool:
+    return _writer
+
+
+def try_become_writer() -> bool:
+    global _lock_file, _writer
+    if _writer:
+        return True
+    os.makedirs(_path("spool"), exist_ok=True)
+    f = open(_path("corpus.lock"), "a")
+    try:
+        fcntl.flock(f.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except OSError:
+        f.close()
+        return False
+    _lock_file, _writer = f, True
+    print(f"[Corpus] Worker {os.getpid()} is the corpus writer")
+    return True
+
+
+def spool(items: list[dict]):
+    """Hand items to the writer (non-writer workers). One short append per call."""
+    lines = "".join(json.dumps(item, separators=(",", ":"), default=str) + "\n" for item in items)
+    os.makedirs(_path("spool"), exist_ok=True)
+    with open(_path(f"spool/{os.getpid()}.ndjson"), "a") as f:
+        f.write(lines)
+
+
+def _claim_spool() -> list[str]:
+    """Rename live spool files aside, and return files claimed on an earlier pass.
+
+    Appenders open the spool by path for every write, so a claimed file gets no
+    new lines after one publish interval; reading it then can't miss any.
+    """
+    ready = sorted(glob.glob(_path("spool/*.claimed")))
+    for path in glob.glob(_path("spool/*.ndjson")):
+        os.replace(path, f"{path[:-len('.ndjson')]}.{time.time_ns()}.claimed")
+    return ready
+
+
+def _read_spool(paths: list[str]) -> list[dict]:
+    items = []
+    for path in paths:
+        with open(path) as f:
+            for line in f:
+                try:
+                    items.append(json.loads(line))
+                except ValueError:
+                    continue   # a torn final line from a crashed worker
+    return items
+
+
+def _write_versions(text: str, path: str):
+    tmp = f"{path}.{os.getpid()}.tmp"
+    with open(tmp, "w") as f:
+        f.write(text)
+    os.replace(tmp, path)
+
+
+async def publish(docs: list[dict], changed_ts: float, facet_values, facets: tuple):
+    started = time.perf_counter()
+    generation = time.time_ns()
+    # Taken on the event loop, where the writer's version state changes
+    first_seen = [versions.first_seen(d["id"]) for d in docs]
+    history = json.dumps(versions.dump(), separators=(",", ":"), default=str)
+
+    def _build_and_write():
+        arrays = build(docs, facet_values, facets, first_seen)
+        _write_versions(history, _path("versions.json"))
+        write(arrays, len(docs), generation, _path("corpus.bin"))
+
+    await asyncio.to_thread(_build_and_write)
+    _published.update(generation=generation, changed_ts=changed_ts,
+                      seconds=round(time.perf_counter() - started, 3))
+
+
+async def publish_loop(corpus):
+    """Elect a writer; the writer merges spooled items and publishes changed generations."""
+    while True:
+        try:
+            if not _writer and try_become_writer():
+                # Pick up where the previous writer left off, history included
+                snap = current()
+                versions.load(snap.versions())
+                corpus.restore([snap.row(d) for d in range(snap.docs)],
+                               [snap.first_seen(d) for d in range(snap.docs)])
+            if _writer:
+                claimed = _claim_spool()
+                if claimed:
+                    corpus.upsert(await asyncio.to_thread(_read_spool, claimed))
+                    for path in claimed:
+                        os.remove(path)
+                changed = corpus.changed_ts()
+                if changed is not None and changed != _published["changed_ts"]:
+                    await publish(corpus.live_docs(), changed, corpus._facet_values, corpus.FACETS)
+        except Exception as e:
+            print(f"[Corpus] Publish failed: {type(e).__name__}: {str(e)[:120]}")
+        await asyncio.sleep(PUBLISH_INTERVAL)
+
+
+def status() -> dict:
+    snap = current()
+    return {
+        "shared": True,
+        "writer": _writer,
+        "pid": os.getpid(),
+        "generation": snap.generation,
+        "documents": snap.docs,
+        "created_ts": snap.created,
+        "last_publish_seconds": _published["seconds"],
+    }
@@ -0,0 +1,46 @@
+from datetime import datetime, timezone
+
+# Each source formats dates differently:
+#   Grants.gov   "05/20/2025"
+#   SAM.gov      "2025-05-20" (posted) / "2025-05-20T17:00:00-04:00" (deadline)
+#   USASpending  "2025-05-20"
+# Items carry the raw strings for display plus posted_ts / deadline_ts epoch
+# seconds, parsed once at ingest, for sorting and range filtering.
+
+DAY = 86400
+
+
+def to_epoch(value, end_of_day: bool = False) -> int | None:
+    """Parse any of the source date formats to UTC epoch seconds (None if unparseable).
+
+    Date-only values are taken as UTC; with end_of_day they point at 23:59:59 so a
+    deadline "on" a date stays open for that whole day.
+    """
+    if not value or not isinstance(value, str):
+        return None
+    value = value.strip()
+    date_only = False
+    try:
+        if len(value) == 10 and value[2] == "/" and value[5] == "/":
+            dt = datetime.strptime(value, "%m/%d/%Y")
+            date_only = True
+        else:
+            dt = datetime.fromisoformat(value.replace("Z", "+00:00"))
+            date_only = len(value) == 10
+    except ValueError:
+        return None
+    if dt.tzinfo is None:
+        dt = dt.replace(tzinfo=timezone.utc)
+    ts = int(dt.timestamp())
+    if date_only and end_of_day:
+        ts += DAY - 1
+    return ts
+
+
+def stamp(item: dict) -> dict:
+    """Add posted_ts / deadline_ts to an item if it doesn't have them yet."""
+    if "posted_ts" not in item:
+        item["posted_ts"] = to_epoch(item.get("posted_date"))
+    if "deadline_ts" not in item:
+        item["deadline_ts"] = to_epoch(item.get("deadline"), end_of_day=True)
+    return item
@@ -0,0 +1,127 @@
+import asyncio
+import json
+import multiprocessing
+import os
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+# Size thresholds for moving work off the event loop. Below them the hand-off
+# costs more than it saves, so small pages are handled inline.
+JSON_OFFLOAD_BYTES = int(os.getenv("JSON_OFFLOAD_BYTES", 256 * 1024))
+THREAD_OFFLOAD_ITEMS = int(os.getenv("THREAD_OFFLOAD_ITEMS", 200))
+PROCESS_OFFLOAD_ITEMS = int(os.getenv("PROCESS_OFFLOAD_ITEMS", 2000))
+
+THREAD_WORKERS = int(os.getenv("THREAD_WORKERS", 4))
+PROCESS_WORKERS = int(os.getenv("PROCESS_WORKERS", max(1, (os.cpu_count() or 2) - 1)))
+
+LAG_INTERVAL = 0.25  # seconds between event-loop lag probes
+
+_threads: ThreadPoolExecutor | None = None
+_processes: ProcessPoolExecutor | None = None
+
+_offloads = {"inline": 0, "thread": 0, "process": 0}
+_lag_samples: deque = deque(maxlen=int(60 / LAG_INTERVAL))  # last minute
+_lag_max_ms = 0.0
+
+
+def _thread_pool() -> ThreadPoolExecutor:
+    global _threads
+    if _threads is None:
+        _threads = ThreadPoolExecutor(max_workers=THREAD_WORKERS, thread_name_prefix="govfeed-cpu")
+    return _threads
+
+
+def _process_pool() -> ProcessPoolExecutor:
+    global _processes
+    if _processes is None:
+        # spawn, not fork — forking a process that already runs the event loop
+        # and a thread pool is unsafe.
+        _processes = ProcessPoolExecutor(
+            max_workers=PROCESS_WORKERS, mp_context=multiprocessing.get_context("spawn")
+        )
+    return _processes
+
+
+async def run_threaded(fn, *args, size: int = 0):
+    """Run fn in the thread pool when size (items) crosses the threshold, else inline."""
+    if size < THREAD_OFFLOAD_ITEMS:
+        _offloads["inline"] += 1
+        return fn(*args)
+    _offloads["thread"] += 1
+    return await asyncio.get_running_loop().run_in_executor(_thread_pool(), fn, *args)
+
+
+async def run_cpu(fn, *args, size: int = 0):
+    """Run pure-Python CPU work inline, in a thread, or in the process pool by size.
+
+    fn and its arguments must be picklable (module-level function, plain data).
+    Results come back as copies when a process is used — callers must use the
+    return value rather than relying on in-place mutation.
+    """
+    if size < PROCESS_OFFLOAD_ITEMS:
+        return await run_threaded(fn, *args, size=size)
+    global _processes
+    try:
+        _offloads["process"] += 1
+        return await asyncio.get_running_loop().run_in_executor(_process_pool(), fn, *args)
+    except BrokenProcessPool:
+        print("[Executor] process pool broke — recreating, running this batch in a thread")
+        _processes = None
+        return await asyncio.get_running_loop().run_in_executor(_thread_pool(), fn, *args)
+
+
+async def loads(text: str | bytes):
+    """json.loads, moved to the thread pool for large documents."""
+    if len(text) < JSON_OFFLOAD_BYTES:
+        _offloads["inline"] += 1
+        return json.loads(text)
+    _offloads["thread"] += 1
+    return await asyncio.get_running_loop().run_in_executor(_thread_pool(), json.loads, text)
+
+
+async def decode_json(resp):
+    """Async replacement for httpx's resp.json() that offloads large bodies."""
+    return await loads(resp.content)
+
+
+async def monitor_loop_lag():
+    """Background task: measure how late the loop wakes up from a fixed sleep."""
+    global _lag_max_ms
+    loop = asyncio.get_running_loop()
+    while True:
+        start = loop.time()
+        await asyncio.sleep(LAG_INTERVAL)
+        lag_ms = max(0.0, (loop.time() - start - LAG_INTERVAL) * 1000)
+        _lag_samples.append(lag_ms)
+        _lag_max_ms = max(_lag_max_ms, lag_ms)
+
+
+def current_lag_ms() -> float:
+    return _lag_samples[-1] if _lag_samples else 0.0
+
+
+def metrics() -> dict:
+    samples = sorted(_lag_samples)
+    p99 = samples[int((len(samples) - 1) * 0.99)] if samples else 0.0
+    return {
+        "event_loop_lag_ms": {
+            "current": round(current_lag_ms(), 2),
+            "p99_1m": round(p99, 2),
+            "mean_1m": round(sum(samples) / len(samples), 2) if samples else 0.0,
+            "max": round(_lag_max_ms, 2),
+        },
+        "offloads": dict(_offloads),
+        "ts": time.time(),
+    }
+
+
+def shutdown():
+    global _threads, _processes
+    if _threads is not None:
+        _threads.shutdown(wait=False, cancel_futures=True)
+        _threads = None
+    if _processes is not None:
+        _processes.shutdown(wait=False, cancel_futures=True)
+        _processes = None
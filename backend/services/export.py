@@ -0,0 +1,208 @@
+import asyncio
+import base64
+import csv
+import io
+import json
+import re
+import time
+from collections import OrderedDict, deque
+
+import httpx
+
+from services import sam_gov, usaspending, grants_gov, scheduler
+
+# Bulk export of everything matching a profile, streamed as NDJSON or CSV.
+#
+# Each source runs a producer that keeps up to `concurrency` pages in flight
+# (every fetch still waits for the caller's share in the scheduler) and hands
+# finished pages over in page order through a small bounded queue. The writer
+# turns each page into text and yields it straight away, so memory holds at
+# most a few pages per source no matter how large the export is.
+#
+# Every row carries an export_cursor: resuming with it re-fetches that row's
+# page and skips what was already written. Repeated ids (pagination drift
+# between pages, overlapping sources) are dropped within a bounded window.
+
+FORMATS = ("ndjson", "csv")
+SOURCES = ("sam", "usaspending", "grants")
+PAGE_SIZES = {"sam": 1000, "usaspending": 100, "grants": 100}
+DEDUPE_WINDOW = 100_000   # most recent ids remembered for dedupe
+QUEUE_PAGES = 8           # finished pages waiting to be written, across sources
+
+CSV_FIELDS = (
+    "id", "source", "source_type", "title", "agency", "recipient", "posted_date", "deadline",
+    "naics", "set_aside", "contract_type", "award_amount", "url", "description", "export_cursor",
+)
+
+
+def encode_cursor(positions: dict) -> str:
+    raw = json.dumps(positions, separators=(",", ":")).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> dict:
+    """{source: [next page, rows of it already written] or None when finished}."""
+    try:
+        positions = json.loads(base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)))
+        if not isinstance(positions, dict):
+            raise ValueError
+        for source, pos in positions.items():
+            if source not in SOURCES or (pos is not None and (len(pos) != 2 or min(pos) < 0)):
+                raise ValueError
+        return {source: (list(pos) if pos else None) for source, pos in positions.items()}
+    except (ValueError, TypeError):
+        raise ValueError("invalid export cursor")
+
+
+def _terms(keywords: str) -> list[str]:
+    # Same split as the keyword ranker
+    return [w.strip().lower() for w in re.split(r"[,\s]+", keywords) if len(w.strip()) > 2]
+
+
+def _matches(item: dict, terms: list[str]) -> bool:
+    # SAM.gov has no keyword search, so its pages are filtered here
+    if not terms:
+        return True
+    text = f"{item.get('title', '')} {item.get('description', '')} {item.get('agency', '')}".lower()
+    return any(t in text for t in terms)
+
+
+def _fetcher(source: str, client: httpx.AsyncClient, keywords: str):
+    size = PAGE_SIZES[source]
+    if source == "sam":
+        return lambda page: sam_gov.fetch_opportunity_page(client, page, limit=size)
+    if source == "usaspending":
+        return lambda page: usaspending.fetch_award_page(client, keywords, page, limit=size)
+    return lambda page: grants_gov.fetch_grant_page(client, keywords, page, limit=size)
+
+
+async def _produce(source: str, fetch, start: int, max_pages: int, concurrency: int, queue: asyncio.Queue):
+    """Fetch pages start.. with a sliding window of `concurrency`, queueing them in order."""
+    pending: deque = deque()
+    next_page = start
+    more = True
+    try:
+        while True:
+            while more and len(pending) < concurrency and next_page < start + max_pages:
+                pending.append((next_page, asyncio.create_task(fetch(next_page))))
+                next_page += 1
+            if not pending:
+                break
+            page, task = pending.popleft()
+            try:
+                items, has_more = await task
+            except Exception as e:
+                await queue.put((source, page, None, f"{type(e).__name__}: {str(e)[:160]}"))
+                return
+            await queue.put((source, page, items, None))
+            if not has_more:
+                more = False
+                # Pages past the end come back empty; don't wait on them
+                for _, t in pending:
+                    t.cancel()
+                pending.clear()
+                await queue.put((source, None, None, None))
+                return
+        # Stopped at max_pages with more available: the cursor carries on from next_page
+        await queue.put((source, next_page, [], "max_pages"))
+    finally:
+        for _, t in pending:
+            t.cancel()
+
+
+def _row_text(item: dict, fmt: str) -> str:
+    if fmt == "ndjson":
+        return json.dumps(item, separators=(",", ":"), default=str) + "\n"
+    buf = io.StringIO()
+    csv.writer(buf).writerow([item.get(f, "") if item.get(f) is not None else "" for f in CSV_FIELDS])
+    return buf.getvalue()
+
+
+def _csv_header() -> str:
+    buf = io.StringIO()
+    csv.writer(buf).writerow(CSV_FIELDS)
+    return buf.getvalue()
+
+
+async def stream(user_id: str, keywords: str, sources: list[str], fmt: str = "ndjson",
+                 cursor: str | None = None, max_pages: int = 50, concurrency: int = 3):
+    """Async generator of NDJSON/CSV text chunks, one chunk per upstream page.
+
+    NDJSON ends with an {"_export": ...} line saying whether every source ran to
+    the end, with the cursor to resume from if not. CSV resumes from the last
+    row's export_cursor column.
+    """
+    # Runs in the response task, so bind here rather than in the endpoint
+    scheduler.bind(user_id, scheduler.BACKGROUND)
+    positions = decode_cursor(cursor) if cursor else {s: [1, 0] for s in sources}
+    for source in sources:
+        positions.setdefault(source, [1, 0])
+    positions = {s: p for s, p in positions.items() if s in sources}
+    terms = _terms(keywords)
+
+    started = time.perf_counter()
+    seen: OrderedDict = OrderedDict()
+    rows = dropped = 0
+    errors = {}
+    queue: asyncio.Queue = asyncio.Queue(maxsize=QUEUE_PAGES)
+
+    if fmt == "csv":
+        yield _csv_header()
+
+    async with httpx.AsyncClient(timeout=60) as client:
+        producers = [
+            asyncio.create_task(_produce(s, _fetcher(s, client, keywords), pos[0], max_pages, concurrency, queue))
+            for s, pos in positions.items() if pos is not None
+        ]
+        running = len(producers)
+        try:
+            while running:
+                source, page, items, error = await queue.get()
+                if items is None or error:
+                    running -= 1
+                    if page is None:
+                        positions[source] = None          # finished
+                    else:
+                        positions[source] = [page, 0]     # resume at this page
+                        errors[source] = error
+                    continue
+
+                skip = positions[source][1] if positions[source][0] == page else 0
+                chunk = []
+                for n, item in enumerate(items):
+                    if n < skip:
+                        continue
+                    positions[source] = [page, n + 1]
+                    if source == "sam" and not _matches(item, terms):
+                        continue
+                    if item["id"] in seen:
+                        dropped += 1
+                        continue
+                    seen[item["id"]] = None
+                    if len(seen) > DEDUPE_WINDOW:
+                        seen.popitem(last=False)
+                    row = {k: v for k, v in item.items() if k not in ("relevance_score", "ai_summary")}
+                    row["export_cursor"] = encode_cursor(positions)
+                    chunk.append(_row_text(row, fmt))
+                    rows += 1
+                positions[source] = [page + 1, 0]
+                if chunk:
+                    yield "".join(chunk)
+        finally:
+            for task in producers:
+                task.cancel()
+            await asyncio.gather(*producers, return_exceptions=True)
+
+    complete = all(pos is None for pos in positions.values())
+    elapsed = time.perf_counter() - started
+    print(f"[Export] {rows} rows ({dropped} duplicates dropped) in {elapsed:.1f}s"
+          + ("" if complete else f" — stopped early: {errors}"))
+    if fmt == "ndjson":
+        yield json.dumps({"_export": {
+            "rows": rows,
+            "duplicates_dropped": dropped,
+            "complete": complete,
+            "cursor": None if complete else encode_cursor(positions),
+            "errors": errors,
+            "seconds": round(elapsed, 2),
+        }}) + "\n"
@@ -0,0 +1,117 @@
+import gzip
+import hashlib
+import json
+import os
+
+try:
+    import brotli
+except ImportError:   # optional: without it only gzip is offered
+    brotli = None
+
+# Field projection and content encoding for /api/feed responses.
+#
+# ?fields=cards keeps what a feed card renders and drops descriptions,
+# timestamps and the echoed profile; ?fields=detail (the default) is the full
+# item; ?fields=id,title,... keeps exactly those item fields. The body is then
+# serialised once and compressed with the best of br/gzip the client accepts.
+# Every projection x encoding is a separate representation with its own ETag
+# suffix, and feed_sync keeps the encoded bytes alongside the cached page, so
+# a hot page is projected, serialised and compressed once per variant, not
+# per request.
+
+CARD_FIELDS = (
+    "id", "source", "source_type", "title", "agency", "posted_date", "deadline", "naics",
+    "set_aside", "contract_type", "url", "award_amount", "recipient", "relevance_score",
+    "ai_summary", "is_mock", "version", "changed_fields",
+)
+PROJECTIONS = {"cards": CARD_FIELDS, "detail": None}
+ITEM_LISTS = ("items", "added", "updated")        # feed and delta bodies
+FULL_ONLY = ("profile",)                          # top-level keys only the detail view carries
+
+MIN_SIZE = int(os.getenv("FEED_COMPRESS_MIN", 1024))   # smaller bodies go out uncompressed
+GZIP_LEVEL = 6
+BROTLI_QUALITY = 5       # close to gzip -6 in speed, noticeably smaller on JSON
+
+_stats = {"identity": 0, "gzip": 0, "br": 0, "bytes_in": 0, "bytes_out": 0}
+
+
+def parse_fields(fields: str | None) -> tuple[str, tuple | None]:
+    """(variant name, item fields to keep or None for everything) for a ?fields= value."""
+    if not fields or fields == "detail":
+        return "", None
+    if fields in PROJECTIONS:
+        return fields, PROJECTIONS[fields]
+    keep = tuple(sorted({"id", *(f.strip() for f in fields.split(",") if f.strip())}))
+    if not all(f.replace("_", "").isalnum() for f in keep):
+        raise ValueError("fields must be cards, detail or a comma-separated list of item fields")
+    return "f" + hashlib.sha1(",".join(keep).encode()).hexdigest()[:8], keep
+
+
+def _offered() -> tuple:
+    return ("br", "gzip") if brotli is not None else ("gzip",)
+
+
+def negotiate(accept_encoding: str | None) -> str | None:
+    """The coding to use for an Accept-Encoding header: "br", "gzip" or None (identity)."""
+    if not accept_encoding:
+        return None
+    weights = {}
+    for part in accept_encoding.split(","):
+        coding, _, params = part.strip().partition(";")
+        q = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                q = float(params[2:])
+            except ValueError:
+                q = 0.0
+        weights[coding.strip().lower()] = q
+    best, best_q = None, 0.0
+    for coding in _offered():
+        q = weights.get(coding, weights.get("*", 0.0))
+        if q > best_q:
+            best, best_q = coding, q
+    return best
+
+
+def tag(etag: str, variant: str, encoding: str | None) -> str:
+    """ETag of one representation of a feed page; the plain etag is the full, uncompressed one."""
+    suffix = ".".join(p for p in (variant, encoding) if p)
+    return f"{etag}-{suffix}" if suffix else etag
+
+
+def base_etag(tag_value: str) -> str:
+    return tag_value.strip().strip('"').split("-", 1)[0]
+
+
+def project(body: dict, keep: tuple | None) -> dict:
+    if keep is None:
+        return body
+    out = {k: v for k, v in body.items() if k not in FULL_ONLY}
+    for name in ITEM_LISTS:
+        if name in body:
+            out[name] = [{f: item[f] for f in keep if f in item} for item in body[name]]
+    return out
+
+
+def render(body: dict, keep: tuple | None, encoding: str | None) -> tuple[bytes, str | None]:
+    """(response bytes, content coding actually applied)."""
+    # Same serialisation as JSONResponse
+    raw = json.dumps(project(body, keep), ensure_ascii=False, allow_nan=False,
+                     separators=(",", ":"), default=str).encode()
+    if encoding is None or len(raw) < MIN_SIZE:
+        encoding = None
+        content = raw
+    elif encoding == "br":
+        content = brotli.compress(raw, quality=BROTLI_QUALITY)
+    else:
+        content = gzip.compress(raw, compresslevel=GZIP_LEVEL, mtime=0)
+    _stats[encoding or "identity"] += 1
+    _stats["bytes_in"] += len(raw)
+    _stats["bytes_out"] += len(content)
+    return content, encoding
+
+
+def metrics() -> dict:
+    ratio = _stats["bytes_out"] / _stats["bytes_in"] if _stats["bytes_in"] else None
+    return {**_stats, "ratio": round(ratio, 3) if ratio else None, "brotli": brotli is not None}
@@ -0,0 +1,159 @@
+import hashlib
+import json
+import os
+import time
+from collections import OrderedDict
+
+from services import versions
+
+# Conditional GETs and delta sync for /api/feed.
+#
+# A feed response is summarised as its ranked (id, version, score, summary)
+# tuples plus the page metadata. The strong ETag is a hash of that summary,
+# and doubles as the sync token for delta requests.
+#
+# - _latest keeps the last response per view (user, profile, query) for
+#   VIEW_TTL seconds. A poll that repeats the ETag inside that window gets a
+#   304 without touching upstreams or the ranker. It also holds the encoded
+#   bytes of each representation served (see feed_encoding).
+# - _views keeps the summary (not the items) of recent tokens, so
+#   ?since=<token> can answer with only what was added, changed, re-ranked or
+#   removed since the client last synced.
+
+VIEW_TTL = int(os.getenv("FEED_VIEW_TTL", 120))   # seconds a computed feed page is reused
+MAX_LATEST = 1000
+MAX_VIEWS = 5000
+
+# Fields that describe the ranking, not the opportunity itself
+RANKING_FIELDS = ("relevance_score", "ai_summary")
+META_FIELDS = ("total", "total_matches", "has_more", "page", "source_counts", "degradation", "facets", "throttled")
+
+_latest: OrderedDict = OrderedDict()   # view key -> {"ts", "etag", "body", "encoded": {variant: bytes}}
+_views: OrderedDict = OrderedDict()    # etag -> {"items": {id: [version, score, summary digest]}, "order": [ids]}
+_stats = {"not_modified": 0, "reused": 0, "computed": 0, "deltas": 0, "resets": 0, "encoded": 0, "encoded_hits": 0}
+
+
+def item_version(item: dict) -> str:
+    return item.get("content_hash") or versions.content_hash(item)
+
+
+def _digest(text) -> str:
+    return hashlib.sha1(str(text or "").encode()).hexdigest()[:8]
+
+
+def view_key(user_id: str, profile_fp: str, params: list[tuple]) -> str:
+    return f"{user_id}:{profile_fp}:" + "&".join(f"{k}={v}" for k, v in sorted(params))
+
+
+def _summarise(body: dict) -> tuple[str, dict]:
+    items = {}
+    order = []
+    h = hashlib.sha1()
+    for item in body["items"]:
+        entry = [item_version(item), item.get("relevance_score"), _digest(item.get("ai_summary"))]
+        items[item["id"]] = entry
+        order.append(item["id"])
+        h.update(f"{item['id']}|{entry[0]}|{entry[1]}|{entry[2]}\n".encode())
+    meta = {k: body[k] for k in META_FIELDS if k in body}
+    h.update(json.dumps(meta, sort_keys=True, default=str).encode())
+    h.update(_digest(json.dumps(body.get("profile"), sort_keys=True)).encode())
+    return h.hexdigest()[:32], {"items": items, "order": order}
+
+
+def cached(key: str) -> dict | None:
+    """The last response for this view if it is still fresh: {"etag", "body"}."""
+    entry = _latest.get(key)
+    # A page cut short by the scheduler is recomputed so it fills in once the share refills
+    if entry is None or time.time() - entry["ts"] > VIEW_TTL or entry["body"].get("throttled"):
+        return None
+    _latest.move_to_end(key)
+    _stats["reused"] += 1
+    return entry
+
+
+def remember(key: str, body: dict) -> str:
+    """Record a freshly computed response for its view. Returns its ETag."""
+    etag, view = _summarise(body)
+    _stats["computed"] += 1
+    _latest[key] = {"ts": time.time(), "etag": etag, "body": body, "encoded": {}}
+    _latest.move_to_end(key)
+    while len(_latest) > MAX_LATEST:
+        _latest.popitem(last=False)
+    _views[etag] = view
+    _views.move_to_end(etag)
+    while len(_views) > MAX_VIEWS:
+        _views.popitem(last=False)
+    return etag
+
+
+def encoded(key: str, variant: tuple, render):
+    """The encoded response for one representation of a cached view, rendering it on first use."""
+    entry = _latest.get(key)
+    if entry is None:
+        return render()
+    out = entry["encoded"].get(variant)
+    if out is None:
+        out = entry["encoded"][variant] = render()
+        _stats["encoded"] += 1
+    else:
+        _stats["encoded_hits"] += 1
+    return out
+
+
+def matches(if_none_match: str | None, etag: str) -> bool:
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    # Only strong comparison: a W/ prefixed tag never matches
+    return f'"{etag}"' in (t.strip() for t in if_none_match.split(","))
+
+
+def not_modified():
+    _stats["not_modified"] += 1
+
+
+def delta(since: str, etag: str, body: dict) -> dict:
+    """Changes between the view a client synced at `since` and the current body.
+
+    Unknown or evicted tokens get the full body back with "reset": true.
+    """
+    # Representation ETags (projected/compressed) carry a -suffix on the same token
+    old = _views.get(since.strip().strip('"').split("-", 1)[0])
+    if old is None:
+        _stats["resets"] += 1
+        return {**body, "sync_token": etag, "reset": True}
+    _stats["deltas"] += 1
+    current = _views.get(etag)
+    if current is None:
+        # The view outlived its summary in _views (reused from _latest after eviction)
+        current = _views[etag] = _summarise(body)[1]
+        while len(_views) > MAX_VIEWS:
+            _views.popitem(last=False)
+    added, updated, reranked = [], [], []
+    for item in body["items"]:
+        before = old["items"].get(item["id"])
+        now = current["items"][item["id"]]
+        if before is None:
+            added.append(item)
+        elif before[0] != now[0]:
+            updated.append(item)
+        elif before[1:] != now[1:]:
+            reranked.append({k: item.get(k) for k in ("id", *RANKING_FIELDS)})
+    removed = [i for i in old["items"] if i not in current["items"]]
+    response = {
+        "sync_token": etag,
+        "since": since,
+        "added": added,
+        "updated": updated,
+        "reranked": reranked,
+        "removed": removed,
+        **{k: body[k] for k in META_FIELDS if k in body},
+    }
+    if current["order"] != old["order"]:
+        response["order"] = current["order"]
+    return response
+
+
+def metrics() -> dict:
+    return {**_stats, "views": len(_views), "latest": len(_latest)}
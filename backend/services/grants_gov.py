@@ -1,8 +1,9 @@
 import httpx
 import os
 from datetime import datetime, timedelta
+from services import executor, dates, scheduler, versions, recorder, admission
 
-GRANTS_BASE = "https://apply07.grants.gov/grantsws/rest/opportunities/search/"
+GRANTS_BASE = os.getenv("GRANTS_BASE", "https://apply07.grants.gov/grantsws/rest/opportunities/search/")
 
 
 def _rdate(days_ago: int) -> str:
@@ -73,12 +74,11 @@ MOCK_GRANTS = [
 ]
 
 
-async def fetch_grants(keywords: str = "", limit: int = 15, page: int = 1) -> dict:
-    start_record = (page - 1) * min(limit, 25)
-    payload = {
+def _payload(keywords: str, rows: int, start_record: int) -> dict:
+    return {
         "keyword": keywords or "defense technology",
         "oppStatuses": "forecasted|posted",
-        "rows": min(limit, 25),
+        "rows": rows,
         "startRecordNum": start_record,
         "sortBy": "openDate|desc",
         "eligibilities": "",
@@ -87,11 +87,18 @@ async def fetch_grants(keywords: str = "", limit: int = 15, page: int = 1) -> di
         "fundingInstruments": "",
     }
 
+
+@recorder.capture("grants")
+async def fetch_grants(keywords: str = "", limit: int = 15, page: int = 1) -> dict:
+    start_record = (page - 1) * min(limit, 25)
+    payload = _payload(keywords, min(limit, 25), start_record)
+
     try:
         async with httpx.AsyncClient(timeout=15) as client:
-            resp = await client.post(GRANTS_BASE, json=payload)
+            await scheduler.acquire("grants")
+            resp = await admission.timed("grants", client.post(GRANTS_BASE, json=payload))
             resp.raise_for_status()
-            data = resp.json()
+            data = await executor.decode_json(resp)
             hits = data.get("oppHits", [])
             total = data.get("oppCount", 0)
             has_more = (start_record + limit) < total
@@ -100,18 +107,43 @@ async def fetch_grants(keywords: str = "", limit: int = 15, page: int = 1) -> di
                 mock = _mock_grants(keywords, limit, page)
                 return {"items": mock, "total_on_page": len(mock), "has_more": False}
 
-            items = [_parse(g) for g in hits]
+            items = await executor.run_threaded(_parse_all, hits, size=len(hits))
             return {"items": items, "total_on_page": len(items), "has_more": has_more}
 
+    except scheduler.Throttled as e:
+        # Out of this user's share: no mock data, and no more pages to scroll into
+        print(f"[Grants.gov] {e}")
+        return {"items": [], "total_on_page": 0, "has_more": False, "throttled": True,
+                "retry_after": round(e.retry_after)}
     except Exception as e:
         print(f"[Grants.gov] {e} — using mock data")
         mock = _mock_grants(keywords, limit, page)
         return {"items": mock, "total_on_page": len(mock), "has_more": page < 5}
 
 
+async def fetch_grant_page(client: httpx.AsyncClient, keywords: str, page: int,
+                           limit: int = 100) -> tuple[list[dict], bool]:
+    """One raw page of grants for bulk consumers (export). Errors propagate, no mock data.
+
+    Returns (parsed items, has_more).
+    """
+    start_record = (page - 1) * limit
+    await scheduler.acquire("grants")
+    resp = await client.post(GRANTS_BASE, json=_payload(keywords, limit, start_record))
+    resp.raise_for_status()
+    data = await executor.decode_json(resp)
+    hits = data.get("oppHits", [])
+    items = await executor.run_threaded(_parse_all, hits, size=len(hits))
+    return items, bool(hits) and start_record + limit < data.get("oppCount", 0)
+
+
+def _parse_all(rows: list[dict]) -> list[dict]:
+    return [_parse(g) for g in rows]
+
+
 def _parse(g: dict) -> dict:
     opp_id = g.get("id", "")
-    return {
+    return versions.stamp(dates.stamp({
         "id": f"grant-{opp_id}",
         "source": "Grants.gov",
         "source_type": "grant",
@@ -126,7 +158,7 @@ def _parse(g: dict) -> dict:
         "url": f"https://www.grants.gov/search-results-detail/{opp_id}",
         "award_amount": g.get("awardCeiling"),
         "is_mock": False,
-    }
+    }))
 
 
 def _mock_grants(keywords: str, limit: int, page: int = 1) -> list[dict]:
@@ -0,0 +1,98 @@
+import json
+import re
+
+# Incremental parsing of a JSON array while its text is still arriving.
+#
+# LLM completions stream in a few characters at a time. ArrayElements scans
+# each chunk once and hands back every element of the target array as soon as
+# its closing brace arrives. A completion that is cut off (max_tokens, a
+# dropped connection) still yields everything before the cut. A malformed
+# element is counted and skipped without affecting its neighbours.
+
+
+class ArrayElements:
+    """Elements of the first array found under `key` (or the first array at all), as they close."""
+
+    def __init__(self, key: str | None = None):
+        self._start = re.compile(rf'"{re.escape(key)}"\s*:\s*\[' if key else r"\[")
+        self._buf = ""
+        self._pos = 0            # next character of _buf to scan
+        self._in_array = False
+        self._depth = 0          # nesting inside the current element
+        self._elem = None        # _buf offset where the current element starts
+        self._in_string = False
+        self._escape = False
+        self.done = False        # the array's closing bracket was seen
+        self.parsed = 0
+        self.errors = 0
+
+    def feed(self, text: str) -> list:
+        """Add a chunk of text. Returns the elements it completed, parsed."""
+        if self.done:
+            return []
+        self._buf += text
+        if not self._in_array:
+            match = self._start.search(self._buf)
+            if match is None:
+                # Keep enough of the tail for a key split across chunks
+                self._buf = self._buf[-64:]
+                return []
+            self._in_array = True
+            self._buf = self._buf[match.end():]
+            self._pos = 0
+
+        out = []
+        buf = self._buf
+        i = self._pos
+        while i < len(buf):
+            c = buf[i]
+            if self._in_string:
+                if self._escape:
+                    self._escape = False
+                elif c == "\\":
+                    self._escape = True
+                elif c == '"':
+                    self._in_string = False
+            elif c == '"':
+                self._in_string = True
+                if self._elem is None:
+                    self._elem = i
+            elif c in "{[":
+                if self._elem is None:
+                    self._elem = i
+                self._depth += 1
+            elif c in "}]":
+                if self._depth == 0:
+                    # The array itself closed
+                    self._flush_scalar(buf, i, out)
+                    self.done = True
+                    break
+                self._depth -= 1
+                if self._depth == 0:
+                    self._emit(buf[self._elem:i + 1], out)
+                    self._elem = None
+            elif c == "," and self._depth == 0:
+                self._flush_scalar(buf, i, out)
+            elif self._elem is None and not c.isspace():
+                self._elem = i   # a bare number/literal element
+            i += 1
+
+        # Drop what has been consumed so the buffer holds at most one element
+        keep = self._elem if self._elem is not None else i
+        self._buf = buf[keep:]
+        self._pos = i - keep
+        if self._elem is not None:
+            self._elem = 0
+        return out
+
+    def _flush_scalar(self, buf: str, end: int, out: list):
+        if self._elem is not None and self._depth == 0:
+            self._emit(buf[self._elem:end], out)
+            self._elem = None
+
+    def _emit(self, text: str, out: list):
+        try:
+            out.append(json.loads(text))
+            self.parsed += 1
+        except ValueError:
+            self.errors += 1
@@ -0,0 +1,245 @@
+import asyncio
+import os
+import random
+from collections import OrderedDict
+
+import httpx
+from services import executor, scheduler
+
+# Single entry point for OpenAI calls.
+#
+# - One AsyncOpenAI client per API key, all sharing one httpx connection pool,
+#   instead of a fresh client (and pool) per call.
+# - A per-key semaphore caps concurrent requests so one key can't be flooded.
+# - 429 / 5xx / connection errors are retried with jittered exponential backoff.
+#   insufficient_quota is a 429 too, but retrying can't fix it.
+# - Calls request JSON-schema structured output, so replies parse directly.
+#   stream_json yields the same reply as it is generated; it retries only
+#   until the first token, after which the caller owns what it has parsed.
+#
+# Keys are passed per call and never stored in os.environ. A key rejected by
+# OpenAI is remembered and skipped until restart. Calls on the shared server
+# key are charged to the caller's "openai" token share in the scheduler; a
+# user's own key is their own budget.
+
+MODEL = "gpt-4o-mini"
+MAX_CONCURRENCY_PER_KEY = int(os.getenv("LLM_MAX_CONCURRENCY_PER_KEY", 4))
+MAX_RETRIES = int(os.getenv("LLM_MAX_RETRIES", 3))
+BACKOFF_BASE = 0.5     # seconds; doubles per attempt, jittered ±50%
+BACKOFF_MAX = 8.0
+MAX_CLIENTS = 256      # distinct keys kept warm
+
+_http: httpx.AsyncClient | None = None
+_clients: OrderedDict = OrderedDict()   # key -> AsyncOpenAI, least recently used first
+_semaphores: dict = {}                  # key -> asyncio.Semaphore
+_rejected_keys: set = set()
+_stats = {"calls": 0, "streams": 0, "retries": 0, "failures": 0, "truncated": 0,
+          "prompt_tokens": 0, "completion_tokens": 0}
+
+
+def resolve_key(api_key: str | None = None) -> str:
+    """The caller's key, else the server key; "" if neither is usable."""
+    key = api_key or os.getenv("OPENAI_API_KEY", "")
+    return "" if key in _rejected_keys else key
+
+
+def available(api_key: str | None = None) -> bool:
+    try:
+        import openai  # noqa: F401
+    except ImportError:
+        return False
+    return bool(resolve_key(api_key))
+
+
+def _client(key: str):
+    global _http
+    from openai import AsyncOpenAI
+
+    client = _clients.get(key)
+    if client is not None:
+        _clients.move_to_end(key)
+        return client
+    if _http is None:
+        _http = httpx.AsyncClient(
+            timeout=httpx.Timeout(60, connect=10),
+            limits=httpx.Limits(max_connections=100, max_keepalive_connections=20),
+        )
+    # Retries are handled here, not by the SDK, so backoff and limits are shared
+    client = AsyncOpenAI(
+        api_key=key,
+        base_url=os.getenv("OPENAI_BASE_URL") or None,
+        http_client=_http,
+        max_retries=0,
+    )
+    _clients[key] = client
+    if len(_clients) > MAX_CLIENTS:
+        old_key, _ = _clients.popitem(last=False)
+        _semaphores.pop(old_key, None)
+    return client
+
+
+def _semaphore(key: str) -> asyncio.Semaphore:
+    if key not in _semaphores:
+        _semaphores[key] = asyncio.Semaphore(MAX_CONCURRENCY_PER_KEY)
+    return _semaphores[key]
+
+
+def _retry_delay(attempt: int, error) -> float:
+    response = getattr(error, "response", None)
+    retry_after = response.headers.get("retry-after") if response is not None else None
+    if retry_after:
+        try:
+            return min(float(retry_after), BACKOFF_MAX)
+        except ValueError:
+            pass
+    return min(BACKOFF_BASE * 2 ** attempt, BACKOFF_MAX) * random.uniform(0.5, 1.5)
+
+
+def _retryable(error) -> bool:
+    import openai
+
+    if isinstance(error, openai.RateLimitError):
+        return "insufficient_quota" not in str(error)
+    return isinstance(error, (openai.InternalServerError, openai.APIConnectionError))
+
+
+def json_schema(name: str, schema: dict) -> dict:
+    return {"type": "json_schema", "json_schema": {"name": name, "strict": True, "schema": schema}}
+
+
+def chat_body(prompt: str, schema_name: str, schema: dict, max_tokens: int = 1000,
+              temperature: float = 0.2) -> dict:
+    """Request body for a structured-output chat completion (also used for batch files)."""
+    return {
+        "model": MODEL,
+        "messages": [{"role": "user", "content": prompt}],
+        "temperature": temperature,
+        "max_tokens": max_tokens,
+        "response_format": json_schema(schema_name, schema),
+    }
+
+
+def client(api_key: str | None = None):
+    """The pooled AsyncOpenAI client for a key (the server key by default)."""
+    key = resolve_key(api_key)
+    if not key:
+        raise ValueError("no usable OpenAI API key")
+    return _client(key)
+
+
+async def complete_json(prompt: str, schema_name: str, schema: dict, api_key: str | None = None,
+                        max_tokens: int = 1000, temperature: float = 0.2) -> dict:
+    """Run one chat completion constrained to a JSON schema and return the parsed object.
+
+    Raises the underlying OpenAI error once retries are exhausted (or right away
+    for non-retryable errors), ValueError if no key is available.
+    """
+    import openai
+
+    key = resolve_key(api_key)
+    if not key:
+        raise ValueError("no usable OpenAI API key")
+    oai = _client(key)
+    shared_key = key == os.getenv("OPENAI_API_KEY", "")
+    estimate = len(prompt) // 4 + max_tokens
+    if shared_key:
+        await scheduler.acquire("openai", estimate)
+
+    for attempt in range(MAX_RETRIES + 1):
+        try:
+            async with _semaphore(key):
+                _stats["calls"] += 1
+                response = await oai.chat.completions.create(
+                    **chat_body(prompt, schema_name, schema, max_tokens, temperature)
+                )
+            if response.usage:
+                _stats["prompt_tokens"] += response.usage.prompt_tokens
+                _stats["completion_tokens"] += response.usage.completion_tokens
+                if shared_key:
+                    scheduler.refund("openai", max(estimate - response.usage.total_tokens, 0))
+            return await executor.loads(response.choices[0].message.content)
+        except openai.AuthenticationError:
+            _rejected_keys.add(key)
+            _stats["failures"] += 1
+            raise
+        except Exception as e:
+            if attempt == MAX_RETRIES or not _retryable(e):
+                _stats["failures"] += 1
+                raise
+            _stats["retries"] += 1
+            await asyncio.sleep(_retry_delay(attempt, e))
+
+
+async def stream_json(prompt: str, schema_name: str, schema: dict, api_key: str | None = None,
+                      max_tokens: int = 1000, temperature: float = 0.2):
+    """Like complete_json, but an async generator of the reply text as it streams in.
+
+    Errors before the first token are retried as in complete_json. After that
+    they propagate, as does nothing at all for a reply cut off at max_tokens:
+    the text simply ends, and the caller keeps whatever it managed to parse.
+    """
+    import openai
+
+    key = resolve_key(api_key)
+    if not key:
+        raise ValueError("no usable OpenAI API key")
+    oai = _client(key)
+    shared_key = key == os.getenv("OPENAI_API_KEY", "")
+    estimate = len(prompt) // 4 + max_tokens
+    if shared_key:
+        await scheduler.acquire("openai", estimate)
+
+    used = None
+    try:
+        for attempt in range(MAX_RETRIES + 1):
+            started = False
+            try:
+                async with _semaphore(key):
+                    _stats["calls"] += 1
+                    _stats["streams"] += 1
+                    stream = await oai.chat.completions.create(
+                        **chat_body(prompt, schema_name, schema, max_tokens, temperature),
+                        stream=True,
+                        stream_options={"include_usage": True},
+                    )
+                    async for chunk in stream:
+                        if chunk.usage:
+                            used = chunk.usage
+                        if not chunk.choices:
+                            continue
+                        choice = chunk.choices[0]
+                        if choice.finish_reason == "length":
+                            _stats["truncated"] += 1
+                        if choice.delta.content:
+                            started = True
+                            yield choice.delta.content
+                return
+            except openai.AuthenticationError:
+                _rejected_keys.add(key)
+                _stats["failures"] += 1
+                raise
+            except Exception as e:
+                if started or attempt == MAX_RETRIES or not _retryable(e):
+                    _stats["failures"] += 1
+                    raise
+                _stats["retries"] += 1
+                await asyncio.sleep(_retry_delay(attempt, e))
+    finally:
+        if used:
+            _stats["prompt_tokens"] += used.prompt_tokens
+            _stats["completion_tokens"] += used.completion_tokens
+            if shared_key:
+                scheduler.refund("openai", max(estimate - used.total_tokens, 0))
+
+
+def metrics() -> dict:
+    return {**_stats, "clients": len(_clients), "rejected_keys": len(_rejected_keys)}
+
+
+async def close():
+    global _http
+    _clients.clear()
+    _semaphores.clear()
+    if _http is not None:
+        await _http.aclose()
+        _http = None
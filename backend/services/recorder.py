@@ -0,0 +1,293 @@
+import asyncio
+import contextvars
+import functools
+import glob
+import gzip
+import hashlib
+import inspect
+import json
+import os
+import random
+import re
+import time
+import uuid
+
+# Opt-in capture of real feed traffic, and the upstream half of its replay.
+#
+# RECORD_TRAFFIC=1 records a sample (RECORD_SAMPLE) of /api/feed requests.
+# Each request is stored with its query, the headers that change the response,
+# the caller's profile, status and latency: "ms" runs to the last byte of the
+# body, so a streamed (NDJSON) feed counts in full, and "headers_ms" to when
+# the status and headers were ready. Every sam/usaspending/grants fetch
+# made while serving it is stored too, with its arguments, duration and the
+# parsed result. Lines are gzip'd NDJSON in RECORD_DIR. Segments rotate at
+# RECORD_SEGMENT_MB of raw text or after an hour; the newest RECORD_KEEP are
+# kept. Large payloads (upstream results, profiles) are stored once per
+# segment as "blob" lines and referenced by hash, so a hot page fetched a
+# thousand times costs one copy. openai_key is dropped from queries (only its
+# presence is kept), and anything shaped like an API key is masked before
+# writing.
+#
+# REPLAY_ARCHIVE=<dir or file> turns the fetch functions into players. A call
+# whose arguments were recorded returns the recorded result after the recorded
+# duration (times REPLAY_UPSTREAM_SCALE); repeats cycle through the
+# recordings. An unrecorded call goes to the live function and counts as a
+# miss. bench/replay.py drives the recorded requests against such a build.
+#
+# With neither variable set, capture() returns the function unchanged.
+
+RECORD = os.getenv("RECORD_TRAFFIC", "") == "1"
+REPLAY_ARCHIVE = os.getenv("REPLAY_ARCHIVE", "")
+RECORD_DIR = os.getenv("RECORD_DIR", os.path.join(os.path.dirname(os.path.dirname(__file__)), "data", "traffic"))
+RECORD_SAMPLE = float(os.getenv("RECORD_SAMPLE", 1.0))
+SEGMENT_BYTES = int(float(os.getenv("RECORD_SEGMENT_MB", 64)) * 1024 * 1024)
+SEGMENT_SECONDS = 3600
+KEEP_SEGMENTS = int(os.getenv("RECORD_KEEP", 24))
+FLUSH_INTERVAL = 2          # seconds between writes of buffered lines
+MAX_PENDING = 50_000        # buffered lines; beyond this new events are dropped
+REPLAY_UPSTREAM_SCALE = float(os.getenv("REPLAY_UPSTREAM_SCALE", 1.0))
+
+FEED_PATHS = ("/api/feed", "/api/feed/")
+RECORDED_HEADERS = ("if-none-match", "accept-encoding")
+SECRET_PATTERNS = (
+    (re.compile(r"(api_key=)[^&\"'\s]+"), r"\1REDACTED"),
+    (re.compile(r"\bsk-[A-Za-z0-9_-]{8,}"), "sk-REDACTED"),
+)
+
+_request: contextvars.ContextVar = contextvars.ContextVar("recorded_request", default=None)
+_pending: list = []         # lines waiting for the writer
+_blobs: set = set()         # blob hashes already in the current segment
+_segment: dict = {"path": None, "file": None, "bytes": 0, "opened": 0.0}
+_recorded: dict = {}        # replay: call key -> [(ms, result json or None, error or None)]
+_cursor: dict = {}          # replay: call key -> next recording to serve
+_stats = {"requests": 0, "upstream": 0, "blobs": 0, "dropped": 0, "bytes": 0, "segments": 0,
+          "replay_hits": 0, "replay_misses": 0}
+
+
+def scrub(text: str) -> str:
+    for pattern, replacement in SECRET_PATTERNS:
+        text = pattern.sub(replacement, text)
+    return text
+
+
+def _emit(line: str):
+    if len(_pending) >= MAX_PENDING:
+        _stats["dropped"] += 1
+        return
+    _pending.append(line)
+
+
+def _blob(obj) -> str:
+    """Hash of a payload, writing it to the current segment the first time it is seen there."""
+    text = scrub(json.dumps(obj, sort_keys=True, separators=(",", ":"), default=str))
+    h = hashlib.sha1(text.encode()).hexdigest()[:16]
+    if h not in _blobs:
+        _blobs.add(h)
+        _stats["blobs"] += 1
+        _emit(f'{{"t":"blob","h":"{h}","d":{text}}}')
+    return h
+
+
+def _call_key(source: str, arguments: dict) -> str:
+    return json.dumps([source, arguments], sort_keys=True, default=str)
+
+
+def capture(source: str):
+    """Decorator for upstream fetch functions: records them (RECORD_TRAFFIC) or plays them back (REPLAY_ARCHIVE)."""
+    def wrap(fn):
+        if not RECORD and not REPLAY_ARCHIVE:
+            return fn
+        signature = inspect.signature(fn)
+
+        def arguments(args, kwargs) -> dict:
+            bound = signature.bind(*args, **kwargs)
+            bound.apply_defaults()
+            return dict(bound.arguments)
+
+        if REPLAY_ARCHIVE:
+            @functools.wraps(fn)
+            async def replayed(*args, **kwargs):
+                key = _call_key(source, arguments(args, kwargs))
+                recordings = _recorded.get(key)
+                if not recordings:
+                    _stats["replay_misses"] += 1
+                    return await fn(*args, **kwargs)
+                _stats["replay_hits"] += 1
+                n = _cursor.get(key, 0)
+                _cursor[key] = n + 1
+                ms, result, error = recordings[n % len(recordings)]
+                await asyncio.sleep(ms * REPLAY_UPSTREAM_SCALE / 1000)
+                if error:
+                    raise RuntimeError(f"replayed upstream error: {error}")
+                # A fresh copy each time — callers mutate items while ranking
+                return json.loads(result)
+            return replayed
+
+        @functools.wraps(fn)
+        async def recorded(*args, **kwargs):
+            request_id = _request.get()
+            if request_id is None:
+                return await fn(*args, **kwargs)
+            started = time.perf_counter()
+            event = {"t": "up", "req": request_id, "src": source, "args": arguments(args, kwargs)}
+            try:
+                result = await fn(*args, **kwargs)
+            except Exception as e:
+                event.update(ms=round((time.perf_counter() - started) * 1000, 1), err=f"{type(e).__name__}: {e}"[:200])
+                _emit(scrub(json.dumps(event, default=str)))
+                raise
+            event.update(ms=round((time.perf_counter() - started) * 1000, 1), r=_blob(result))
+            _stats["upstream"] += 1
+            _emit(scrub(json.dumps(event, default=str)))
+            return result
+        return recorded
+    return wrap
+
+
+async def record_request(request, call_next, profile_for):
+    """HTTP middleware body: record a sampled /api/feed request and the upstream calls it makes."""
+    if request.url.path not in FEED_PATHS or random.random() >= RECORD_SAMPLE:
+        return await call_next(request)
+    request_id = uuid.uuid4().hex[:12]
+    token = _request.set(request_id)
+    ts = time.time()
+    started = time.perf_counter()
+
+    def finish(status: int, headers_ms: float | None):
+        query = [[k, v] for k, v in request.query_params.multi_items() if k != "openai_key"]
+        user_id = request.query_params.get("user_id", "default")
+        event = {
+            "t": "req", "id": request_id, "ts": round(ts, 3), "path": request.url.path, "query": query,
+            "own_key": bool(request.query_params.get("openai_key")),
+            "headers": {h: request.headers[h] for h in RECORDED_HEADERS if h in request.headers},
+            "user": user_id, "profile": _blob(profile_for(user_id)),
+            "status": status, "ms": round((time.perf_counter() - started) * 1000, 1), "headers_ms": headers_ms,
+        }
+        _stats["requests"] += 1
+        _emit(scrub(json.dumps(event, default=str)))
+
+    try:
+        response = await call_next(request)
+    except BaseException:
+        finish(500, None)
+        raise
+    finally:
+        _request.reset(token)
+    headers_ms = round((time.perf_counter() - started) * 1000, 1)
+    body = getattr(response, "body_iterator", None)
+    if body is None:
+        finish(response.status_code, headers_ms)
+        return response
+
+    async def timed_body():
+        # The app is still producing the body here; the request ends with its last chunk
+        try:
+            async for chunk in body:
+                yield chunk
+        finally:
+            finish(response.status_code, headers_ms)
+
+    response.body_iterator = timed_body()
+    return response
+
+
+# --- Archive writing ---
+
+def _open_segment():
+    os.makedirs(RECORD_DIR, exist_ok=True)
+    path = os.path.join(RECORD_DIR, f"traffic-{time.strftime('%Y%m%d-%H%M%S')}-{os.getpid()}.ndjson.gz")
+    _segment.update(path=path, file=gzip.open(path, "wt", compresslevel=6), bytes=0, opened=time.time())
+    _stats["segments"] += 1
+    # Only this process's segments are pruned; every worker keeps its own KEEP_SEGMENTS
+    mine = sorted(glob.glob(os.path.join(RECORD_DIR, f"traffic-*-{os.getpid()}.ndjson.gz")))
+    for old in mine[:-KEEP_SEGMENTS]:
+        os.remove(old)
+
+
+def _write(lines: list[str], close: bool):
+    if lines:
+        if _segment["file"] is None:
+            _open_segment()
+        text = "\n".join(lines) + "\n"
+        _segment["file"].write(text)
+        # A sync flush keeps the segment readable up to here even if the process dies
+        _segment["file"].flush()
+        _segment["bytes"] += len(text)
+        _stats["bytes"] += len(text)
+    if close and _segment["file"] is not None:
+        _segment["file"].close()
+        _segment["file"] = None
+
+
+async def flush(final: bool = False):
+    global _pending
+    lines, _pending = _pending, []
+    rotate = final or (_segment["file"] is not None and (
+        _segment["bytes"] >= SEGMENT_BYTES or time.time() - _segment["opened"] >= SEGMENT_SECONDS))
+    if rotate:
+        # Blobs are written again in the next segment, so each segment stands alone
+        _blobs.clear()
+    await asyncio.to_thread(_write, lines, rotate)
+
+
+async def writer_loop():
+    while True:
+        await asyncio.sleep(FLUSH_INTERVAL)
+        try:
+            await flush()
+        except OSError as e:
+            print(f"[Recorder] Write failed: {e}")
+
+
+# --- Archive reading ---
+
+def segments(path: str) -> list[str]:
+    if os.path.isdir(path):
+        return sorted(glob.glob(os.path.join(path, "traffic-*.ndjson.gz")))
+    return [path]
+
+
+def read_archive(path: str):
+    """Yield recorded events in file order, with "profile" and "r" blob references resolved to JSON text."""
+    for segment in segments(path):
+        blobs = {}
+        try:
+            with gzip.open(segment, "rt") as f:
+                for line in f:
+                    try:
+                        event = json.loads(line)
+                    except ValueError:
+                        continue   # a torn last line from a killed process
+                    if event["t"] == "blob":
+                        blobs[event["h"]] = json.dumps(event["d"])
+                        continue
+                    for field in ("profile", "r"):
+                        if field in event:
+                            event[field] = blobs.get(event[field])
+                    yield event
+        except (OSError, EOFError) as e:
+            # A segment still being written ends without a gzip trailer
+            print(f"[Recorder] {os.path.basename(segment)}: stopped reading at {type(e).__name__}")
+
+
+def load_replay(path: str = REPLAY_ARCHIVE) -> int:
+    """Index recorded upstream calls for playback. Returns how many were loaded."""
+    loaded = 0
+    for event in read_archive(path):
+        if event["t"] != "up" or (event.get("r") is None and not event.get("err")):
+            continue
+        key = _call_key(event["src"], event["args"])
+        _recorded.setdefault(key, []).append((event["ms"], event.get("r"), event.get("err")))
+        loaded += 1
+    print(f"[Recorder] Replaying {loaded} upstream calls ({len(_recorded)} distinct) from {path}")
+    return loaded
+
+
+def metrics() -> dict:
+    return {
+        **_stats,
+        "recording": RECORD,
+        "replaying": bool(REPLAY_ARCHIVE),
+        "pending": len(_pending),
+        "segment": os.path.basename(_segment["path"]) if _segment["path"] else None,
+    }
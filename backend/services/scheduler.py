@@ -0,0 +1,329 @@
+import asyncio
+import contextvars
+import itertools
+import json
+import os
+import time
+
+# Fair-share scheduling of the shared upstream budgets.
+#
+# Everything the server spends on a user's behalf goes through acquire():
+# SAM.gov calls (one daily-quota'd key for all users), USASpending and
+# Grants.gov calls, and OpenAI tokens on the server key. Each resource has a
+# shared token bucket (the budget we can spend in total) and one bucket per
+# user whose size and refill rate scale with the user's weight, so one heavy
+# scroller runs dry on their own bucket before they can drain everyone else.
+#
+# Calls that can't go yet wait in a per-resource queue. Whenever tokens free
+# up, the queue is re-sorted by priority class (first page < deep scroll <
+# background), then by how full the caller's bucket is (light users first),
+# then arrival order. A call that waits longer than MAX_WAIT raises Throttled.
+#
+# Resources with a daily quota (SAM.gov's key allows about 1,000 calls a day)
+# also have daily budgets, shared and per user, that refill at UTC midnight.
+# The per-minute buckets only smooth bursts; the daily ones stop a heavy
+# scroller from spending everyone's quota. A call over a daily budget raises
+# Throttled straight away, with retry_after pointing at the reset.
+#
+# The caller (user_id, priority) travels in a contextvar set by the router, so
+# service functions don't need the user threaded through their signatures.
+
+INTERACTIVE, SCROLL, BACKGROUND = range(3)
+PRIORITIES = {INTERACTIVE: "interactive", SCROLL: "scroll", BACKGROUND: "background"}
+
+# resource -> (per-user refill per minute, per-user burst, shared refill per minute, shared burst)
+# Upstream resources count calls; "openai" counts tokens (prompt + completion).
+LIMITS = {
+    "sam": (6, 20, 60, 60),
+    "usaspending": (60, 40, 600, 200),
+    "grants": (60, 40, 600, 200),
+    "openai": (20_000, 20_000, 200_000, 100_000),
+}
+for _name in list(LIMITS):
+    # e.g. SCHED_SAM="6,20,60,60"
+    if os.getenv(f"SCHED_{_name.upper()}"):
+        LIMITS[_name] = tuple(float(v) for v in os.environ[f"SCHED_{_name.upper()}"].split(","))
+
+# resource -> (per-user calls per day, shared calls per day), e.g. SCHED_SAM_DAILY="100,1000"
+DAILY_LIMITS = {"sam": (100, 1000)}
+for _name in list(LIMITS):
+    if os.getenv(f"SCHED_{_name.upper()}_DAILY"):
+        DAILY_LIMITS[_name] = tuple(float(v) for v in os.environ[f"SCHED_{_name.upper()}_DAILY"].split(","))
+
+# user_id -> weight, e.g. SCHED_WEIGHTS='{"capture-team": 3}'
+WEIGHTS: dict = json.loads(os.getenv("SCHED_WEIGHTS", "{}"))
+MAX_WAIT = float(os.getenv("SCHED_MAX_WAIT", 20))   # seconds a call may queue before Throttled
+IDLE_USER_TTL = 3600                                # drop per-user state after an hour idle
+
+_caller: contextvars.ContextVar = contextvars.ContextVar("scheduler_caller", default=("system", BACKGROUND))
+_seq = itertools.count()
+
+
+class Throttled(Exception):
+    """The caller's share of a resource stayed exhausted for MAX_WAIT seconds."""
+
+    def __init__(self, resource: str, user_id: str, retry_after: float):
+        super().__init__(f"{resource} budget exhausted for {user_id}, retry in {retry_after:.0f}s")
+        self.resource = resource
+        self.user_id = user_id
+        self.retry_after = retry_after
+
+
+class _Bucket:
+    __slots__ = ("rate", "capacity", "tokens", "ts")
+
+    def __init__(self, per_minute: float, capacity: float):
+        self.rate = per_minute / 60.0
+        self.capacity = capacity
+        self.tokens = capacity
+        self.ts = time.monotonic()
+
+    def refill(self, now: float):
+        self.tokens = min(self.capacity, self.tokens + (now - self.ts) * self.rate)
+        self.ts = now
+
+    def ready(self, cost: float) -> bool:
+        # Calls bigger than the bucket go through once it's full and leave it in debt
+        return self.tokens >= min(cost, self.capacity)
+
+    def eta(self, cost: float) -> float:
+        missing = min(cost, self.capacity) - self.tokens
+        return missing / self.rate if missing > 0 and self.rate else 0.0
+
+
+def _today() -> int:
+    return int(time.time() // 86400)
+
+
+def seconds_to_reset() -> float:
+    return 86400 - time.time() % 86400
+
+
+class _Daily:
+    """Units spent today against a daily limit; resets at UTC midnight."""
+    __slots__ = ("limit", "used", "day")
+
+    def __init__(self, limit: float):
+        self.limit = limit
+        self.used = 0.0
+        self.day = _today()
+
+    def remaining(self) -> float:
+        if self.day != _today():
+            self.used, self.day = 0.0, _today()
+        return self.limit - self.used
+
+
+class _Resource:
+    def __init__(self, name: str):
+        self.name = name
+        user_rate, user_burst, shared_rate, shared_burst = LIMITS[name]
+        self.user_limits = (user_rate, user_burst)
+        self.shared = _Bucket(shared_rate, shared_burst)
+        self.users: dict = {}     # user_id -> _Bucket
+        daily = DAILY_LIMITS.get(name)
+        self.daily_user_limit = daily[0] if daily else None
+        self.daily_shared = _Daily(daily[1]) if daily else None
+        self.daily_users: dict = {}   # user_id -> _Daily
+        self.waiting: list = []   # [seq, user_id, priority, cost, future]
+        self.timer: asyncio.TimerHandle | None = None
+
+    def bucket(self, user_id: str) -> _Bucket:
+        if user_id not in self.users:
+            weight = float(WEIGHTS.get(user_id, 1.0))
+            rate, burst = self.user_limits
+            self.users[user_id] = _Bucket(rate * weight, burst * weight)
+        return self.users[user_id]
+
+    def daily(self, user_id: str) -> _Daily | None:
+        if self.daily_shared is None:
+            return None
+        if user_id not in self.daily_users:
+            self.daily_users[user_id] = _Daily(self.daily_user_limit * float(WEIGHTS.get(user_id, 1.0)))
+        return self.daily_users[user_id]
+
+    def over_daily(self, user_id: str, cost: float) -> bool:
+        daily = self.daily(user_id)
+        return daily is not None and (daily.remaining() < cost or self.daily_shared.remaining() < cost)
+
+    def _order(self, entry) -> tuple:
+        seq, user_id, priority, _, _ = entry
+        b = self.users[user_id]
+        return priority, -(b.tokens / b.capacity if b.capacity else 0), seq
+
+    def pump(self):
+        """Grant as many waiting calls as the buckets allow, best-placed first."""
+        self.timer = None
+        now = time.monotonic()
+        self.shared.refill(now)
+        self.waiting = [w for w in self.waiting if not w[4].done()]
+        for b in self.users.values():
+            b.refill(now)
+        self.waiting.sort(key=self._order)
+
+        next_eta = None
+        granted = []
+        for entry in self.waiting:
+            _, user_id, _, cost, fut = entry
+            user = self.users[user_id]
+            if self.over_daily(user_id, cost):
+                # Spent while this call queued: it would wait until midnight
+                fut.set_exception(Throttled(self.name, user_id, seconds_to_reset()))
+                granted.append(entry)
+                continue
+            if not user.ready(cost):
+                eta = user.eta(cost)
+                next_eta = eta if next_eta is None else min(next_eta, eta)
+                continue
+            if not self.shared.ready(cost):
+                # Shared budget is out: nothing else may jump ahead of this caller
+                eta = self.shared.eta(cost)
+                next_eta = eta if next_eta is None else min(next_eta, eta)
+                break
+            user.tokens -= cost
+            self.shared.tokens -= cost
+            if self.daily_shared is not None:
+                self.daily(user_id).used += cost
+                self.daily_shared.used += cost
+            _usage(user_id, self.name)["granted"] += cost
+            fut.set_result(None)
+            granted.append(entry)
+        if granted:
+            self.waiting = [w for w in self.waiting if w not in granted]
+        if self.waiting and next_eta is not None:
+            self.timer = asyncio.get_running_loop().call_later(max(next_eta, 0.01), self.pump)
+
+    def kick(self):
+        if self.timer is not None:
+            self.timer.cancel()
+        self.pump()
+
+
+_resources: dict = {}
+_usage_by_user: dict = {}   # user_id -> {resource: {"granted", "waited_s", "calls", "throttled"}, "last_seen"}
+
+
+def _resource(name: str) -> _Resource:
+    if name not in _resources:
+        _resources[name] = _Resource(name)
+    return _resources[name]
+
+
+def _usage(user_id: str, resource: str) -> dict:
+    user = _usage_by_user.setdefault(user_id, {"resources": {}, "last_seen": time.time()})
+    user["last_seen"] = time.time()
+    return user["resources"].setdefault(resource, {"granted": 0, "calls": 0, "waited_s": 0.0, "throttled": 0})
+
+
+def bind(user_id: str, priority: int = INTERACTIVE):
+    """Attribute upstream work in the current task (and tasks it spawns) to user_id."""
+    _caller.set((user_id or "default", priority))
+
+
+def priority_for_page(page: int) -> int:
+    return INTERACTIVE if page <= 1 else SCROLL
+
+
+def caller() -> tuple:
+    return _caller.get()
+
+
+async def acquire(resource: str, cost: float = 1):
+    """Wait for the current caller's fair share of `cost` units of `resource`."""
+    user_id, priority = _caller.get()
+    res = _resource(resource)
+    res.bucket(user_id)
+    usage = _usage(user_id, resource)
+    usage["calls"] += 1
+    if res.over_daily(user_id, cost):
+        usage["throttled"] += 1
+        raise Throttled(resource, user_id, seconds_to_reset())
+
+    fut = asyncio.get_running_loop().create_future()
+    res.waiting.append([next(_seq), user_id, priority, cost, fut])
+    started = time.monotonic()
+    res.kick()
+    try:
+        await asyncio.wait_for(asyncio.shield(fut), MAX_WAIT)
+    except asyncio.TimeoutError:
+        fut.cancel()
+        usage["throttled"] += 1
+        raise Throttled(resource, user_id, res.users[user_id].eta(cost) or 1.0)
+    except Throttled:
+        usage["throttled"] += 1
+        raise
+    except BaseException:
+        fut.cancel()
+        raise
+    finally:
+        usage["waited_s"] += time.monotonic() - started
+
+
+def refund(resource: str, amount: float, user_id: str | None = None):
+    """Return over-estimated units (e.g. LLM tokens charged before the real count was known)."""
+    user_id = user_id or _caller.get()[0]
+    res = _resource(resource)
+    now = time.monotonic()
+    for bucket in (res.bucket(user_id), res.shared):
+        bucket.refill(now)
+        bucket.tokens = min(bucket.capacity, bucket.tokens + amount)
+    if res.daily_shared is not None:
+        for daily in (res.daily(user_id), res.daily_shared):
+            daily.used = max(0.0, daily.used - amount)
+    _usage(user_id, resource)["granted"] -= amount
+    if res.waiting:
+        res.kick()
+
+
+def prune_idle(now: float | None = None) -> int:
+    now = time.time() if now is None else now
+    idle = [u for u, v in _usage_by_user.items() if now - v["last_seen"] > IDLE_USER_TTL]
+    for user_id in idle:
+        del _usage_by_user[user_id]
+        for res in _resources.values():
+            if not any(w[1] == user_id for w in res.waiting):
+                res.users.pop(user_id, None)
+                # Today's spend is kept, or going idle for an hour would reset it
+                daily = res.daily_users.get(user_id)
+                if daily is not None and daily.day != _today():
+                    del res.daily_users[user_id]
+    return len(idle)
+
+
+def usage(user_id: str | None = None) -> dict:
+    """Per-user consumption and remaining share for every resource."""
+    now = time.monotonic()
+    users = [user_id] if user_id else list(_usage_by_user)
+    out = {}
+    for uid in users:
+        entry = _usage_by_user.get(uid, {"resources": {}, "last_seen": None})
+        resources = {}
+        for name, counters in entry["resources"].items():
+            bucket = _resources[name].users.get(uid)
+            if bucket is not None:
+                bucket.refill(now)
+            daily = _resources[name].daily_users.get(uid)
+            resources[name] = {
+                **{k: round(v, 3) if isinstance(v, float) else v for k, v in counters.items()},
+                "remaining": round(bucket.tokens, 1) if bucket else None,
+                "capacity": bucket.capacity if bucket else None,
+                "remaining_today": round(daily.remaining(), 1) if daily else None,
+            }
+        out[uid] = {"weight": float(WEIGHTS.get(uid, 1.0)), "last_seen": entry["last_seen"], "resources": resources}
+    return out
+
+
+def metrics() -> dict:
+    now = time.monotonic()
+    shared = {}
+    for name, res in _resources.items():
+        res.shared.refill(now)
+        shared[name] = {
+            "remaining": round(res.shared.tokens, 1),
+            "capacity": res.shared.capacity,
+            "waiting": {PRIORITIES[p]: sum(1 for w in res.waiting if w[2] == p) for p in PRIORITIES},
+            "users": len(res.users),
+            "remaining_today": round(res.daily_shared.remaining(), 1) if res.daily_shared else None,
+            "daily_limit": res.daily_shared.limit if res.daily_shared else None,
+        }
+    return {"resources": shared, "users": len(_usage_by_user)}
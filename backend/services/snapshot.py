@@ -0,0 +1,147 @@
+import asyncio
+import json
+import mmap
+import os
+import struct
+import time
+import zlib
+
+# Warm-start snapshots of the in-process caches.
+#
+# File layout (all integers little-endian):
+#   header   magic "GFSNAP\0\0" | version u32 | section count u32 | created_ts f64
+#   table    per section: name (32 bytes, NUL padded) | offset u64 | length u64 | crc32 u32 | entries u32
+#   payload  per section: zlib-compressed JSON object
+#
+# Startup maps the file and reads only the header and table, so boot time does
+# not grow with the snapshot. Sections are checksummed, decompressed and merged
+# into their caches in the background afterwards. Writes go to a temp file that
+# replaces the old snapshot atomically, serialised off the event loop.
+
+SNAPSHOT_PATH = os.getenv("SNAPSHOT_PATH", os.path.join(os.path.dirname(os.path.dirname(__file__)), "data", "snapshot.bin"))
+SNAPSHOT_INTERVAL = int(os.getenv("SNAPSHOT_INTERVAL", 300))  # seconds between writes
+
+MAGIC = b"GFSNAP\0\0"
+VERSION = 1
+HEADER = struct.Struct("<8sIId")
+ENTRY = struct.Struct("<32sQQII")
+
+# name -> (dump() -> dict, restore(dict) -> entries restored)
+_sources: dict = {}
+_status = {
+    "path": SNAPSHOT_PATH,
+    "snapshot_created_ts": None,
+    "restored": {},
+    "restore_errors": {},
+    "last_written_ts": None,
+    "last_write_seconds": None,
+}
+_mapped = None    # (file, mmap, {name: (offset, length, crc, entries)}) until restore finishes
+
+
+def register(name: str, dump, restore):
+    """Include a cache in snapshots. dump returns a JSON-able dict; restore merges one back."""
+    _sources[name] = (dump, restore)
+
+
+def load() -> int:
+    """Map the snapshot and read its section table. Returns the number of sections found."""
+    global _mapped
+    try:
+        f = open(SNAPSHOT_PATH, "rb")
+    except FileNotFoundError:
+        return 0
+    try:
+        mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version, count, created = HEADER.unpack_from(mm, 0)
+        if magic != MAGIC or version != VERSION:
+            raise ValueError(f"unsupported snapshot (magic={magic!r}, version={version})")
+        table = {}
+        for n in range(count):
+            raw_name, offset, length, crc, entries = ENTRY.unpack_from(mm, HEADER.size + n * ENTRY.size)
+            table[raw_name.rstrip(b"\0").decode()] = (offset, length, crc, entries)
+    except (ValueError, struct.error, OSError) as e:
+        print(f"[Snapshot] Ignoring {SNAPSHOT_PATH}: {e}")
+        f.close()
+        return 0
+    _mapped = (f, mm, table)
+    _status["snapshot_created_ts"] = created
+    return len(table)
+
+
+def _decode(mm, offset: int, length: int, crc: int) -> dict:
+    payload = mm[offset:offset + length]
+    if zlib.crc32(payload) != crc:
+        raise ValueError("checksum mismatch")
+    return json.loads(zlib.decompress(payload))
+
+
+async def restore_all():
+    """Decode each mapped section off the loop and merge it into its cache."""
+    global _mapped
+    if not _mapped:
+        return
+    f, mm, table = _mapped
+    try:
+        for name, (offset, length, crc, _) in table.items():
+            if name not in _sources:
+                continue
+            try:
+                data = await asyncio.to_thread(_decode, mm, offset, length, crc)
+                _status["restored"][name] = _sources[name][1](data)
+            except Exception as e:
+                _status["restore_errors"][name] = f"{type(e).__name__}: {str(e)[:120]}"
+                print(f"[Snapshot] Could not restore {name}: {_status['restore_errors'][name]}")
+        print(f"[Snapshot] Restored {_status['restored']} from {SNAPSHOT_PATH}")
+    finally:
+        mm.close()
+        f.close()
+        _mapped = None
+
+
+def _write(dumps: dict, path: str):
+    sections = []
+    for name, data in dumps.items():
+        payload = zlib.compress(json.dumps(data, separators=(",", ":")).encode(), 6)
+        sections.append((name, payload, len(data)))
+
+    offset = HEADER.size + ENTRY.size * len(sections)
+    tmp = f"{path}.{os.getpid()}.tmp"   # workers may write at the same time
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(tmp, "wb") as f:
+        f.write(HEADER.pack(MAGIC, VERSION, len(sections), time.time()))
+        for name, payload, entries in sections:
+            f.write(ENTRY.pack(name.encode()[:32], offset, len(payload), zlib.crc32(payload), entries))
+            offset += len(payload)
+        for _, payload, _ in sections:
+            f.write(payload)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp, path)
+
+
+async def write():
+    """Snapshot every registered cache. Dumps are taken on the loop; the rest runs in a thread."""
+    started = time.perf_counter()
+    dumps = {name: dump() for name, (dump, _) in _sources.items()}
+    await asyncio.to_thread(_write, dumps, SNAPSHOT_PATH)
+    _status["last_written_ts"] = time.time()
+    _status["last_write_seconds"] = round(time.perf_counter() - started, 3)
+
+
+async def write_loop():
+    while True:
+        await asyncio.sleep(SNAPSHOT_INTERVAL)
+        try:
+            await write()
+        except Exception as e:
+            print(f"[Snapshot] Write failed: {type(e).__name__}: {str(e)[:120]}")
+
+
+def status() -> dict:
+    created = _status["snapshot_created_ts"]
+    return {
+        **_status,
+        "age_s": round(time.time() - created, 1) if created else None,
+        "entries_restored": sum(_status["restored"].values()),
+    }
@@ -1,8 +1,9 @@
 import httpx
 import os
 from datetime import datetime, timedelta
+from services import executor, dates, scheduler, versions, recorder, admission
 
-USA_SPENDING_BASE = "https://api.usaspending.gov/api/v2/search/spending_by_award/"
+USA_SPENDING_BASE = os.getenv("USA_SPENDING_BASE", "https://api.usaspending.gov/api/v2/search/spending_by_award/")
 
 
 def _rdate(days_ago: int) -> str:
@@ -69,9 +70,9 @@ MOCK_AWARDS = [
 ]
 
 
-async def fetch_awards(keywords: str = "", limit: int = 15, page: int = 1) -> dict:
+def _payload(keywords: str, limit: int, page: int, days: int = 180) -> dict:
     end_date = datetime.now().strftime("%Y-%m-%d")
-    start_date = (datetime.now() - timedelta(days=180)).strftime("%Y-%m-%d")
+    start_date = (datetime.now() - timedelta(days=days)).strftime("%Y-%m-%d")
 
     payload = {
         "filters": {
@@ -93,7 +94,7 @@ async def fetch_awards(keywords: str = "", limit: int = 15, page: int = 1) -> di
             "NAICS Description",
         ],
         "page": page,
-        "limit": min(limit, 25),
+        "limit": limit,
         "sort": "Award Amount",
         "order": "desc",
         "subawards": False,
@@ -103,12 +104,19 @@ async def fetch_awards(keywords: str = "", limit: int = 15, page: int = 1) -> di
     if keywords:
         kw_list = [k.strip() for k in keywords.split(",") if k.strip()]
         payload["filters"]["keywords"] = kw_list
+    return payload
+
+
+@recorder.capture("usaspending")
+async def fetch_awards(keywords: str = "", limit: int = 15, page: int = 1) -> dict:
+    payload = _payload(keywords, min(limit, 25), page)
 
     try:
         async with httpx.AsyncClient(timeout=25) as client:
-            resp = await client.post(USA_SPENDING_BASE, json=payload)
+            await scheduler.acquire("usaspending")
+            resp = await admission.timed("usaspending", client.post(USA_SPENDING_BASE, json=payload))
             resp.raise_for_status()
-            data = resp.json()
+            data = await executor.decode_json(resp)
             results = data.get("results", [])
             total_pages = data.get("page_metadata", {}).get("last_page", 1)
             has_more = page < total_pages
@@ -117,15 +125,41 @@ async def fetch_awards(keywords: str = "", limit: int = 15, page: int = 1) -> di
                 mock = _mock_awards(keywords, limit)
                 return {"items": mock, "total_on_page": len(mock), "has_more": False}
 
-            items = [_parse(r) for r in results]
+            items = await executor.run_threaded(_parse_all, results, size=len(results))
             return {"items": items, "total_on_page": len(items), "has_more": has_more}
 
+    except scheduler.Throttled as e:
+        # Out of this user's share: no mock data, and no more pages to scroll into
+        print(f"[USASpending] {e}")
+        return {"items": [], "total_on_page": 0, "has_more": False, "throttled": True,
+                "retry_after": round(e.retry_after)}
     except Exception as e:
         print(f"[USASpending] {e} — using mock data")
         mock = _mock_awards(keywords, limit)
         return {"items": mock, "total_on_page": len(mock), "has_more": False}
 
 
+async def fetch_award_page(client: httpx.AsyncClient, keywords: str, page: int,
+                           limit: int = 100, days: int = 180) -> tuple[list[dict], bool]:
+    """One raw page of awards for bulk consumers (analytics, export).
+
+    Unlike fetch_awards this never substitutes mock data — errors propagate so
+    the caller can retry or stop. Returns (parsed items, has_more).
+    """
+    await scheduler.acquire("usaspending")
+    resp = await client.post(USA_SPENDING_BASE, json=_payload(keywords, min(limit, 100), page, days))
+    resp.raise_for_status()
+    data = await executor.decode_json(resp)
+    results = data.get("results", [])
+    has_more = page < data.get("page_metadata", {}).get("last_page", 1)
+    items = await executor.run_threaded(_parse_all, results, size=len(results))
+    return items, has_more and bool(results)
+
+
+def _parse_all(rows: list[dict]) -> list[dict]:
+    return [_parse(r) for r in rows]
+
+
 def _parse(r: dict) -> dict:
     award_id = r.get("generated_internal_id", "")
     agency = r.get("Awarding Agency Name", "")
@@ -138,7 +172,7 @@ def _parse(r: dict) -> dict:
     if not desc and naics_desc:
         desc = f"Contract in {naics_desc}."
 
-    return {
+    return versions.stamp(dates.stamp({
         "id": f"award-{r.get('Award ID', award_id)}",
         "source": "USASpending.gov",
         "source_type": "award",
@@ -154,7 +188,7 @@ def _parse(r: dict) -> dict:
         "award_amount": r.get("Award Amount", 0),
         "recipient": r.get("Recipient Name", ""),
         "is_mock": False,
-    }
+    }))
 
 
 def _mock_awards(keywords: str, limit: int, page: int = 1) -> list[dict]:
@@ -0,0 +1,47 @@
+import pytest
+
+from services import analytics, dates
+
+
+@pytest.fixture(autouse=True)
+def store(tmp_path, monkeypatch):
+    monkeypatch.setattr(analytics, "ANALYTICS_DIR", str(tmp_path))
+    monkeypatch.setattr(analytics, "_state", {"generation": None, "columns": {}, "dicts": {}, "codes": {},
+                                              "distinct": None})
+
+
+def _award(award_id: str, agency: str, amount: float, day: str = "2025-03-10") -> dict:
+    return {"id": award_id, "agency": agency, "recipient": f"{agency} prime", "naics": "541512",
+            "award_amount": amount, "posted_ts": dates.to_epoch(day)}
+
+
+def _ingest():
+    analytics._append([_award("A1", "DOD", 100), _award("A2", "NASA", 50)], "cyber")
+    # A1 matches both keyword sets and is stored under each
+    analytics._append([_award("A1", "DOD", 100), _award("A3", "DOD", 25, "2025-05-02")], "Cloud ")
+
+
+def test_keyword_sets_are_queried_separately():
+    _ingest()
+    cyber = analytics.top("agency", keywords="cyber")
+    assert (cyber["awards"], cyber["total_amount"]) == (2, 150)
+    cloud = analytics.top("agency", keywords="cloud")
+    assert cloud["top"] == [{"value": "DOD", "amount": 125.0, "awards": 2}]
+
+
+def test_awards_in_several_keyword_sets_count_once():
+    _ingest()
+    everything = analytics.top("agency")
+    assert (everything["awards"], everything["total_amount"]) == (3, 175)
+    assert everything["top"][0] == {"value": "DOD", "amount": 125.0, "awards": 2}
+    series = analytics.timeseries("month")["series"]
+    assert [(p["period"], p["amount"], p["awards"]) for p in series] == [("2025-03", 150, 2), ("2025-05", 25, 1)]
+    summary = analytics.summary()
+    assert (summary["rows"], summary["awards"], summary["total_amount"]) == (4, 3, 175)
+
+
+def test_reingesting_a_keyword_set_adds_nothing():
+    _ingest()
+    assert analytics._append([_award("A1", "DOD", 100)], "cyber") == 0
+    assert analytics.top("agency", agency="NASA")["awards"] == 1
+    assert analytics.top("agency", keywords="unknown")["awards"] == 0
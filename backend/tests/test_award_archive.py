@@ -0,0 +1,75 @@
+import asyncio
+import csv
+import io
+import zipfile
+from collections import Counter, defaultdict
+
+import pytest
+
+from bench.make_award_archive import write_archive
+from services import analytics, award_archive
+
+
+@pytest.fixture(autouse=True)
+def store(tmp_path, monkeypatch):
+    monkeypatch.setattr(analytics, "ANALYTICS_DIR", str(tmp_path / "analytics"))
+    monkeypatch.setattr(analytics, "_state", {"generation": None, "columns": {}, "dicts": {}, "codes": {},
+                                              "distinct": None})
+
+
+@pytest.fixture
+def archive(tmp_path) -> str:
+    path = str(tmp_path / "awards.zip")
+    write_archive(path, rows=250, rows_per_file=100, seed=3)
+    return path
+
+
+def _expected(path: str) -> list[dict]:
+    """The archive's rows read back with plain csv, independently of award_archive."""
+    rows = []
+    with zipfile.ZipFile(path) as z:
+        for name in z.namelist():
+            rows.extend(csv.DictReader(io.TextIOWrapper(z.open(name), encoding="utf-8")))
+    return rows
+
+
+def test_stream_archive_into_store(archive):
+    counts = {}
+    batches = award_archive.read_batches(archive, counts, batch_rows=40)
+    assert analytics.append_stream(batches, "Bulk") == 250
+    assert counts == {"files": 3, "rows": 250, "kept": 250, "skipped": 0}
+
+    rows = _expected(archive)
+    by_agency = defaultdict(float)
+    for row in rows:
+        # Awards are filed under the sub-agency, as in the spending_by_award feed
+        by_agency[row["awarding_sub_agency_name"]] += float(row["total_obligated_amount"])
+    top = analytics.top("agency", keywords="bulk", k=10)
+    assert top["awards"] == 250
+    assert top["total_amount"] == pytest.approx(sum(by_agency.values()))
+    assert {t["value"]: t["amount"] for t in top["top"]} == pytest.approx(dict(by_agency))
+    naics = analytics.top("naics", keywords="bulk", k=10)
+    assert {t["value"]: t["awards"] for t in naics["top"]} == Counter(r["naics_code"] for r in rows)
+    years = analytics.timeseries("year", keywords="bulk")["series"]
+    assert sum(p["awards"] for p in years) == 250
+
+
+def test_reingest_replaces_and_filters_apply(archive):
+    asyncio.run(analytics.ingest_archive(archive, "bulk", batch_rows=64))
+    result = asyncio.run(analytics.ingest_archive(archive, "bulk", naics="5417"))
+    expected = sum(1 for r in _expected(archive) if r["naics_code"].startswith("5417"))
+    assert (result["rows"], result["kept"], result["added"]) == (250, expected, expected)
+    # The second ingest replaced the keyword set rather than adding to it
+    assert analytics.summary()["rows"] == expected
+
+
+def test_short_rows_are_skipped(tmp_path):
+    path = tmp_path / "awards.csv"
+    path.write_text("award_id_piid,total_obligated_amount,awarding_agency_name\n"
+                    "P1,10.5,Department of Energy\n"
+                    "P2,7\n"
+                    "P3,,Department of Energy\n")
+    counts = {}
+    items = [i for batch in award_archive.read_batches(str(path), counts) for i in batch]
+    assert counts == {"files": 1, "rows": 3, "kept": 2, "skipped": 1}
+    assert [(i["id"], i["award_amount"]) for i in items] == [("award-P1", 10.5), ("award-P3", 0.0)]
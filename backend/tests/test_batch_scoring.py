@@ -0,0 +1,74 @@
+import asyncio
+import os
+from collections import OrderedDict
+
+import httpx
+import pytest
+from openai import AsyncOpenAI
+
+from bench import fake_upstreams
+from services import ai_ranker, batch_scoring
+
+PROFILES = [{"keywords": "cyber, radar", "focus": "sensors"}, {"keywords": "logistics", "focus": ""}]
+ITEMS = [{"id": f"opp-{n}", "content_hash": f"h{n}", "title": f"Opportunity {n}", "agency": "DEPT OF NAVY",
+          "type": "Solicitation", "description": "Radar sustainment"} for n in range(25)]
+
+
+@pytest.fixture(autouse=True)
+def batch_env(tmp_path, monkeypatch):
+    monkeypatch.setattr(batch_scoring, "BATCH_DIR", str(tmp_path))
+    monkeypatch.setattr(batch_scoring.corpus, "all_items", lambda: iter(ITEMS))
+    monkeypatch.setattr(ai_ranker, "_rank_cache", OrderedDict())
+    # Batches complete on the first poll, instantly
+    monkeypatch.setitem(fake_upstreams._config, "openai_batch",
+                        {"latency": {"dist": "fixed", "median_ms": 0}, "error_rate": 0.0, "quota_rate": 0.0,
+                         "completion_s": 0})
+
+
+def _fake_client():
+    # The stand-in app served in-process; OPENAI_BASE_URL does the same against a running one
+    transport = httpx.ASGITransport(app=fake_upstreams.app)
+    return AsyncOpenAI(api_key="sk-test", base_url="http://fake/openai/v1", max_retries=0,
+                       http_client=httpx.AsyncClient(transport=transport))
+
+
+def test_job_round_trip_scores_every_pair(monkeypatch):
+    monkeypatch.setattr(batch_scoring.llm_gateway, "client", lambda api_key=None: _fake_client())
+
+    async def run():
+        state = await batch_scoring.create_job(PROFILES)
+        assert (state["status"], state["pairs"], state["requests"]) == ("submitted", 50, 4)
+        return await batch_scoring.poll(state["job_id"])
+
+    state = asyncio.run(run())
+    assert (state["status"], state["stored"], state["errors"]) == ("ingested", 50, 0)
+    for profile in PROFILES:
+        fp = ai_ranker.profile_fingerprint(profile)
+        assert all(ai_ranker.is_scored(fp, item) for item in ITEMS)
+    assert [j["job_id"] for j in batch_scoring.jobs()] == [state["job_id"]]
+    # Nothing is left to score, so the next job is empty
+    assert asyncio.run(batch_scoring.create_job(PROFILES))["status"] == "empty"
+
+
+def test_failed_ingest_lines_are_counted(monkeypatch):
+    monkeypatch.setattr(batch_scoring.llm_gateway, "client", lambda api_key=None: _fake_client())
+    monkeypatch.setitem(fake_upstreams._config["openai_batch"], "error_rate", 1.0)
+
+    async def run():
+        state = await batch_scoring.create_job(PROFILES[:1])
+        return await batch_scoring.poll(state["job_id"])
+
+    state = asyncio.run(run())
+    assert (state["status"], state["stored"], state["errors"]) == ("ingested", 0, 2)
+    assert not ai_ranker.is_scored(ai_ranker.profile_fingerprint(PROFILES[0]), ITEMS[0])
+
+
+def test_failed_submit_leaves_no_job_dir(monkeypatch):
+    def no_key(api_key=None):
+        raise ValueError("no usable OpenAI API key")
+
+    monkeypatch.setattr(batch_scoring.llm_gateway, "client", no_key)
+    with pytest.raises(ValueError):
+        asyncio.run(batch_scoring.create_job(PROFILES))
+    assert os.listdir(batch_scoring.BATCH_DIR) == []
+    assert batch_scoring.jobs() == []
@@ -0,0 +1,135 @@
+import asyncio
+import importlib
+import random
+
+import pytest
+
+from services import corpus, corpus_store, versions
+
+NOW = 1_750_000_000
+DAY = 86400
+
+
+@pytest.fixture
+def fresh(monkeypatch, tmp_path):
+    # Module-level indexes: start every test from empty ones
+    for module in (versions, corpus_store, corpus):
+        importlib.reload(module)
+    monkeypatch.setattr(corpus_store, "CORPUS_DIR", str(tmp_path))
+    yield
+    for module in (versions, corpus_store, corpus):
+        importlib.reload(module)
+
+
+def _items(n: int, seed: int = 7) -> list[dict]:
+    rnd = random.Random(seed)
+    items = []
+    for i in range(n):
+        amount = rnd.choice([None, round(rnd.lognormvariate(11, 2), 2), str(rnd.randrange(10**6)), "n/a"])
+        items.append({
+            "id": f"item-{i}",
+            "title": f"Item {i} " + rnd.choice(["radar", "cyber", "satellite", "logistics"]),
+            "source": rnd.choice(["SAM.gov", "USASpending", "Grants.gov"]),
+            "source_type": rnd.choice(["contract", "award", "grant"]),
+            "agency": rnd.choice(["DOD", "DHS", "NASA", "DOE", ""]),
+            "naics": rnd.choice(["541512", "541715", "541330", None]),
+            "set_aside": rnd.choice(["SBA", "8A", "", None]),
+            "contract_type": rnd.choice(["Solicitation", "Award Notice", None]),
+            "award_amount": amount,
+            "deadline_ts": rnd.choice([None, NOW + rnd.randrange(-60, 120) * DAY]),
+            "posted_ts": NOW - rnd.randrange(400) * DAY,
+        })
+    return items
+
+
+def _snapshot(path) -> corpus_store.Snapshot:
+    docs = corpus.live_docs()
+    arrays = corpus_store.build(docs, corpus._facet_values, corpus.FACETS, [versions.first_seen(d["id"]) for d in docs])
+    corpus_store.write(arrays, len(docs), 1, str(path))
+    return corpus_store.Snapshot(str(path))
+
+
+def _corpus_with_churn() -> list[dict]:
+    items = _items(600)
+    corpus.upsert(items)
+    # Removals leave holes in the doc ids; amendments move docs between bitmaps
+    for item in items[::9]:
+        corpus.remove(item["id"])
+    corpus.upsert([dict(i, agency="NASA", award_amount=5e6) for i in items[1::13]])
+    return items
+
+
+QUERIES = [
+    ({}, {}),
+    ({"agency": ["DOD", "NASA"]}, {}),
+    ({"agency": ["DHS"], "naics": ["541512"]}, {}),
+    ({"source_type": ["contract", "grant"]}, {"deadline_from": NOW, "deadline_to": NOW + 30 * DAY}),
+    ({}, {"min_amount": 1e5}),
+    ({"amount": ["$1M-$10M", "none"]}, {"max_amount": 2e6}),
+    ({"set_aside": ["8A"]}, {"min_amount": 0, "max_amount": 5e5, "deadline_to": NOW}),
+    ({"agency": ["no such agency"]}, {}),
+]
+
+
+@pytest.mark.parametrize("filters,ranges", QUERIES)
+@pytest.mark.parametrize("order", ["newest", "deadline"])
+def test_snapshot_query_matches_in_memory_corpus(fresh, tmp_path, filters, ranges, order):
+    _corpus_with_churn()
+    snap = _snapshot(tmp_path / "corpus.bin")
+    for offset, limit in ((0, 15), (10, 25), (500, 15)):
+        expected, expected_total = corpus.query(filters, offset=offset, limit=limit, order=order, **ranges)
+        got, total = snap.query(filters, offset, limit, order, **ranges)
+        assert total == expected_total
+        assert [i["id"] for i in got] == [i["id"] for i in expected]
+        for row, item in zip(got, expected):
+            for field in ("title", "agency", "naics", "content_hash"):
+                assert row[field] == (item.get(field) or "")   # string columns store None as ""
+            for field in ("deadline_ts", "posted_ts"):
+                assert row[field] == item.get(field)
+
+
+@pytest.mark.parametrize("filters,ranges", QUERIES)
+def test_snapshot_facet_counts_match_in_memory_corpus(fresh, tmp_path, filters, ranges):
+    _corpus_with_churn()
+    snap = _snapshot(tmp_path / "corpus.bin")
+    expected = corpus.facet_counts(filters, top=100, **ranges)
+    got = snap.facet_counts(filters, corpus.FACETS, top=100, **ranges)
+    for facet in corpus.FACETS:
+        # Ties may come out in a different order
+        assert sorted((c["value"], c["count"]) for c in got[facet]) == \
+            sorted((c["value"], c["count"]) for c in expected[facet])
+
+
+def test_snapshot_get_and_first_seen(fresh, tmp_path):
+    items = _corpus_with_churn()
+    snap = _snapshot(tmp_path / "corpus.bin")
+    assert snap.get(items[0]["id"]) is None                  # removed
+    row = snap.get(items[1]["id"])
+    assert row["agency"] == "NASA" and row["award_amount"] == 5e6
+    assert snap.first_seen(snap.find(items[1]["id"])) == versions.first_seen(items[1]["id"])
+    assert snap.get("item-unknown") is None
+
+
+def test_shared_reads_use_published_history(fresh, monkeypatch):
+    items = _corpus_with_churn()
+    asyncio.run(corpus_store.publish(corpus.live_docs(), corpus.changed_ts(), corpus._facet_values, corpus.FACETS))
+    amended_id, plain_id = items[1]["id"], items[2]["id"]
+    local = {
+        "history": (corpus.history(amended_id), corpus.history(plain_id)),
+        "changes": corpus.changes_since(0, ("amended",), 1000),
+        "stats": corpus.version_stats(),
+    }
+
+    monkeypatch.setattr(corpus, "SHARED", True)
+    # A reader worker keeps no version state of its own
+    importlib.reload(versions)
+    shared = {
+        "history": (corpus.history(amended_id), corpus.history(plain_id)),
+        "changes": corpus.changes_since(0, ("amended",), 1000),
+        "stats": corpus.version_stats(),
+    }
+    assert shared == local
+    assert len(shared["history"][0]) == 2 and shared["history"][0][1]["changes"]["agency"][1] == "NASA"
+    annotated = [{"id": amended_id}, {"id": plain_id}]
+    corpus.annotate(annotated)
+    assert annotated[0]["version"] == 2 and "version" not in annotated[1]
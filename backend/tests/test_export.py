@@ -0,0 +1,127 @@
+import asyncio
+import json
+
+import pytest
+
+from services import export
+
+PAGES = 3
+PER_PAGE = 4
+
+
+def _pages(source: str, fail_on: int | None = None):
+    """Fake fetcher factory: PAGES pages of PER_PAGE items for a source."""
+    calls = []
+
+    async def fetch(page: int):
+        calls.append(page)
+        if page == fail_on:
+            raise RuntimeError("upstream 502")
+        items = [{"id": f"{source}-{page}-{n}", "title": f"{source} item"} for n in range(PER_PAGE)]
+        return (items if page <= PAGES else []), page < PAGES
+
+    fetch.calls = calls
+    return fetch
+
+
+def _install(monkeypatch, fail_on: dict | None = None) -> dict:
+    fetchers = {s: _pages(s, (fail_on or {}).get(s)) for s in export.SOURCES}
+    monkeypatch.setattr(export, "_fetcher", lambda source, client, keywords: fetchers[source])
+    return fetchers
+
+
+def _export(sources: list[str], cursor: str | None = None) -> tuple[list[dict], dict]:
+    async def run():
+        return [chunk async for chunk in export.stream("u", "", sources, "ndjson", cursor)]
+
+    lines = [json.loads(line) for chunk in asyncio.run(run()) for line in chunk.splitlines()]
+    return lines[:-1], lines[-1]["_export"]
+
+
+def test_cursor_round_trip():
+    positions = {"sam": [3, 17], "usaspending": None, "grants": [1, 0]}
+    assert export.decode_cursor(export.encode_cursor(positions)) == positions
+
+
+@pytest.mark.parametrize("cursor", [
+    "not base64 json!",
+    export.encode_cursor([1, 2]),                        # not an object
+    export.encode_cursor({"fpds": [1, 0]}),              # unknown source
+    export.encode_cursor({"sam": [1, -1]}),              # negative offset
+    export.encode_cursor({"sam": [1, 2, 3]}),            # wrong shape
+    export.encode_cursor({"sam": "1,2"}),
+])
+def test_invalid_cursors_are_rejected(cursor):
+    with pytest.raises(ValueError, match="invalid export cursor"):
+        export.decode_cursor(cursor)
+
+
+def test_full_export_is_complete(monkeypatch):
+    _install(monkeypatch)
+    rows, summary = _export(["usaspending", "grants"])
+    assert len(rows) == 2 * PAGES * PER_PAGE
+    assert summary["complete"] and summary["cursor"] is None
+
+
+@pytest.mark.parametrize("stop_after", [0, PER_PAGE - 1, PER_PAGE, 2 * PER_PAGE + 1, 2 * PAGES * PER_PAGE - 2])
+def test_resuming_from_any_row_writes_exactly_the_rest(monkeypatch, stop_after):
+    _install(monkeypatch)
+    rows, _ = _export(["usaspending", "grants"])
+    written = rows[:stop_after + 1]
+    resumed, summary = _export(["usaspending", "grants"], written[-1]["export_cursor"])
+    ids = [r["id"] for r in written + resumed]
+    assert len(ids) == len(set(ids))
+    assert set(ids) == {r["id"] for r in rows}
+    assert summary["complete"]
+
+
+def test_resume_refetches_only_the_cursor_page_onwards(monkeypatch):
+    fetchers = _install(monkeypatch)
+    rows, _ = _export(["grants"])
+    cursor = rows[PER_PAGE + 1]["export_cursor"]          # second row of page 2
+    assert export.decode_cursor(cursor) == {"grants": [2, 2]}
+    fetchers["grants"].calls.clear()
+    resumed, _ = _export(["grants"], cursor)
+    assert fetchers["grants"].calls[0] == 2
+    assert [r["id"] for r in resumed] == [r["id"] for r in rows[PER_PAGE + 2:]]
+
+
+def test_failed_source_leaves_a_cursor_to_resume_from(monkeypatch):
+    _install(monkeypatch, fail_on={"grants": 2})
+    rows, summary = _export(["grants", "usaspending"])
+    assert not summary["complete"]
+    assert "grants" in summary["errors"]
+    assert export.decode_cursor(summary["cursor"]) == {"grants": [2, 0], "usaspending": None}
+
+    _install(monkeypatch)
+    resumed, summary = _export(["grants", "usaspending"], summary["cursor"])
+    assert summary["complete"]
+    assert {r["id"] for r in rows + resumed} == {f"{s}-{p}-{n}" for s in ("grants", "usaspending")
+                                                for p in range(1, PAGES + 1) for n in range(PER_PAGE)}
+    assert all(r["id"].startswith("grants-") for r in resumed)
+
+
+def test_repeated_ids_are_dropped(monkeypatch):
+    async def drifting(page: int):
+        # Pagination drift: each page repeats the last item of the one before
+        items = [{"id": f"g-{i}"} for i in range((page - 1) * 3 - (page > 1), page * 3)]
+        return items, page < 2
+
+    monkeypatch.setattr(export, "_fetcher", lambda source, client, keywords: drifting)
+    rows, summary = _export(["grants"])
+    assert [r["id"] for r in rows] == [f"g-{i}" for i in range(6)]
+    assert summary["duplicates_dropped"] == 1
+
+
+@pytest.mark.parametrize("user_id, expected", [
+    ("alice_01", "alice_01"),
+    ('x"; filename="evil.exe', "xfilenameevilexe"),
+    ("a\r\nSet-Cookie: s=1", "aSet-Cookies1"),
+    ("../../etc", "etc"),
+    ("", "user"),
+])
+def test_export_filename_is_sanitised(user_id, expected):
+    from routers.export import _filename
+
+    name = _filename(user_id, "csv")
+    assert name.startswith(f"feed-export-{expected}-") and name.endswith(".csv")
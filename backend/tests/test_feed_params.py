@@ -0,0 +1,24 @@
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from routers import feed
+
+app = FastAPI()
+app.include_router(feed.router, prefix="/api/feed")
+client = TestClient(app)
+
+
+@pytest.mark.parametrize("param", ["deadline_from", "deadline_to"])
+def test_unparseable_deadline_is_rejected(param):
+    resp = client.get("/api/feed/", params={param: "2025-13-45"})
+    assert resp.status_code == 400
+    assert param in resp.json()["detail"]
+
+
+def test_date_ranges_parse():
+    ranges = feed._ranges(None, 5e6, "2025-06-01", "06/30/2025", None)
+    assert ranges == {"min_amount": None, "max_amount": 5e6,
+                      "deadline_from": 1748736000, "deadline_to": 1751327999}
+    # A blank parameter is no filter
+    assert feed._ranges(None, None, "", None, None)["deadline_from"] is None
@@ -0,0 +1,50 @@
+from collections import OrderedDict
+
+import pytest
+
+from services import feed_sync
+
+
+@pytest.fixture(autouse=True)
+def empty_views(monkeypatch):
+    monkeypatch.setattr(feed_sync, "_latest", OrderedDict())
+    monkeypatch.setattr(feed_sync, "_views", OrderedDict())
+
+
+def _body(*items) -> dict:
+    return {"items": [{"id": i, "content_hash": h, "relevance_score": s} for i, h, s in items],
+            "total": len(items), "has_more": False, "page": 1}
+
+
+def test_delta_against_the_previous_token():
+    old = feed_sync.remember("v", _body(("a", "h1", 90), ("b", "h2", 80)))
+    body = _body(("a", "h1", 70), ("c", "h3", 60))
+    etag = feed_sync.remember("v", body)
+
+    out = feed_sync.delta(old, etag, body)
+    assert out["sync_token"] == etag
+    assert [i["id"] for i in out["added"]] == ["c"]
+    assert [i["id"] for i in out["reranked"]] == ["a"]
+    assert out["removed"] == ["b"]
+
+
+def test_current_view_evicted_from_views_is_recomputed(monkeypatch):
+    monkeypatch.setattr(feed_sync, "MAX_VIEWS", 1)
+    old = feed_sync.remember("v", _body(("a", "h1", 90)))
+    body = _body(("a", "h2", 90))
+    etag = feed_sync.remember("v", body)
+    # Another view pushes both summaries out while the page stays in _latest
+    feed_sync._views.clear()
+    feed_sync._views[old] = feed_sync._summarise(_body(("a", "h1", 90)))[1]
+
+    entry = feed_sync.cached("v")
+    out = feed_sync.delta(old, entry["etag"], entry["body"])
+    assert [i["id"] for i in out["updated"]] == ["a"]
+    assert etag in feed_sync._views and len(feed_sync._views) == 1
+
+
+def test_unknown_token_resets():
+    body = _body(("a", "h1", 90))
+    etag = feed_sync.remember("v", body)
+    out = feed_sync.delta("stale", etag, body)
+    assert out["reset"] and out["sync_token"] == etag and out["items"] == body["items"]
@@ -0,0 +1,95 @@
+import json
+import random
+
+import pytest
+
+from services.json_stream import ArrayElements
+
+RANKINGS = [
+    {"index": 0, "score": 91, "summary": "Counter-UAS {prototype} [OTA], \"phase II\""},
+    {"index": 1, "score": 40, "summary": "Escapes: \\ \\\" \\n — unicode ✓ and a } brace"},
+    {"index": 2, "score": 77, "summary": "", "tags": [["nested", "arrays"], {"deep": {"x": [1, 2]}}]},
+    {"index": 3, "score": 5.5, "summary": "commas, inside, strings", "flag": None, "ok": True},
+]
+DOCUMENT = json.dumps({"model": "x", "other": [9, 8], "rankings": RANKINGS, "after": [{"not": "this"}]}, indent=1)
+
+
+def _feed(parser: ArrayElements, chunks) -> list:
+    out = []
+    for chunk in chunks:
+        out.extend(parser.feed(chunk))
+    return out
+
+
+def _chunks(text: str, sizes) -> list[str]:
+    out, pos = [], 0
+    for size in sizes:
+        out.append(text[pos:pos + size])
+        pos += size
+    out.append(text[pos:])
+    return out
+
+
+@pytest.mark.parametrize("size", [1, 2, 3, 7, 16, 64, len(DOCUMENT)])
+def test_fixed_chunk_sizes(size):
+    parser = ArrayElements("rankings")
+    got = _feed(parser, [DOCUMENT[i:i + size] for i in range(0, len(DOCUMENT), size)])
+    assert got == RANKINGS
+    assert parser.done and parser.parsed == len(RANKINGS) and parser.errors == 0
+
+
+def test_random_chunking():
+    rnd = random.Random(42)
+    for _ in range(300):
+        sizes = [rnd.randint(0, 12) for _ in range(len(DOCUMENT))]
+        assert _feed(ArrayElements("rankings"), _chunks(DOCUMENT, sizes)) == RANKINGS
+
+
+def test_every_truncation_point_yields_the_closed_elements():
+    # Offset just past each element's closing brace, found by parsing one character at a time
+    parser = ArrayElements("rankings")
+    closed_at = []
+    for i, c in enumerate(DOCUMENT):
+        closed_at.extend([i + 1] * len(parser.feed(c)))
+    assert len(closed_at) == len(RANKINGS)
+
+    for cut in range(len(DOCUMENT)):
+        parser = ArrayElements("rankings")
+        got = _feed(parser, _chunks(DOCUMENT[:cut], [5] * cut))
+        expected = sum(1 for end in closed_at if end <= cut)
+        assert got == RANKINGS[:expected], cut
+        assert parser.errors == 0
+
+
+def test_key_split_across_chunks_and_preamble():
+    text = 'Sure! Here are the rankings:\n```json\n{"rank' + 'ings"  :\n [' + json.dumps(RANKINGS)[1:] + "}\n```"
+    for split in range(len(text)):
+        assert _feed(ArrayElements("rankings"), [text[:split], text[split:]]) == RANKINGS
+
+
+def test_without_a_key_takes_the_first_array():
+    parser = ArrayElements()
+    assert _feed(parser, ['[1, 2.5, -3e2, tr', 'ue, null, "a,b", {"k": [1]}, [2]]']) == \
+        [1, 2.5, -300.0, True, None, "a,b", {"k": [1]}, [2]]
+    assert parser.done
+
+
+def test_malformed_element_is_skipped():
+    parser = ArrayElements("rankings")
+    got = _feed(parser, ['{"rankings": [{"index": 0}, {"index": }, {"index": 2}, tru, 5]}'])
+    assert got == [{"index": 0}, {"index": 2}, 5]
+    assert parser.errors == 2 and parser.parsed == 3
+
+
+def test_nothing_after_the_array_closes():
+    parser = ArrayElements("rankings")
+    assert parser.feed('{"rankings": [{"a": 1}], "more": [') == [{"a": 1}]
+    assert parser.feed('{"b": 2}]}') == []
+
+
+def test_empty_and_missing_arrays():
+    parser = ArrayElements("rankings")
+    assert parser.feed('{"rankings": []}') == [] and parser.done
+    parser = ArrayElements("rankings")
+    assert _feed(parser, ['{"other": [1, 2]', ', "text": "no rankings here"}']) == []
+    assert not parser.done
@@ -0,0 +1,65 @@
+from collections import OrderedDict
+
+import pytest
+
+from services import ai_ranker
+
+
+@pytest.fixture(autouse=True)
+def empty_cache(monkeypatch):
+    monkeypatch.setattr(ai_ranker, "_rank_cache", OrderedDict())
+
+
+def _items(n: int, start: int = 0) -> list[dict]:
+    return [{"id": f"i{k}", "content_hash": f"h{k}"} for k in range(start, start + n)]
+
+
+def _score(items: list[dict], fingerprint: str = "fp", ttl: float | None = None):
+    ai_ranker._store_rankings(fingerprint, items, [{"idx": i, "score": 50, "summary": ""} for i in range(len(items))], ttl)
+
+
+def test_cache_is_capped_least_recently_used_first(monkeypatch):
+    monkeypatch.setattr(ai_ranker, "RANK_CACHE_MAX", 10)
+    first = _items(8)
+    _score(first)
+    # A hit makes i0 recently used again
+    assert len(ai_ranker._cached_rankings("fp", first[:1])) == 1
+    _score(_items(5, start=8))
+    assert len(ai_ranker._rank_cache) == 10
+    assert ai_ranker.is_scored("fp", first[0])
+    assert not ai_ranker.is_scored("fp", first[1]) and not ai_ranker.is_scored("fp", first[3])
+    assert ai_ranker.is_scored("fp", first[4])
+
+
+def test_prune_expired_drops_only_stale_entries(monkeypatch):
+    _score(_items(3))
+    _score(_items(2, start=3), ttl=10 * ai_ranker.RANK_CACHE_TTL)    # batch-scored, longer ttl
+    later = ai_ranker._rank_cache[next(iter(ai_ranker._rank_cache))]["ts"] + ai_ranker.RANK_CACHE_TTL + 1
+    assert ai_ranker.prune_expired(now=later) == 3
+    assert len(ai_ranker._rank_cache) == 2
+
+
+def test_restore_skips_stale_entries_and_respects_the_cap(monkeypatch):
+    monkeypatch.setattr(ai_ranker, "RANK_CACHE_MAX", 4)
+    _score(_items(2, start=100))                       # scored since boot
+    dumped = {f"fp:i{k}:h{k}": {"score": 1, "summary": "", "ts": 1_000 + k} for k in range(3)}
+    dumped.update({f"fp:i{k}:h{k}": {"score": 1, "summary": "", "ts": 2e9 + k} for k in range(3, 6)})
+    monkeypatch.setattr(ai_ranker.time, "time", lambda: 2e9 + 10)
+    assert ai_ranker.restore_rank_cache(dumped) == 3   # the 1970s entries are long expired
+    # The oldest restored entry is evicted first; live entries stay
+    assert list(ai_ranker._rank_cache) == ["fp:i4:h4", "fp:i5:h5", "fp:i100:h100", "fp:i101:h101"]
+
+
+def test_shed_ranking_keeps_cached_scores():
+    import asyncio
+
+    profile = {"keywords": "cyber"}
+    items = [{**item, "title": "cyber defense" if item["id"] == "i2" else "paving"} for item in _items(3)]
+    ai_ranker._store_rankings(ai_ranker.profile_fingerprint(profile), items[:1],
+                              [{"idx": 0, "score": 97, "summary": "cached"}])
+
+    ranked = asyncio.run(ai_ranker.rank_and_summarize([dict(i) for i in items], profile, use_llm=False))
+    by_id = {i["id"]: i for i in ranked}
+    assert by_id["i0"]["relevance_score"] == 97 and by_id["i0"]["ai_summary"] == "cached"
+    assert ranked[0]["id"] == "i0"
+    assert by_id["i2"]["relevance_score"] > by_id["i1"]["relevance_score"]
@@ -0,0 +1,121 @@
+import asyncio
+import glob
+import gzip
+import json
+
+import pytest
+from fastapi import FastAPI
+from fastapi.responses import StreamingResponse
+from fastapi.testclient import TestClient
+
+from services import recorder
+
+RESULT = {"items": [{"id": "opp-1", "title": "Radar"}], "has_more": False}
+
+
+@pytest.fixture(autouse=True)
+def recording(tmp_path, monkeypatch):
+    monkeypatch.setattr(recorder, "RECORD", True)
+    monkeypatch.setattr(recorder, "RECORD_DIR", str(tmp_path))
+    monkeypatch.setattr(recorder, "_pending", [])
+    monkeypatch.setattr(recorder, "_blobs", set())
+    monkeypatch.setattr(recorder, "_segment", {"path": None, "file": None, "bytes": 0, "opened": 0.0})
+    monkeypatch.setattr(recorder, "_recorded", {})
+    monkeypatch.setattr(recorder, "_cursor", {})
+
+
+def _app(fetch) -> FastAPI:
+    app = FastAPI()
+
+    @app.middleware("http")
+    async def record_traffic(request, call_next):
+        return await recorder.record_request(request, call_next, lambda user_id: {"keywords": "radar"})
+
+    @app.get("/api/feed/")
+    async def feed(stream: bool = False):
+        if not stream:
+            return await fetch("radar", page=1)
+
+        async def lines():
+            # Upstream calls made while the body streams still belong to the request
+            for page in (1, 2):
+                await asyncio.sleep(0.05)
+                yield json.dumps(await fetch("radar", page=page)) + "\n"
+        return StreamingResponse(lines(), media_type="application/x-ndjson")
+
+    return app
+
+
+def _fetcher():
+    @recorder.capture("sam")
+    async def fetch(keywords: str, page: int = 1):
+        return RESULT
+    return fetch
+
+
+def _raw_lines(path) -> list[dict]:
+    lines = []
+    for segment in sorted(glob.glob(f"{path}/traffic-*.ndjson.gz")):
+        with gzip.open(segment, "rt") as f:
+            lines.extend(json.loads(line) for line in f)
+    return lines
+
+
+def test_record_read_and_replay(tmp_path, monkeypatch):
+    client = TestClient(_app(_fetcher()))
+    for _ in range(2):
+        client.get("/api/feed/", params={"user_id": "u1", "openai_key": "sk-userkey12345"})
+    client.get("/api/feed/", params={"user_id": "u1", "stream": "true"})
+    asyncio.run(recorder.flush(final=True))
+
+    raw = _raw_lines(tmp_path)
+    # Four identical upstream results and three identical profiles: one blob each
+    assert sum(1 for e in raw if e["t"] == "blob") == 2
+    text = json.dumps(raw)
+    assert "sk-userkey12345" not in text
+
+    events = list(recorder.read_archive(str(tmp_path)))
+    requests = [e for e in events if e["t"] == "req"]
+    ups = [e for e in events if e["t"] == "up"]
+    assert len(requests) == 3 and len(ups) == 4
+    assert {u["req"] for u in ups} == {r["id"] for r in requests}
+    assert requests[0]["own_key"] and ["openai_key", "sk-userkey12345"] not in requests[0]["query"]
+    assert json.loads(requests[0]["profile"]) == {"keywords": "radar"}
+    assert json.loads(ups[0]["r"]) == RESULT
+    # The streamed request is timed to its last line, not to its headers
+    streamed = requests[2]
+    assert streamed["ms"] >= 100 > streamed["headers_ms"]
+
+    assert recorder.load_replay(str(tmp_path)) == 4
+    monkeypatch.setattr(recorder, "RECORD", False)
+    monkeypatch.setattr(recorder, "REPLAY_ARCHIVE", str(tmp_path))
+    monkeypatch.setattr(recorder, "REPLAY_UPSTREAM_SCALE", 0)
+
+    @recorder.capture("sam")
+    async def live(keywords: str, page: int = 1):
+        raise AssertionError("recorded call went upstream")
+
+    assert asyncio.run(live("radar", page=2)) == RESULT
+
+
+def test_torn_segments_are_read_up_to_the_tear(tmp_path):
+    blob = json.dumps({"t": "blob", "h": "b1", "d": {"keywords": "radar"}})
+    req = json.dumps({"t": "req", "id": "r1", "profile": "b1", "ms": 5})
+    with gzip.open(tmp_path / "traffic-20250101-000000-1.ndjson.gz", "wt") as f:
+        f.write(f"{blob}\n{req}\n" + req[:12])          # killed mid-line
+    # A segment still open for writing: flushed lines, no gzip trailer
+    live = tmp_path / "live.gz"
+    with gzip.open(live, "wt") as f:
+        f.write(f"{blob}\n{req}\n")
+        f.flush()
+        (tmp_path / "traffic-20250101-000001-2.ndjson.gz").write_bytes(live.read_bytes())
+
+    events = list(recorder.read_archive(str(tmp_path)))
+    assert [e["id"] for e in events] == ["r1", "r1"]
+    assert all(json.loads(e["profile"]) == {"keywords": "radar"} for e in events)
+
+
+def test_scrub_masks_keys():
+    assert recorder.scrub("url?api_key=abc123&page=2") == "url?api_key=REDACTED&page=2"
+    assert recorder.scrub('{"key": "sk-proj-ABCdef_123456"}') == '{"key": "sk-REDACTED"}'
+    assert recorder.scrub("sk-short") == "sk-short"
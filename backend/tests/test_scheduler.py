@@ -0,0 +1,162 @@
+import asyncio
+
+import pytest
+
+from services import scheduler
+from services.scheduler import BACKGROUND, INTERACTIVE, SCROLL
+
+
+@pytest.fixture(autouse=True)
+def fresh_state(monkeypatch):
+    monkeypatch.setattr(scheduler, "_resources", {})
+    monkeypatch.setattr(scheduler, "_usage_by_user", {})
+    # Refill rates near zero: tokens only come back through refund()
+    monkeypatch.setitem(scheduler.LIMITS, "test", (0.001, 10, 0.001, 1))
+
+
+async def _call(user_id: str, priority: int, order: list):
+    scheduler.bind(user_id, priority)
+    await scheduler.acquire("test")
+    order.append(user_id)
+
+
+async def _release_one_at_a_time(tasks: list, n: int):
+    await asyncio.sleep(0)   # let every task queue
+    for _ in range(n):
+        scheduler.refund("test", 1, "refunder")
+        await asyncio.sleep(0.01)
+    await asyncio.gather(*tasks)
+
+
+def test_waiting_calls_are_granted_by_priority_class():
+    async def run():
+        order = []
+        await _call("first", INTERACTIVE, order)   # takes the only shared token
+        tasks = [asyncio.create_task(_call(u, p, order))
+                 for u, p in [("background", BACKGROUND), ("scroll", SCROLL), ("page-1", INTERACTIVE)]]
+        await _release_one_at_a_time(tasks, 3)
+        return order
+
+    assert asyncio.run(run()) == ["first", "page-1", "scroll", "background"]
+
+
+def test_lighter_user_goes_first_within_a_priority(monkeypatch):
+    monkeypatch.setitem(scheduler.LIMITS, "test", (0.001, 10, 0.001, 10))
+
+    async def run():
+        order = []
+        for _ in range(9):
+            await _call("heavy", INTERACTIVE, order)
+        await _call("light", INTERACTIVE, order)   # shared budget is now empty
+        order.clear()
+        tasks = [asyncio.create_task(_call(u, INTERACTIVE, order)) for u in ("heavy", "light")]
+        await _release_one_at_a_time(tasks, 2)
+        return order
+
+    assert asyncio.run(run()) == ["light", "heavy"]
+
+
+def test_arrival_order_breaks_ties():
+    async def run():
+        order = []
+        await _call("first", INTERACTIVE, order)
+        order.clear()
+        tasks = []
+        for user_id in ("a", "b", "c"):
+            tasks.append(asyncio.create_task(_call(user_id, SCROLL, order)))
+            await asyncio.sleep(0)
+        await _release_one_at_a_time(tasks, 3)
+        return order
+
+    assert asyncio.run(run()) == ["a", "b", "c"]
+
+
+def test_exhausted_share_raises_throttled(monkeypatch):
+    monkeypatch.setattr(scheduler, "MAX_WAIT", 0.05)
+
+    async def run():
+        await _call("first", INTERACTIVE, [])
+        scheduler.bind("starved", INTERACTIVE)
+        with pytest.raises(scheduler.Throttled) as raised:
+            await scheduler.acquire("test")
+        return raised.value
+
+    err = asyncio.run(run())
+    assert (err.resource, err.user_id) == ("test", "starved")
+    assert err.retry_after > 0
+    usage = scheduler.usage("starved")["starved"]["resources"]["test"]
+    assert usage["throttled"] == 1 and usage["granted"] == 0
+    # The abandoned wait is dropped from the queue at the next pump
+    scheduler._resources["test"].pump()
+    assert scheduler._resources["test"].waiting == []
+
+
+def test_user_bucket_runs_dry_before_the_shared_one(monkeypatch):
+    monkeypatch.setitem(scheduler.LIMITS, "test", (0.001, 3, 0.001, 100))
+    monkeypatch.setattr(scheduler, "MAX_WAIT", 0.05)
+
+    async def run():
+        for _ in range(3):
+            await _call("scroller", SCROLL, [])
+        with pytest.raises(scheduler.Throttled):
+            await _call("scroller", SCROLL, [])
+        await _call("someone-else", INTERACTIVE, [])
+
+    asyncio.run(run())
+    assert scheduler.metrics()["resources"]["test"]["remaining"] == pytest.approx(96, abs=0.1)
+
+
+def test_weight_scales_a_users_share(monkeypatch):
+    monkeypatch.setattr(scheduler, "WEIGHTS", {"team": 3})
+    res = scheduler._resource("test")
+    assert res.bucket("team").capacity == 30
+    assert res.bucket("solo").capacity == 10
+
+
+def test_daily_budget_throttles_until_midnight(monkeypatch):
+    monkeypatch.setitem(scheduler.LIMITS, "test", (0.001, 100, 0.001, 100))
+    monkeypatch.setitem(scheduler.DAILY_LIMITS, "test", (2, 3))
+    day = [20000]
+    monkeypatch.setattr(scheduler, "_today", lambda: day[0])
+
+    async def run():
+        for _ in range(2):
+            await _call("heavy", SCROLL, [])
+        # Per-user budget spent: refused at once, not after MAX_WAIT
+        with pytest.raises(scheduler.Throttled) as raised:
+            await _call("heavy", SCROLL, [])
+        assert raised.value.retry_after > 0
+        await _call("light", INTERACTIVE, [])
+        # Shared budget spent too, so a fresh user is refused as well
+        with pytest.raises(scheduler.Throttled):
+            await _call("newcomer", INTERACTIVE, [])
+        day[0] += 1
+        await _call("heavy", SCROLL, [])
+
+    asyncio.run(run())
+    assert scheduler.usage("heavy")["heavy"]["resources"]["test"]["throttled"] == 1
+    assert scheduler.metrics()["resources"]["test"]["remaining_today"] == 2
+
+
+def test_refund_credits_the_daily_budget(monkeypatch):
+    monkeypatch.setitem(scheduler.DAILY_LIMITS, "test", (5, 5))
+
+    async def run():
+        await _call("cached", INTERACTIVE, [])
+        scheduler.refund("test", 1, "cached")
+
+    asyncio.run(run())
+    assert scheduler.usage("cached")["cached"]["resources"]["test"]["remaining_today"] == 5
+
+
+def test_throttled_fetch_returns_no_mock_page(monkeypatch):
+    from services import sam_gov
+
+    monkeypatch.setenv("SAM_API_KEY", "test-key")
+    monkeypatch.setattr(sam_gov, "_cache", {})
+    monkeypatch.setitem(scheduler.DAILY_LIMITS, "sam", (0, 0))
+    scheduler.bind("over-quota", SCROLL)
+
+    result = asyncio.run(sam_gov.fetch_opportunities("cyber", 10, page=2))
+    assert result["items"] == [] and result["has_more"] is False
+    assert result["throttled"] and result["retry_after"] > 0
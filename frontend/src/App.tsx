@@ -78,6 +78,11 @@ const FeedCard: React.FC<{ item: FeedItem; index: number; isNew?: boolean }> = (
         </span>
         <div className="card-top-right">
           {item.is_mock && <span className="demo-tag">DEMO DATA</span>}
+          {item.changed_fields && item.changed_fields.length > 0 && (
+            <span className="amended-tag" title={`Version ${item.version}`}>
+              AMENDED: {item.changed_fields.join(", ").replace(/_/g, " ")}
+            </span>
+          )}
           {score > 0 && (
             <span className="score" style={{ color: scoreColor, borderColor: `${scoreColor}44` }}>
               <span className="score-label">MATCH</span>
@@ -345,6 +350,7 @@ export default function App() {
   const [sourceCounts, setSourceCounts] = useState<Record<string, number>>({});
   const [page, setPage] = useState(1);
   const [lastUpdated, setLastUpdated] = useState<Date | null>(null);
+  const [degradedMode, setDegradedMode] = useState("");
   const PAGE_SIZE = 15;
 
   const loadFeed = useCallback(async (
@@ -380,6 +386,7 @@ export default function App() {
 
       setHasMore(data.has_more);
       setSourceCounts(data.source_counts || {});
+      setDegradedMode(data.degradation && data.degradation.level > 0 ? data.degradation.mode : "");
       if (data.profile) setProfile(data.profile);
       setLastUpdated(new Date());
     } catch {
@@ -435,6 +442,11 @@ export default function App() {
             {lastUpdated && !loading && (
               <span className="topbar-time">updated {fmtRelDate(lastUpdated.toISOString())}</span>
             )}
+            {degradedMode && !loading && (
+              <span className="topbar-degraded" title="Server is under heavy load — results are simplified">
+                reduced mode · {degradedMode.replace("_", " ")}
+              </span>
+            )}
           </div>
           <button className="topbar-refresh" onClick={() => loadFeed(true)} disabled={loading}>
             ⟳ refresh
@@ -18,6 +18,13 @@ export interface FeedItem {
   ai_summary?: string;
   recipient?: string;
   is_mock?: boolean;
+  posted_ts?: number | null;
+  deadline_ts?: number | null;
+  content_hash?: string;
+  // Present once an item has been amended since it was first seen
+  version?: number;
+  amended_ts?: number;
+  changed_fields?: string[];
 }
 
 export interface UserProfile {
@@ -28,12 +35,20 @@ export interface UserProfile {
   raw_input?: string;
 }
 
+export interface FacetCount {
+  value: string;
+  count: number;
+}
+
 export interface FeedResponse {
   items: FeedItem[];
   total: number;
+  total_matches?: number;
   has_more: boolean;
   source_counts: Record<string, number>;
   profile: UserProfile;
+  facets?: Record<string, FacetCount[]>;
+  degradation?: { level: number; mode: string };
 }
 
 export async function fetchFeed(